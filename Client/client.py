@@ -1,14 +1,22 @@
 """
 Dominoes Client (prototype)
 - Connects to the server and allows lobby browsing, creating, joining, starting (if host)
-- Plays with ASCII dominos, chooses left/right placement, sends chat per move
+- Plays with ASCII dominos, chooses left/right placement, sends chat per move or on its own
+- Spectates a lobby (its public view, no hands; possibly delayed) with spectate <lobby_id>
+- Follows tournaments: tables it is seated at, standings
+- Pings in the background as often as the server's hello reply asks, so an idle session isn't cut
 """
 
 import socket
-import pickle
 import threading
 import time
 
+from codec import BINARY, CODECS, codec_for_frame
+from protocol import FrameDecoder, RECV_SIZE, pack_message
+
+# server messages (e.g. game_over with every hand) can be large; still bounded
+MAX_SERVER_FRAME = 8 << 20
+
 def print_logo():
     logo = r"""
                                                                                                                                                     
@@ -45,39 +53,116 @@ def print_chain(chain):
 def print_hand(hand):
     return " ".join(f"[{a}|{b}]" for a,b in hand)
 
+def print_chat(messages):
+    # messages: [seq, user, text, time] as the server batches them
+    for _, user, text, at in messages:
+        print(f"[chat {time.strftime('%H:%M', time.localtime(at))}] {user}: {text}")
+
+def print_server_info(si):
+    print("=== Server Info ===")
+    print(f"Server: {si['server_name']} | Lobbies: {si['current_lobby_count']} / {si['max_lobbies']} | Players connected: {si['players_connected']}")
+    for l in si["lobbies"]:
+        print(f" Lobby {l['lobby_id']}: host={l['host']} players={l['players']}/{l['max_players']} diff={l['difficulty']} set=double-{l.get('max_pip', 6)} started={l['started']}")
+    if "page" in si:
+        print(f" (page {si['page']}, {len(si['lobbies'])} of {si['total']} matching lobbies)")
+
 def recv_loop(sock):
     # background receiver prints messages and updates shared state by calling callbacks
+    decoder = FrameDecoder(MAX_SERVER_FRAME)
     while True:
         try:
-            data = sock.recv(4096)
+            data = sock.recv(RECV_SIZE)
             if not data:
                 print("Connection closed by server.")
                 break
-            msg = pickle.loads(data)
-            handle_server_message(msg)
+            # one read may carry several messages, or only part of one
+            for frame in decoder.feed(data):
+                handle_server_message(codec_for_frame(frame).decode(frame))
         except Exception as e:
             #print("recv error:", e)
             break
 
+def time_left(deadline):
+    # the turn clock, from the deadline (server time) in updates
+    if deadline is None:
+        return ""
+    return f"({max(0, deadline - time.time()):.0f}s left)"
+
+SEND_LOCK = threading.Lock()  # the input loop, the heartbeat and recv_loop's resyncs all send
+
+def send_message(sock, payload, codec):
+    # one whole frame at a time, or two threads' sendall calls could interleave on the wire
+    frame = pack_message(payload, codec)
+    with SEND_LOCK:
+        sock.sendall(frame)
+
+def heartbeat_loop(sock, interval):
+    # the server drops connections that stay quiet too long; stops once the socket is gone
+    while True:
+        time.sleep(interval)
+        try:
+            send_message(sock, {"action":"ping"}, CODEC)
+        except OSError:
+            break
+
 # global client state (kept simple)
 CURRENT_LOBBY = None
+WATCHING = None  # lobby we spectate
 YOUR_HAND = []
 PLAYERS_IN_LOBBY = []
 CURRENT_TURN = None
 USERNAME = None
+CODEC = BINARY  # replaced by whatever the server picks in its hello reply
+SOCK = None
+SESSION = None  # token from the server's hello reply; sent again on reconnect to get our seat back
+# local copy of the table, kept up to date from delta updates
+CHAIN = []
+HANDS_SIZES = {}
+SEQ = 0
+LIST_VERSION = None  # version of the last lobby listing we printed
+LIST_INFO = None
+LIST_QUERY = {}  # page/filters of that listing
+
+def apply_update(u):
+    # apply one delta event to the local chain; False if we missed an event
+    global SEQ
+    if u["seq"] != SEQ + 1:
+        return False
+    SEQ = u["seq"]
+    if "placed_tile" in u:
+        tile = tuple(u["placed_tile"])
+        if u.get("side") == "left":
+            CHAIN.insert(0, tile)
+        else:
+            CHAIN.append(tile)
+        HANDS_SIZES[u["placed_by"]] = u["hand_size"]
+        if u["placed_by"] == USERNAME:
+            for t in (tile, (tile[1], tile[0])):
+                if t in YOUR_HAND:
+                    YOUR_HAND.remove(t)
+                    break
+    return True
 
 def handle_server_message(msg):
-    global CURRENT_LOBBY, YOUR_HAND, PLAYERS_IN_LOBBY, CURRENT_TURN
+    global CURRENT_LOBBY, YOUR_HAND, PLAYERS_IN_LOBBY, CURRENT_TURN, CODEC, CHAIN, HANDS_SIZES, SEQ, LIST_VERSION, LIST_INFO, SESSION, WATCHING
+    if "codec" in msg:
+        CODEC = CODECS.get(msg["codec"], CODEC)
+    if "session" in msg:
+        SESSION = msg["session"]
+    if msg.get("heartbeat"):
+        threading.Thread(target=heartbeat_loop, args=(SOCK, msg["heartbeat"]), daemon=True).start()
     if "server_info" in msg:
-        si = msg["server_info"]
-        print("=== Server Info ===")
-        print(f"Server: {si['server_name']} | Lobbies: {si['current_lobby_count']} / {si['max_lobbies']} | Players connected: {si['players_connected']}")
-        for l in si["lobbies"]:
-            print(f" Lobby {l['lobby_id']}: host={l['host']} players={l['players']}/{l['max_players']} diff={l['difficulty']} started={l['started']}")
+        LIST_INFO = msg["server_info"]
+        LIST_VERSION = LIST_INFO.get("version")
+        print_server_info(LIST_INFO)
+    if "server_info_unchanged" in msg and LIST_INFO:
+        # no lobby changed since our copy; only the player count is sent again
+        LIST_INFO["players_connected"] = msg["server_info_unchanged"].get("players_connected", LIST_INFO["players_connected"])
+        print_server_info(LIST_INFO)
     if "joined" in msg:
         CURRENT_LOBBY = msg.get("lobby_id")
         PLAYERS_IN_LOBBY = msg.get("players",[])
-        print(f"Joined lobby {CURRENT_LOBBY}. Players: {PLAYERS_IN_LOBBY} | difficulty: {msg.get('difficulty')}")
+        print(f"Joined lobby {CURRENT_LOBBY}. Players: {PLAYERS_IN_LOBBY} | difficulty: {msg.get('difficulty')} | set: double-{msg.get('max_pip', 6)} | turn limit: {msg.get('turn_seconds') or 'none'}")
     if "lobby_update" in msg:
         info = msg["lobby_update"]
         print("Lobby update:", info)
@@ -86,28 +171,127 @@ def handle_server_message(msg):
             print("Players now:", PLAYERS_IN_LOBBY)
     if "created" in msg:
         print("Created lobby id", msg["lobby_id"])
-    if "game_start" in msg:
+    if "queued" in msg:
+        q = msg["queued"]
+        print(f"In the queue for a {q['players']}-player {q['difficulty']} game at level {q['level']} ({q['waiting']} waiting). 'unqueue' to leave it.")
+    if "unqueued" in msg:
+        print("Left the queue." if msg["unqueued"] else "You were not in the queue.")
+    if "matched" in msg:
+        m = msg["matched"]
+        CURRENT_LOBBY = m["lobby_id"]
+        print(f"Match found after {m['waited']}s: lobby {m['lobby_id']} with {', '.join(m['players'])}")
+    if "spectate_delay" in msg:
+        print(f"Spectating lobby {msg['spectate_delay']['lobby_id']} {msg['spectate_delay']['delay']}s behind the players...")
+    if "spectating" in msg and isinstance(msg["spectating"], dict):
+        sp = msg["spectating"]
+        WATCHING = sp["lobby_id"]
+        PLAYERS_IN_LOBBY = list(sp["players"])
+        CHAIN = list(sp["chain"])
+        HANDS_SIZES = dict(sp["hands_sizes"])
+        SEQ = sp["seq"]
+        CURRENT_TURN = sp["turn"]
+        print(f"=== Spectating lobby {WATCHING} (host {sp['host']}, {sp['difficulty']}, {'playing' if sp['started'] else 'waiting'}) ===")
+        print("Players:", PLAYERS_IN_LOBBY)
+        if sp["started"]:
+            print("Chain:", print_chain(CHAIN))
+            print("Hands sizes:", HANDS_SIZES)
+            print("Turn:", CURRENT_TURN)
+        print_chat(sp.get("chat", []))
+    if "unspectated" in msg:
+        WATCHING = None
+        print("Stopped spectating." if msg["unspectated"] else "You were not spectating.")
+    if "spectate_end" in msg:
+        WATCHING = None
+        print(f"Lobby {msg['spectate_end']['lobby_id']} closed.")
+    if "tournament_table" in msg:
+        tt = msg["tournament_table"]
+        CURRENT_LOBBY = tt["lobby_id"]
+        print(f"=== {tt['name']} round {tt['round']}, table {tt['table']}: lobby {tt['lobby_id']} with {', '.join(tt['players'])} ===")
+    if "left" in msg and msg.get("lobby_id") is not None:
+        if msg["lobby_id"] == CURRENT_LOBBY:
+            CURRENT_LOBBY = None
+        print(f"Left lobby {msg['lobby_id']} (table closed).")
+    if "tournaments" in msg:
+        print("=== Tournaments ===")
+        for t in msg["tournaments"]:
+            print(f" {t['id']}: {t['name']} | {t['format']} | {t['players']} players | round {t['round']} | {t['state']}"
+                  + (f" | champion {t['champion']}" if t["champion"] else f" | {t['playing']} tables playing"))
+        if not msg["tournaments"]:
+            print(" (none)")
+    if "tournament" in msg and isinstance(msg["tournament"], dict):
+        t = msg["tournament"]
+        print(f"Tournament {t['id']} ({t['name']}): round {t['round']}, {t['state']}, {t['tables']} tables")
+    if "standings" in msg:
+        st = msg["standings"]
+        print(f"=== {st['name']} standings (round {st['round']}, {st['state']}) ===")
+        for r in st["rows"]:
+            print(f" {r['rank']:>3}. {r['player']:<16} wins {r['wins']:>2}  games {r['games']:>2}  pips {r['pips']}")
+        if st.get("you"):
+            print(f" You are ranked {st['you']}.")
+        if st["lobbies"]:
+            print(" Tables playing (spectate <lobby_id>):", ", ".join(map(str, st["lobbies"])))
+    if "tournament_over" in msg:
+        to = msg["tournament_over"]
+        print(f"=== {to['name']} is over! Champion: {to['champion']} ===")
+    if "game_start" in msg and msg.get("spectating"):
+        PLAYERS_IN_LOBBY = msg.get("players", [])
+        CURRENT_TURN = msg.get("turn")
+        CHAIN = list(msg.get("chain", []))
+        HANDS_SIZES = dict(msg.get("hands_sizes", {}))
+        SEQ = msg.get("seq", 0)
+        print("=== Game started (spectating) ===")
+        print("Players:", PLAYERS_IN_LOBBY)
+        print("Current turn:", CURRENT_TURN)
+    elif "game_start" in msg:
         CURRENT_LOBBY = msg.get("lobby_id")
         YOUR_HAND = msg.get("your_hand", [])
         PLAYERS_IN_LOBBY = msg.get("players", [])
         CURRENT_TURN = msg.get("turn")
-        print("=== Game started ===")
+        CHAIN = list(msg.get("chain", []))
+        HANDS_SIZES = dict(msg.get("hands_sizes", {}))
+        SEQ = msg.get("seq", 0)
+        print("=== Back in game ===" if msg.get("resumed") else "=== Game started ===")
         print("Players:", PLAYERS_IN_LOBBY)
         print("Your hand:", print_hand(YOUR_HAND))
         print("Chain:", print_chain(msg.get("chain", [])))
-        print("Current turn:", CURRENT_TURN)
+        print("Current turn:", CURRENT_TURN, time_left(msg.get("deadline")))
     if "chat" in msg:
-        print("[chat]", msg["chat"])
+        if isinstance(msg["chat"], dict):
+            if msg["chat"].get("history"):
+                print("--- recent chat ---")
+            print_chat(msg["chat"]["messages"])
+        else:
+            print("[chat]", msg["chat"])  # from a server without chat_batches: "user: text" lines
     if "update" in msg:
         u = msg["update"]
         CURRENT_TURN = u.get("turn")
         print("=== Update ===")
+        # auto: the server moved for a player who was away or out of time
+        why = {"away": " (away)", "timeout": " (out of time)"}.get(u.get("auto"), "")
         if "placed_by" in u:
-            print(f"{u['placed_by']} placed {print_chain([u['placed_tile']])}")
-        print("Chain:", print_chain(u.get("chain", [])))
-        print("Hands sizes:", u.get("hands_sizes"))
+            print(f"{u['placed_by']} placed {print_chain([u['placed_tile']])}{why}")
+        elif "passed_by" in u:
+            print(f"{u['passed_by']} passed{why}")
+        if "chain" in u:
+            # full update from a server without deltas
+            CHAIN = list(u["chain"])
+            HANDS_SIZES = dict(u.get("hands_sizes", {}))
+        elif not apply_update(u):
+            print("(missed an update, resyncing)")
+            send_message(SOCK, {"action":"resync", "lobby_id": CURRENT_LOBBY or WATCHING}, CODEC)
+        print("Chain:", print_chain(CHAIN))
+        print("Hands sizes:", HANDS_SIZES)
+        print("Turn:", CURRENT_TURN, time_left(u.get("deadline")))
+    if "snapshot" in msg:
+        snap = msg["snapshot"]
+        CHAIN = list(snap["chain"])
+        HANDS_SIZES = dict(snap["hands_sizes"])
+        SEQ = snap["seq"]
+        CURRENT_TURN = snap["turn"]
+        print("=== Resynced ===")
+        print("Chain:", print_chain(CHAIN))
+        print("Hands sizes:", HANDS_SIZES)
         print("Turn:", CURRENT_TURN)
-        # request status to update our hand if we are in a lobby
     if "error" in msg:
         print("[server error]", msg["error"])
     if "status" in msg:
@@ -115,11 +299,16 @@ def handle_server_message(msg):
         YOUR_HAND = st.get("your_hand", YOUR_HAND)
         PLAYERS_IN_LOBBY = st.get("players", PLAYERS_IN_LOBBY)
         CURRENT_TURN = st.get("turn", CURRENT_TURN)
+        CHAIN = list(st.get("chain", CHAIN))
+        HANDS_SIZES = dict(st.get("hands_sizes", HANDS_SIZES))
+        SEQ = st.get("seq", SEQ)
         print("=== Lobby status ===")
         print("Players:", PLAYERS_IN_LOBBY)
         print("Your hand:", print_hand(YOUR_HAND))
-        print("Chain:", print_chain(st.get("chain", [])))
-        print("Turn:", CURRENT_TURN)
+        if st.get("playable"):
+            print("Playable: left", print_hand(st["playable"]["left"]) or "-", "| right", print_hand(st["playable"]["right"]) or "-")
+        print("Chain:", print_chain(CHAIN))
+        print("Turn:", CURRENT_TURN, time_left(st.get("deadline")))
         print("Your level:", st.get("your_level"))
     if "game_over" in msg:
         go = msg["game_over"]
@@ -129,35 +318,81 @@ def handle_server_message(msg):
         else:
             print("Game over! Winner:", go["winner"])
         print("Final hands:", {u: print_hand(h) for u,h in go.get("hands",{}).items()})
+        if "game" in go:
+            print(f"Replay: replay {go['game']}")
+    if "replays" in msg:
+        print("=== Games ===")
+        for g in msg["replays"]:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(g["ended"]))
+            print(f" game {g['game']} | lobby {g['lobby_id']} | {when} | {g['moves']} moves | winner {g['winner']}{' (blocked)' if g['blocked'] else ''} | {', '.join(g['players'])}")
+        if not msg["replays"]:
+            print(" (none)")
+    if "replay_start" in msg:
+        rs = msg["replay_start"]
+        print(f"=== Replay of game {rs['game']} (lobby {rs['lobby_id']}, double-{rs['max_pip']}, {rs['moves']} moves) ===")
+        for u, h in rs["hands"].items():
+            print(f" {u}: {print_hand(h)}")
+    if "replay" in msg:
+        for e in msg["replay"]["events"]:
+            if "left" in e:
+                print(f" {e['left']} left the game")
+            elif "placed_by" in e:
+                print(f" {e['seq']:>3}. {e['placed_by']} placed {print_chain([e['placed_tile']])} on the {e['side']}")
+            else:
+                print(f" {e['seq']:>3}. {e['passed_by']} passed")
+    if "replay_end" in msg:
+        re_ = msg["replay_end"]
+        print(f"=== End of replay {re_['game']}: winner {re_['winner']}{' (blocked, pip sums ' + str(re_['sums']) + ')' if re_.get('blocked') else ''} ===")
 
 # --- Client UI / commands ---
 
-def main():
-    global USERNAME, CURRENT_LOBBY, YOUR_HAND
-    server_ip = input("Server IP (default 127.0.0.1): ").strip() or "127.0.0.1"
-    server_port = int(input("Server port (default 5555): ").strip() or 5555)
-    USERNAME = input("Choose your username: ").strip() or f"guest_{int(time.time())%1000}"
-
+def connect(server_ip, server_port):
+    global SOCK
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.connect((server_ip, server_port))
+    SOCK = sock
 
-    # say hello
-    sock.send(pickle.dumps({"action":"hello", "username": USERNAME}))
+    # say hello (with our session token after a reconnect, so the server can seat us again)
+    hello = {"action":"hello", "username": USERNAME, "codecs": list(CODECS), "deltas": True, "chat_batches": True}
+    if SESSION:
+        hello["session"] = SESSION
+    if CURRENT_LOBBY is not None:
+        hello["lobby_id"] = CURRENT_LOBBY  # a multi-process server routes us to the process running that lobby
+    send_message(sock, hello, CODEC)
     # start receiver thread
     t = threading.Thread(target=recv_loop, args=(sock,), daemon=True)
     t.start()
+    return sock
+
+def main():
+    global USERNAME, CURRENT_LOBBY, YOUR_HAND, LIST_QUERY
+    server_ip = input("Server IP (default 127.0.0.1): ").strip() or "127.0.0.1"
+    server_port = int(input("Server port (default 5555): ").strip() or 5555)
+    USERNAME = input("Choose your username: ").strip() or f"guest_{int(time.time())%1000}"
+
+    sock = connect(server_ip, server_port)
 
     # main command loop
     help_text = """
 Commands:
- list                        -> list server & lobbies
+ list [page] [easy|normal|hard] [open] [waiting]
+                             -> list server & lobbies (optionally paged/filtered)
  create                      -> create a lobby
  join <lobby_id>             -> join an existing lobby
+ queue [players] [easy|normal|hard] -> find a game with players of your level (unqueue to stop)
  leave                       -> leave current lobby
+ spectate <lobby_id>         -> watch a lobby's game without playing (unspectate to stop)
+ bot [count] [easy|normal|hard] -> add bot players to your lobby (host only)
  start                       -> start the game (host only)
  status                      -> get current lobby/game status
  move <a> <b> <side> [chat]  -> play tile (side = left|right). include optional chat in quotes
  pass [chat]                 -> pass your turn and optionally send chat
+ chat <text>                 -> say something to your lobby
+ tournaments                 -> tournaments on this server
+ standings <id>              -> a tournament's standings
+ replays [player]            -> your (or a player's) finished games, newest first
+ replay <game> [seconds]     -> watch a finished game, optionally paced (seconds per move)
+ reconnect                   -> reconnect after the server restarted or the link dropped
  quit                        -> quit
 """
     print(help_text)
@@ -167,41 +402,106 @@ Commands:
             if not cmd:
                 continue
             parts = cmd.split()
-            if parts[0] == "list":
-                sock.send(pickle.dumps({"action":"list"}))
+            if parts[0] == "reconnect":
+                sock.close()
+                try:
+                    sock = connect(server_ip, server_port)
+                except OSError as e:
+                    print("Reconnect failed:", e)
+            elif parts[0] == "list":
+                query = {}
+                for arg in parts[1:]:
+                    if arg.isdigit():
+                        query["page"] = int(arg)
+                    elif arg in ("easy", "normal", "hard"):
+                        query["difficulty"] = arg
+                    elif arg in ("open", "waiting"):
+                        query[arg] = True
+                payload = {"action":"list", **query}
+                if query == LIST_QUERY and LIST_VERSION is not None:
+                    payload["if_version"] = LIST_VERSION  # same listing as last time: only send it if it changed
+                LIST_QUERY = query
+                send_message(sock, payload, CODEC)
             elif parts[0] == "create":
                 mp = input(f"Max players for this lobby (default {4}): ").strip()
                 difficulty = input("Lobby difficulty (easy/normal/hard) (enter to use server default): ").strip()
+                max_pip = input("Domino set: double-6/9/12/15 (default 6): ").strip()
+                turn_seconds = input("Seconds per turn, 0 = no limit (enter for the difficulty's default): ").strip()
+                spectator_delay = input("Seconds spectators watch behind the game (default 0): ").strip()
                 payload = {"action":"create_lobby"}
                 if mp:
                     try: payload["max_players"] = int(mp)
                     except: pass
                 if difficulty:
                     payload["difficulty"] = difficulty
-                sock.send(pickle.dumps(payload))
+                if max_pip:
+                    try: payload["max_pip"] = int(max_pip)
+                    except: pass
+                if turn_seconds:
+                    try: payload["turn_seconds"] = int(turn_seconds)
+                    except: pass
+                if spectator_delay:
+                    try: payload["spectator_delay"] = int(spectator_delay)
+                    except: pass
+                send_message(sock, payload, CODEC)
             elif parts[0] == "join":
                 if len(parts) < 2:
                     print("Usage: join <lobby_id>")
                     continue
                 lid = int(parts[1])
-                sock.send(pickle.dumps({"action":"join_lobby", "lobby_id": lid}))
+                send_message(sock, {"action":"join_lobby", "lobby_id": lid}, CODEC)
                 CURRENT_LOBBY = lid
+            elif parts[0] == "queue":
+                payload = {"action":"queue"}
+                for arg in parts[1:]:
+                    if arg.isdigit():
+                        payload["players"] = int(arg)
+                    else:
+                        payload["difficulty"] = arg
+                send_message(sock, payload, CODEC)
+            elif parts[0] == "unqueue":
+                send_message(sock, {"action":"queue", "cancel": True}, CODEC)
+            elif parts[0] == "spectate":
+                if len(parts) < 2 or not parts[1].isdigit():
+                    print("Usage: spectate <lobby_id>")
+                    continue
+                send_message(sock, {"action":"spectate", "lobby_id": int(parts[1])}, CODEC)
+            elif parts[0] == "unspectate":
+                send_message(sock, {"action":"spectate", "leave": True}, CODEC)
+            elif parts[0] == "tournaments":
+                send_message(sock, {"action":"tournament", "op": "list"}, CODEC)
+            elif parts[0] == "standings":
+                if len(parts) < 2 or not parts[1].isdigit():
+                    print("Usage: standings <tournament id>")
+                    continue
+                send_message(sock, {"action":"tournament", "op": "standings", "id": int(parts[1])}, CODEC)
             elif parts[0] == "leave":
                 if not CURRENT_LOBBY:
                     print("Not in a lobby.")
                     continue
-                sock.send(pickle.dumps({"action":"leave_lobby", "lobby_id": CURRENT_LOBBY}))
+                send_message(sock, {"action":"leave_lobby", "lobby_id": CURRENT_LOBBY}, CODEC)
                 CURRENT_LOBBY = None
+            elif parts[0] == "bot":
+                if not CURRENT_LOBBY:
+                    print("Not in a lobby.")
+                    continue
+                payload = {"action":"add_bot", "lobby_id": CURRENT_LOBBY}
+                for arg in parts[1:]:
+                    if arg.isdigit():
+                        payload["count"] = int(arg)
+                    else:
+                        payload["difficulty"] = arg
+                send_message(sock, payload, CODEC)
             elif parts[0] == "start":
                 if not CURRENT_LOBBY:
                     print("Not in a lobby.")
                     continue
-                sock.send(pickle.dumps({"action":"start_lobby", "lobby_id": CURRENT_LOBBY}))
+                send_message(sock, {"action":"start_lobby", "lobby_id": CURRENT_LOBBY}, CODEC)
             elif parts[0] == "status":
                 if not CURRENT_LOBBY:
                     print("Not in a lobby.")
                     continue
-                sock.send(pickle.dumps({"action":"status", "lobby_id": CURRENT_LOBBY}))
+                send_message(sock, {"action":"status", "lobby_id": CURRENT_LOBBY}, CODEC)
             elif parts[0] == "move":
                 if not CURRENT_LOBBY:
                     print("Join a lobby first.")
@@ -212,17 +512,39 @@ Commands:
                 try:
                     a = int(parts[1]); b = int(parts[2])
                 except:
-                    print("tile numbers must be ints 0..6")
+                    print("tile numbers must be ints (0..6 for a double-six set)")
                     continue
                 side = parts[3] if parts[3] in ("left","right") else "right"
                 chat = " ".join(parts[4:]) if len(parts) > 4 else ""
-                sock.send(pickle.dumps({"action":"move", "lobby_id": CURRENT_LOBBY, "move": (a,b), "side": side, "chat": chat}))
+                send_message(sock, {"action":"move", "lobby_id": CURRENT_LOBBY, "move": (a,b), "side": side, "chat": chat}, CODEC)
             elif parts[0] == "pass":
                 if not CURRENT_LOBBY:
                     print("Join a lobby first.")
                     continue
                 chat = " ".join(parts[1:]) if len(parts) > 1 else ""
-                sock.send(pickle.dumps({"action":"move", "lobby_id": CURRENT_LOBBY, "move": "pass", "chat": chat}))
+                send_message(sock, {"action":"move", "lobby_id": CURRENT_LOBBY, "move": "pass", "chat": chat}, CODEC)
+            elif parts[0] == "chat":
+                if not CURRENT_LOBBY:
+                    print("Join a lobby first.")
+                    continue
+                if len(parts) < 2:
+                    print("Usage: chat <text>")
+                    continue
+                send_message(sock, {"action":"chat", "lobby_id": CURRENT_LOBBY, "text": cmd.split(None, 1)[1]}, CODEC)
+            elif parts[0] == "replays":
+                payload = {"action":"replays"}
+                if len(parts) > 1:
+                    payload["player"] = parts[1]
+                send_message(sock, payload, CODEC)
+            elif parts[0] == "replay":
+                if len(parts) < 2 or not parts[1].isdigit():
+                    print("Usage: replay <game> [seconds per move]")
+                    continue
+                payload = {"action":"replay", "game": int(parts[1])}
+                if len(parts) > 2:
+                    try: payload["interval"] = float(parts[2])
+                    except: pass
+                send_message(sock, payload, CODEC)
             elif parts[0] == "quit":
                 print("Bye")
                 break
@@ -0,0 +1,430 @@
+"""
+Dominoes load generator (scriptable, asyncio)
+- simulated players speak the client's wire protocol (protocol.py, codec.py), one asyncio stream
+  each, so one process holds thousands of them; --procs spreads them over processes
+- every request is timed from its write to its reply; players send one request at a time
+- fan-out: when a player moves, every other seat records how long the update (and a game_over)
+  took to reach it
+- scenarios (fixed, so runs against different server builds compare):
+  games    - tables of --seats players: the host creates a lobby, everyone joins, the host starts
+             game after game; players take their turn with a legal move from their status hand
+  browse   - lobby-browse storm: --lobbies lobbies exist while every player lists in a loop
+             (whole list, pages, filters, and if_version half the time); hosts keep creating and
+             closing lobbies so the listing keeps changing
+  join     - mass join: lobbies of --seats seats, all joiners join at the same moment and leave
+             again, wave after wave
+  endgame  - endgame broadcast: six-seat tables on the double-12 set with the biggest deal, so the
+             late game sends long chains and game_over carries every hand
+- prints p50/p99/p999 latency and rate per action; --json saves the run, --compare A.json B.json
+  prints B against A
+
+usage: python Client/loadgen.py [--host 127.0.0.1] [--port 5555] [--scenario games] [--players 1000]
+       [--seconds 30] [--seats N] [--lobbies 500] [--procs 1] [--json out.json]
+       python Client/loadgen.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from multiprocessing import Pool
+
+from codec import BINARY, CODECS, codec_for_frame
+from protocol import FrameDecoder, RECV_SIZE, pack_message
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+MAX_SERVER_FRAME = 8 << 20
+REQUEST_TIMEOUT = 30.0
+TIMINGS = ("fanout", "game_over_fanout", "wave")  # recorded, but not requests
+CONNECT_BATCH = 200  # connections opened concurrently
+SCENARIOS = {
+    # seats, create_lobby extras
+    "games": (2, {}),
+    "browse": (0, {}),
+    "join": (4, {}),
+    "endgame": (6, {"max_pip": 12, "difficulty": "hard"}),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # label -> [seconds]
+        self.errors = {}  # label -> count
+        self.counts = {}  # games, moves, ...
+        self.prefix = "setup "  # until the measured part starts
+
+    def add(self, label, seconds):
+        self.samples.setdefault(label, []).append(seconds)
+
+    def error(self, label):
+        self.errors[label] = self.errors.get(label, 0) + 1
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def dump(self):
+        return {"samples": self.samples, "errors": self.errors, "counts": self.counts}
+
+    def merge(self, dump):
+        for label, xs in dump["samples"].items():
+            self.samples.setdefault(label, []).extend(xs)
+        for label, n in dump["errors"].items():
+            self.errors[label] = self.errors.get(label, 0) + n
+        for name, n in dump["counts"].items():
+            self.count(name, n)
+
+    def report(self, seconds):
+        # label -> {"count", "errors", "rate", "p50", "p99", "p999"} (latencies in ms)
+        out = {}
+        for label in sorted(set(self.samples) | set(self.errors)):
+            xs = sorted(self.samples.get(label, []))
+            measured = seconds and not label.startswith("setup ")
+            row = {"count": len(xs), "errors": self.errors.get(label, 0), "rate": len(xs) / seconds if measured else 0.0}
+            for name, q in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999)):
+                row[name] = xs[min(int(q * len(xs)), len(xs) - 1)] * 1000 if xs else 0.0
+            out[label] = row
+        return out
+
+
+def pick_move(hand, chain, rnd):
+    # a random legal move for this hand, or ("pass", "right")
+    if not chain:
+        return list(rnd.choice(hand)), "right"
+    left, right = chain[0][0], chain[-1][1]
+    moves = [(t, side) for t in hand for side, end in (("left", left), ("right", right)) if end in t]
+    if not moves:
+        return "pass", "right"
+    tile, side = rnd.choice(moves)
+    return list(tile), side
+
+
+class Table:
+    # the players of one lobby in this process; shared so seats can time the host's fan-out
+    def __init__(self, players):
+        self.players = players
+        self.lobby_id = None
+        self.mover = None
+        self.move_sent = 0.0  # when mover's last move request went out
+
+
+class Player:
+    def __init__(self, name, rec, rnd):
+        self.name = name
+        self.rec = rec
+        self.rnd = rnd
+        self.codec = BINARY
+        self.reader = self.writer = None
+        self.decoder = FrameDecoder(MAX_SERVER_FRAME)
+        self.waiting = None  # (reply keys, future) of the request in flight
+        self.closed = False
+        self.table = None
+        self.playing = False
+        self.turn = None
+        self.changed = asyncio.Event()  # game state moved on
+        self.list_version = None
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        asyncio.create_task(self._read())
+        reply = await self.request({"action": "hello", "username": self.name, "codecs": list(CODECS), "deltas": True, "chat_batches": True}, "ok")
+        self.codec = CODECS.get(reply.get("codec"), BINARY)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def request(self, payload, *keys):
+        # send and wait for the first message carrying one of keys (or "error"); timed under the action
+        label = self.rec.prefix + payload["action"]
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting = (keys + ("error",), fut)
+        t0 = time.perf_counter()
+        self.writer.write(pack_message(payload, self.codec))
+        try:
+            msg = await asyncio.wait_for(fut, REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.waiting = None
+            self.rec.error(label)
+            raise
+        if "error" in msg:
+            self.rec.error(label)
+        else:
+            self.rec.add(label, time.perf_counter() - t0)
+        return msg
+
+    def observe(self, msg):
+        # track the game from broadcasts, and time fan-out to the seats that did not move
+        if "game_start" in msg:
+            self.playing = True
+            self.turn = msg.get("turn")
+        elif "update" in msg:
+            u = msg["update"]
+            self.turn = u.get("turn")
+            if self.table and self.table.mover != self.name:
+                self.rec.add("fanout", time.perf_counter() - self.table.move_sent)
+        elif "game_over" in msg:
+            self.playing = False
+            if self.table and self.table.mover != self.name:
+                self.rec.add("game_over_fanout", time.perf_counter() - self.table.move_sent)
+        else:
+            return
+        self.changed.set()
+
+    async def _read(self):
+        try:
+            while True:
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for frame in self.decoder.feed(data):
+                    msg = codec_for_frame(frame).decode(frame)
+                    self.observe(msg)
+                    if self.waiting and any(k in msg for k in self.waiting[0]):
+                        fut = self.waiting[1]
+                        self.waiting = None
+                        if not fut.done():
+                            fut.set_result(msg)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.closed = True
+            if self.waiting and not self.waiting[1].done():
+                self.waiting[1].set_exception(ConnectionError("server closed the connection"))
+            self.changed.set()
+
+    async def wait_change(self, deadline):
+        # caller checked the state and found nothing to do
+        self.changed.clear()
+        try:
+            await asyncio.wait_for(self.changed.wait(), max(deadline - time.perf_counter(), 0.001))
+        except asyncio.TimeoutError:
+            pass
+
+    async def take_turn(self):
+        lid = self.table.lobby_id
+        st = await self.request({"action": "status", "lobby_id": lid}, "status")
+        if "error" in st or st["status"]["turn"] != self.name:
+            return
+        move, side = pick_move(st["status"]["your_hand"], st["status"]["chain"], self.rnd)
+        self.table.mover = self.name
+        self.table.move_sent = time.perf_counter()
+        reply = await self.request({"action": "move", "lobby_id": lid, "move": move, "side": side}, "update")
+        if "error" not in reply:
+            self.rec.count("moves")
+
+    async def play_seat(self, deadline, host):
+        # the host starts games back to back; every seat moves when it is its turn
+        while time.perf_counter() < deadline and not self.closed:
+            if host and not self.playing:
+                reply = await self.request({"action": "start_lobby", "lobby_id": self.table.lobby_id}, "game_start")
+                if "error" in reply:
+                    await asyncio.sleep(0.05)
+                else:
+                    self.rec.count("games")
+            elif self.playing and self.turn == self.name:
+                await self.take_turn()
+            else:
+                await self.wait_change(deadline)
+
+
+async def connect_all(players, host, port):
+    for i in range(0, len(players), CONNECT_BATCH):
+        await asyncio.gather(*(p.connect(host, port) for p in players[i:i + CONNECT_BATCH]))
+
+
+async def open_table(table, seats, extras):
+    # host creates the lobby, then everyone (host first) takes a seat
+    host = table.players[0]
+    reply = await host.request(dict({"action": "create_lobby", "max_players": seats}, **extras), "created")
+    table.lobby_id = reply.get("lobby_id")
+    for p in table.players:
+        p.table = table
+        await p.request({"action": "join_lobby", "lobby_id": table.lobby_id}, "joined")
+
+
+async def scenario_games(players, args, extras, deadline_after):
+    seats = args.seats
+    tables = [Table(players[i:i + seats]) for i in range(0, len(players) - seats + 1, seats)]
+    await asyncio.gather(*(open_table(t, seats, extras) for t in tables))
+    deadline = deadline_after()
+    await asyncio.gather(*(p.play_seat(deadline, p is t.players[0]) for t in tables for p in t.players))
+
+
+async def browse(player, deadline):
+    rnd = player.rnd
+    while time.perf_counter() < deadline and not player.closed:
+        req = {"action": "list"}
+        kind = rnd.random()
+        if kind < 0.6:
+            req.update(page=rnd.randrange(10), page_size=20)
+        elif kind < 0.8:
+            req.update(difficulty=rnd.choice(("easy", "normal", "hard")), open=True, page=0, page_size=20)
+        if player.list_version is not None and rnd.random() < 0.5:
+            req["if_version"] = player.list_version
+        reply = await player.request(req, "server_info", "server_info_unchanged")
+        info = reply.get("server_info") or reply.get("server_info_unchanged") or {}
+        player.list_version = info.get("version", player.list_version)
+
+
+async def churn(host, deadline):
+    # one lobby opened and closed again every half second
+    while time.perf_counter() < deadline and not host.closed:
+        reply = await host.request({"action": "create_lobby", "max_players": 4}, "created")
+        lid = reply.get("lobby_id")
+        await host.request({"action": "join_lobby", "lobby_id": lid}, "joined")
+        await host.request({"action": "leave_lobby", "lobby_id": lid}, "left")
+        await asyncio.sleep(0.5)
+
+
+async def scenario_browse(players, args, extras, deadline_after):
+    hosts = players[:max(1, len(players) // 20)]
+    for i in range(args.lobbies):
+        # lobbies nobody sits in stay listed; spread over the hosts and the difficulties
+        await hosts[i % len(hosts)].request({"action": "create_lobby", "max_players": 4,
+                                             "difficulty": ("easy", "normal", "hard")[i % 3]}, "created")
+    deadline = deadline_after()
+    await asyncio.gather(*(churn(h, deadline) for h in hosts), *(browse(p, deadline) for p in players[len(hosts):]))
+
+
+async def scenario_join(players, args, extras, deadline_after):
+    seats = args.seats
+    hosts = players[:-(-len(players) // seats)]  # enough lobbies for every joiner to get a seat
+    joiners = players[len(hosts):]
+    lids = []
+    for h in hosts:
+        reply = await h.request({"action": "create_lobby", "max_players": seats}, "created")
+        lids.append(reply.get("lobby_id"))
+        await h.request({"action": "join_lobby", "lobby_id": lids[-1]}, "joined")
+
+    async def join_leave(p, lid):
+        reply = await p.request({"action": "join_lobby", "lobby_id": lid}, "joined")
+        if "error" not in reply:
+            await p.request({"action": "leave_lobby", "lobby_id": lid}, "left")
+
+    deadline = deadline_after()
+    rec = players[0].rec
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(join_leave(p, lids[i % len(lids)]) for i, p in enumerate(joiners)))
+        rec.add("wave", time.perf_counter() - t0)
+
+
+SCENARIO_RUNNERS = {"games": scenario_games, "browse": scenario_browse, "join": scenario_join, "endgame": scenario_games}
+
+
+async def run_scenario(args, proc=0):
+    # (recorder dump, seconds of load after setup)
+    rec = Recorder()
+    rnd = random.Random(args.seed * 1000 + proc)
+    players = [Player(f"lg{proc}_{i}", rec, random.Random(rnd.random())) for i in range(args.players)]
+    t0 = time.perf_counter()
+    await connect_all(players, args.host, args.port)
+    rec.count("connect_ms", int((time.perf_counter() - t0) * 1000))
+    start = []
+
+    def deadline_after():
+        # setup is done: the measured part starts now
+        rec.prefix = ""
+        start.append(time.perf_counter())
+        return start[0] + args.seconds
+
+    try:
+        await SCENARIO_RUNNERS[args.scenario](players, args, SCENARIOS[args.scenario][1], deadline_after)
+    finally:
+        for p in players:
+            p.close()
+    return rec.dump(), time.perf_counter() - start[0] if start else 0.0
+
+
+def _proc_main(task):
+    args, proc = task
+    raise_fd_limit()
+    return asyncio.run(run_scenario(args, proc))
+
+
+def raise_fd_limit():
+    if resource is not None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run(args):
+    # the whole run, across --procs processes: {"scenario", "players", "seconds", "counts", "actions"}
+    per = -(-args.players // args.procs)
+    tasks = []
+    for proc in range(args.procs):
+        sub = argparse.Namespace(**vars(args))
+        sub.players = min(per, args.players - proc * per)
+        if sub.players > 0:
+            tasks.append((sub, proc))
+    if len(tasks) == 1:
+        results = [_proc_main(tasks[0])]
+    else:
+        with Pool(len(tasks)) as pool:
+            results = pool.map(_proc_main, tasks)
+    rec = Recorder()
+    for dump, _ in results:
+        rec.merge(dump)
+    seconds = max(s for _, s in results)
+    actions = rec.report(seconds)
+    rate = sum(r["rate"] for label, r in actions.items() if label not in TIMINGS)
+    return {"scenario": args.scenario, "players": args.players, "seats": args.seats, "seconds": seconds,
+            "requests_per_s": rate, "counts": rec.counts, "actions": actions}
+
+
+def print_report(result):
+    print(f"{result['scenario']}: {result['players']} players, {result['seconds']:.1f}s, "
+          f"{result['requests_per_s']:.0f} requests/s  {result['counts']}")
+    print(f"{'action':<18} {'count':>9} {'errors':>7} {'per s':>9} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}")
+    for label, r in result["actions"].items():
+        print(f"{label:<18} {r['count']:>9} {r['errors']:>7} {r['rate']:>9.0f} {r['p50']:>9.2f} {r['p99']:>9.2f} {r['p999']:>9.2f}")
+
+
+def compare(path_a, path_b):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"{a['scenario']} ({path_a})  ->  {b['scenario']} ({path_b})")
+    print(f"requests/s {a['requests_per_s']:.0f} -> {b['requests_per_s']:.0f}")
+    print(f"{'action':<18} {'per s':>16} {'p50 ms':>18} {'p99 ms':>18} {'p999 ms':>18}")
+    for label in sorted(set(a["actions"]) & set(b["actions"])):
+        ra, rb = a["actions"][label], b["actions"][label]
+        cells = [f"{ra[k]:.1f} -> {rb[k]:.1f}" if k != "rate" else f"{ra[k]:.0f} -> {rb[k]:.0f}"
+                 for k in ("rate", "p50", "p99", "p999")]
+        print(f"{label:<18} {cells[0]:>16} {cells[1]:>18} {cells[2]:>18} {cells[3]:>18}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dominoes server load generator")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5555)
+    ap.add_argument("--scenario", choices=sorted(SCENARIOS), default="games")
+    ap.add_argument("--players", type=int, default=1000)
+    ap.add_argument("--seconds", type=float, default=30)
+    ap.add_argument("--seats", type=int, help="players per lobby (default: the scenario's)")
+    ap.add_argument("--lobbies", type=int, default=500, help="lobbies listed in the browse scenario")
+    ap.add_argument("--procs", type=int, default=1, help="load generator processes")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="save the results here")
+    ap.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved runs")
+    args = ap.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.seats = args.seats or SCENARIOS[args.scenario][0]
+    result = run(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Dominoes Server - asyncio engine
+- every connection is a coroutine on one event loop instead of one thread per socket
+- one loop, one process: more cores means the supervisor's worker processes (threaded engine);
+  extra loops as threads would share the GIL and only add cross-thread wakeups
+- requests go through GameServer.handle_hello / handle_request, so the action set is the same as the threaded engine
+- handle_request runs on the loop and may wait on the server's threading locks (lobby, registry,
+  stats stripes), which bot, timer, fan-out and stats threads take too. That is safe to block on
+  because no lock is held across blocking I/O or thinking: writes to sockets, the journal and the
+  stats store are queued for writer threads, a finished game goes into the replay archive's
+  memory map (tens of microseconds), bots copy their view under lobby.lock and think
+  outside it, and tournament passes take their lock per table. Holds are microseconds; the
+  longest is a matchmaking sweep, which keeps the queue's lock for one pass over the queue
+  (about 3 us per waiting player, see bench_matchmaking.py) and so delays queue requests only.
+  Anything that would hold a lock longer belongs on a thread
+- reads are fed through the same FrameDecoder as the threaded engine
+- each connection's outbound queue is drained by a writer task instead of a writer thread
+"""
+
+import asyncio
+import threading
+import time
+
+from connection import Connection
+from protocol import FrameDecoder, FrameTooLarge, RECV_SIZE, unframed
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class StreamConn(Connection):
+    # Connection over a StreamWriter so Lobby.broadcast and the request handlers
+    # can keep calling conn.sendall(...) whatever engine owns the connection
+    def __init__(self, writer, max_queue):
+        super().__init__(None, max_queue)
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+
+    def start(self):
+        self.loop.create_task(self._drain())
+
+    def _call(self, fn):
+        # frames queued from another thread (a bot's or timer's broadcast) wake the loop safely
+        if _running_loop() is self.loop:
+            fn()
+        else:
+            self.loop.call_soon_threadsafe(fn)
+
+    def _wake(self):
+        self._call(self.ready.set)
+
+    def _shutdown(self):
+        self._call(self.writer.transport.abort)
+
+    async def _drain(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                with self.qcond:
+                    batch = list(self.queue)
+                    self.queue.clear()
+                    closed = self.closed
+                if batch:
+                    data = b"".join(frame for _, frame in batch)
+                    self.writer.write(data)
+                    self.sent += len(batch)
+                    self.bytes_out += len(data)
+                    await self.writer.drain()
+                if closed:
+                    break
+        except (ConnectionError, OSError):
+            self.abort()
+        self.writer.close()
+
+
+class AsyncEngine:
+    def __init__(self, server):
+        self.server = server
+        self.ready = threading.Event()
+
+    async def handle_client(self, reader, writer):
+        conn = StreamConn(writer, self.server.max_queue)
+        conn.start()
+        addr = writer.get_extra_info("peername") or ("?", 0)
+        decoder = FrameDecoder(self.server.max_frame)
+        profiler = self.server.profiler
+        self.server.watch(conn)
+        try:
+            username = None
+            while self.server.running:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                conn.bytes_in += len(data)
+                conn.last_active = time.monotonic()
+                if username is None and not decoder.pending() and unframed(data, self.server.max_frame):
+                    self.server.refuse_unframed(conn)
+                    return
+                for frame in decoder.feed(data):
+                    if username is None:
+                        username = self.server.handle_hello(conn, addr, frame)
+                        if username is None:
+                            return
+                    else:
+                        trace = profiler.sample() if profiler.enabled else None
+                        if trace is None:
+                            req = self.server.decode_request(conn, frame)
+                        else:
+                            t0 = time.perf_counter()
+                            req = self.server.decode_request(conn, frame)
+                            trace.add("decode", time.perf_counter() - t0)
+                        self.server.handle_request(conn, username, req)
+        except (OSError, FrameTooLarge):
+            pass  # connection reset, or a client over the frame limit
+        except Exception as e:
+            self.server.metrics.error("client_coroutine", e)
+        finally:
+            self.server.disconnect(conn)
+
+    async def serve(self):
+        srv = await asyncio.start_server(self.handle_client, self.server.host, self.server.port, backlog=1024)
+        self.ready.set()
+        async with srv:
+            await srv.serve_forever()
+
+    def start(self):
+        print(f"Starting server '{self.server.server_name}' on {self.server.host}:{self.server.port} (asyncio)")
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("Shutting down server.")
+            self.server.shutdown()
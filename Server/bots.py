@@ -0,0 +1,251 @@
+"""
+Bot players
+- a bot sits in Lobby.players like anyone else, with a BotConn where the socket would be;
+  it never reads broadcasts, it looks at the lobby when it is its turn
+- bots move through GameServer.handle_request, so they obey exactly the same move rules
+- BotRunner plays bot turns on a small thread pool: it copies what the bot may see under
+  lobby.lock, releases the lock, thinks for at most the per-move budget, then submits the move;
+  a bot whose search fails or whose move is refused passes, so a game without a turn clock
+  never waits on it
+- strategies follow the lobby difficulty:
+  easy   - any legal tile
+  normal - heaviest legal tile (doubles first on ties), on the end it holds most follow-ups for
+  hard   - Monte Carlo determinization: deal the unseen tiles to the opponents (respecting their
+           hand sizes) many times, play every candidate move out with random rollouts and keep
+           the one that wins most; stops when the time budget runs out
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dominoes import tile_set
+
+DEFAULT_BUDGET = 0.2  # seconds a hard bot may think per move
+DEFAULT_THREADS = 2
+MAX_SAMPLES = 2000  # determinizations per move, even with time left
+
+
+class BotConn:
+    # stands in for a Connection; replies to a bot go nowhere
+    bot = True
+    deltas = True
+    session = None
+    slow = False
+
+    def __init__(self, name, difficulty):
+        self.name = name
+        self.difficulty = difficulty
+        self.last_error = None
+
+    def sendall(self, frame, kind=None):
+        return True
+
+    def send_message(self, payload, kind=None):
+        if isinstance(payload, dict) and "error" in payload:
+            self.last_error = payload["error"]
+        return True
+
+    def depth(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def _bits(mask):
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def _pips(ts, mask):
+    pips = ts.pips
+    return sum(pips[i] for i in _bits(mask))
+
+
+class View:
+    # what a bot may know at its turn: own hand, the table and everyone's hand size
+    __slots__ = ("ts", "seq", "me", "hand", "left", "right", "played", "sizes", "passes")
+
+    def __init__(self, lobby, name):
+        ts = self.ts = tile_set(lobby.max_pip)
+        self.seq = lobby.seq
+        self.me = lobby.player_names.index(name)
+        hand = lobby.hands.get(name)
+        self.hand = hand.mask if hand else 0
+        self.left, self.right = lobby.chain.left, lobby.chain.right
+        played = 0
+        for t in lobby.chain:
+            played |= 1 << ts.ids[t]
+        self.played = played
+        self.sizes = [len(lobby.hands[u]) if u in lobby.hands else 0 for u in lobby.player_names]
+        self.passes = lobby.passes_in_row
+
+
+def legal_moves(ts, hand, left, right):
+    # [(tile id, side)]; a tile matching both ends is listed for each side
+    if left is None:
+        return [(tid, "right") for tid in _bits(hand)]
+    pm = ts.pip_masks
+    moves = [(tid, "left") for tid in _bits(hand & pm[left])]
+    if right != left:
+        moves += [(tid, "right") for tid in _bits(hand & pm[right])]
+    return moves
+
+
+def _place(ts, tid, side, left, right):
+    # new (left, right) after playing tile tid on side
+    a, b = ts.tiles[tid]
+    if left is None:
+        return a, b
+    if side == "left":
+        return (b if a == left else a), right
+    return left, (b if a == right else a)
+
+
+def choose_easy(view, budget, rnd):
+    moves = legal_moves(view.ts, view.hand, view.left, view.right)
+    return rnd.choice(moves) if moves else None
+
+
+def choose_normal(view, budget, rnd):
+    ts = view.ts
+    moves = legal_moves(ts, view.hand, view.left, view.right)
+    if not moves:
+        return None
+    def score(move):
+        tid, side = move
+        a, b = ts.tiles[tid]
+        left, right = _place(ts, tid, side, view.left, view.right)
+        rest = view.hand & ~(1 << tid)
+        # tiles we could still play next turn on the ends this leaves open
+        follow = len(_bits(rest & (ts.pip_masks[left] | ts.pip_masks[right])))
+        return (a + b, a == b, follow)
+    return max(moves, key=score)
+
+
+def _rollout(ts, hands, turn, left, right, passes, rnd):
+    # random playout to the end; returns the winning seat (same rules as the move handler)
+    pm = ts.pip_masks
+    n = len(hands)
+    while True:
+        h = hands[turn]
+        cand = h if left is None else h & (pm[left] | pm[right])
+        if cand:
+            ids = _bits(cand)
+            tid = ids[int(rnd() * len(ids))]
+            a, b = ts.tiles[tid]
+            if left is None:
+                left, right = a, b
+            elif (a == left or b == left) and (rnd() < 0.5 or not (a == right or b == right)):
+                left = b if a == left else a
+            else:
+                right = b if a == right else a
+            hands[turn] = h & ~(1 << tid)
+            passes = 0
+            for seat in range(n):
+                if not hands[seat]:
+                    return seat
+        else:
+            passes += 1
+            if passes >= n:
+                pips = [_pips(ts, m) for m in hands]
+                return pips.index(min(pips))
+        turn = (turn + 1) % n
+
+
+def choose_hard(view, budget, rnd):
+    ts = view.ts
+    moves = legal_moves(ts, view.hand, view.left, view.right)
+    if len(moves) <= 1:
+        return moves[0] if moves else None
+    me, n = view.me, len(view.sizes)
+    unseen = _bits(((1 << len(ts.tiles)) - 1) & ~view.hand & ~view.played)
+    others = [(seat, view.sizes[seat]) for seat in range(n) if seat != me]
+    wins = [0] * len(moves)
+    r = rnd.random
+    deadline = time.perf_counter() + budget
+    samples = 0
+    while samples < MAX_SAMPLES and time.perf_counter() < deadline:
+        # one determinization: a guess at who holds which unseen tile
+        rnd.shuffle(unseen)
+        hands = [0] * n
+        hands[me] = view.hand
+        pos = 0
+        for seat, size in others:
+            for tid in unseen[pos:pos + size]:
+                hands[seat] |= 1 << tid
+            pos += size
+        for i, (tid, side) in enumerate(moves):
+            left, right = _place(ts, tid, side, view.left, view.right)
+            trial = list(hands)
+            trial[me] &= ~(1 << tid)
+            if not trial[me] or _rollout(ts, trial, (me + 1) % n, left, right, 0, r) == me:
+                wins[i] += 1
+        samples += 1
+    return moves[max(range(len(moves)), key=wins.__getitem__)]
+
+
+STRATEGIES = {"easy": choose_easy, "normal": choose_normal, "hard": choose_hard}
+
+
+class BotRunner:
+    def __init__(self, server, budget=DEFAULT_BUDGET, threads=DEFAULT_THREADS):
+        self.server = server
+        self.budget = budget
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bot")
+        self.rnd = random.Random()
+        self.moves = 0
+        self.think_time = 0.0
+
+    def poke(self, lobby):
+        # schedule the bot whose turn it is, if any (cheap; safe to call under lobby.lock)
+        if not lobby.started or not lobby.players:
+            return
+        conn = lobby.players[lobby.turn_index % len(lobby.players)][0]
+        if conn is not None and getattr(conn, "bot", False):
+            self.pool.submit(self._turn, lobby, conn, lobby.seq)
+
+    def _current(self, lobby, bot, seq):
+        # still this bot's turn, with nothing played since seq? (caller holds lobby.lock)
+        return (lobby.started and lobby.seq == seq and self.server.lobbies.get(lobby.lobby_id) is lobby
+                and lobby.current_turn_username() == bot.name)
+
+    def _turn(self, lobby, bot, seq):
+        with lobby.lock:
+            if not self._current(lobby, bot, seq):
+                return  # the game moved on or went away while we were queued
+            view = View(lobby, bot.name)
+        # think without the lock
+        t0 = time.perf_counter()
+        try:
+            move = STRATEGIES.get(bot.difficulty, choose_normal)(view, self.budget, self.rnd)
+        except Exception as e:
+            self.server.metrics.error("bot", e)
+            move = None
+        self.think_time += time.perf_counter() - t0
+        self.moves += 1
+        req = {"action": "move", "lobby_id": lobby.lobby_id, "move": "pass"}
+        if move is not None:
+            tid, side = move
+            req.update(move=view.ts.tiles[tid], side=side)
+        try:
+            self.server.handle_request(bot, bot.name, req)
+        except Exception as e:
+            self.server.metrics.error("bot", e)
+        with lobby.lock:
+            if not self._current(lobby, bot, seq):
+                return
+        # the move failed or was refused (bot.last_error says why); pass, or with no turn clock
+        # nobody would ever move for the bot and the game would hang
+        try:
+            self.server.handle_request(bot, bot.name, {"action": "move", "lobby_id": lobby.lobby_id, "move": "pass"})
+        except Exception as e:
+            self.server.metrics.error("bot", e)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,112 @@
+"""
+Lobby chat, kept off the game path
+- each lobby has a room: a ring buffer of its last HISTORY messages plus the ones not yet sent.
+  Rooms sit behind the chat's own lock, never a lobby lock, so chatter can't hold up a move
+- every player has a token bucket (BURST messages, refilled at RATE per second, across all
+  their lobbies); a message over the limit is refused, not queued
+- delivery is batched: the server flushes on its timer wheel every FLUSH seconds, and each room
+  with something new goes out as one frame {"chat": {"lobby_id", "messages": [[seq, user, text, time], ...]}}
+  however many messages piled up
+- a bucket that has filled up again is the same as none, so those are dropped now and then;
+  reconnecting doesn't reset a player's limit
+- new joiners (and spectators, minus what their delay hides) get the buffer as history
+"""
+
+import threading
+import time
+from collections import deque
+
+HISTORY = 50  # messages a room keeps for newcomers
+RATE = 1.0  # messages per second a player may keep up
+BURST = 5  # messages a player may send at once
+MAX_LENGTH = 200  # characters per message
+FLUSH = 0.2  # seconds between deliveries
+PRUNE_EVERY = 60.0  # seconds between sweeps dropping the buckets of players who went quiet
+
+
+class Room:
+    __slots__ = ("history", "pending", "seq")
+
+    def __init__(self):
+        self.history = deque(maxlen=HISTORY)  # [seq, user, text, time]
+        self.pending = []  # posted since the last flush
+        self.seq = 0
+
+
+class Chat:
+    def __init__(self, rate=RATE, burst=BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.rooms = {}  # lobby id -> Room
+        self.dirty = set()  # lobby ids with pending messages
+        self.buckets = {}  # username -> [tokens, when last topped up]
+        self.lock = threading.Lock()
+        self.posted = 0
+        self.limited = 0  # messages refused by the rate limit
+        self.pruned = clock()
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def post(self, lobby_id, username, text):
+        # add a message to a room; None, or why it was refused
+        if not isinstance(text, str) or not text.strip():
+            return "Empty message"
+        text = text.strip()[:MAX_LENGTH]
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.get(username)
+            if bucket is None:
+                bucket = self.buckets[username] = [float(self.burst), now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self.limited += 1
+                return "You are chatting too fast"
+            bucket[0] -= 1
+            room = self.rooms.get(lobby_id)
+            if room is None:
+                room = self.rooms[lobby_id] = Room()
+            room.seq += 1
+            msg = [room.seq, username, text, time.time()]
+            room.history.append(msg)
+            room.pending.append(msg)
+            self.dirty.add(lobby_id)
+            self.posted += 1
+        return None
+
+    def flush(self):
+        # [(lobby id, [messages])] posted since the last flush, one entry per room
+        with self.lock:
+            out = []
+            for lid in self.dirty:
+                room = self.rooms.get(lid)
+                if room is not None and room.pending:
+                    out.append((lid, room.pending))
+                    room.pending = []
+            self.dirty.clear()
+            now = self.clock()
+            if now - self.pruned >= PRUNE_EVERY:
+                self.pruned = now
+                full = self.burst / self.rate
+                for u in [u for u, (_, last) in self.buckets.items() if now - last >= full]:
+                    del self.buckets[u]
+        return out
+
+    def history(self, lobby_id, before=None):
+        # the room's buffered messages (only those sent before `before`, epoch seconds, when given)
+        with self.lock:
+            room = self.rooms.get(lobby_id)
+            msgs = list(room.history) if room is not None else []
+        return msgs if before is None else [m for m in msgs if m[3] <= before]
+
+    def drop(self, lobby_id):
+        with self.lock:
+            self.rooms.pop(lobby_id, None)
+            self.dirty.discard(lobby_id)
+
+
+def legacy(msgs):
+    # the old single-string chat message, for clients that didn't ask for chat_batches
+    return {"chat": "\n".join(f"{m[1]}: {m[2]}" for m in msgs)}
@@ -0,0 +1,275 @@
+"""
+Dominoes message codecs
+- "dz2" / "dz1": compact tagged binary encoding (preferred). Generic, not per-message layouts:
+  every value carries a one-byte type tag
+    * a tile packs into one byte (high nibble | low nibble, pips 0..15)
+    * chains and hands become byte arrays, hand sizes small varints
+    * protocol keys and common strings are two-byte references into a shared string table
+    * decoding only ever builds dict/list/tuple/str/int/float/bool/None
+- the string table is versioned with the codec name and first byte: dz2 is dz1's table plus the
+  keys added since (deltas, turn clocks, sessions, spectators, chat, replays, tournaments). A
+  table is never edited, only extended by appending under a new name; peers negotiate the newest
+  they share, and hello is always sent in dz1, which every binary peer reads
+- "pickle": legacy format kept for old clients, decoded by an unpickler that refuses every global
+- the codec is negotiated in hello; codec_for_frame tells the two apart by their first byte
+- Client/codec.py is a copy of this file; keep the two identical
+"""
+
+import io
+import pickle
+import struct
+
+
+class CodecError(ValueError):
+    pass
+
+
+# --- legacy pickle ---
+
+class _SafeUnpickler(pickle.Unpickler):
+    # protocol messages are plain containers, so no class ever needs to be looked up
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"global '{module}.{name}' is forbidden")
+
+
+class PickleCodec:
+    name = "pickle"
+
+    def encode(self, payload):
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        try:
+            return _SafeUnpickler(io.BytesIO(data)).load()
+        except Exception as e:
+            raise CodecError(f"bad pickle message: {e}")
+
+
+# --- dz1 / dz2 binary ---
+
+T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_REF, T_LIST, T_TUPLE, T_DICT, T_TILE, T_TILES, T_INTMAP = range(13)
+# tags with the high bit set carry an int 0..127 in the low bits
+
+# the shared string tables: every entry encodes as two bytes. A table is part of its codec's
+# version -- extending it means appending under a new codec name, never an in-place edit.
+STRINGS = (
+    "action", "hello", "list", "create_lobby", "join_lobby", "leave_lobby", "start_lobby",
+    "move", "status", "ping", "username", "codecs", "codec", "ok", "error", "server_info",
+    "server_name", "max_lobbies", "max_players_per_lobby", "default_difficulty",
+    "current_lobby_count", "players_connected", "lobbies", "lobby_id", "host", "players",
+    "max_players", "difficulty", "started", "created", "joined", "left", "lobby_update",
+    "game_start", "your_hand", "turn", "chain", "update", "placed_by", "placed_tile",
+    "hands_sizes", "game_over", "winner", "hands", "blocked", "sums", "chat", "side", "pass",
+    "your_level", "pong", "right", "easy", "normal", "hard", "dz1", "pickle",
+)
+STRINGS_2 = STRINGS + (
+    "dz2", "seq", "hand_size", "passed_by", "deadline", "auto", "away", "timeout", "playable",
+    "resync", "snapshot", "deltas", "session", "token", "resumed", "grace", "max_pip",
+    "turn_seconds", "spectator_delay", "version", "if_version", "server_info_unchanged", "page",
+    "page_size", "total", "open", "waiting", "add_bot", "bots_added", "count", "queue", "queued",
+    "unqueued", "matched", "waited", "cancel", "level", "spectate", "spectating", "spectate_delay",
+    "spectate_end", "unspectated", "leave", "delay", "messages", "text", "history", "game",
+    "replays", "replay", "replay_start", "replay_end", "events", "moves", "ended", "seed",
+    "interval", "tournament", "tournaments", "tournament_table", "tournament_over", "standings",
+    "op", "id", "name", "format", "bracket", "round_robin", "seats", "round", "rank", "player",
+    "wins", "games", "pips", "champion", "leader", "state", "tables", "stats", "queue_stats",
+    "profile", "limit",
+)
+DOUBLE = struct.Struct("!d")
+MAX_VARINT = 10  # bytes: 70 bits, room for a 64-bit value and its zigzag sign bit
+
+
+def _varint(n, out):
+    if n >> 7 * MAX_VARINT:
+        raise CodecError("int too large for a dz varint")
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    shift = result = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift == 7 * MAX_VARINT:
+            # capped, or a frame of 0xff bytes costs quadratic time in ever bigger ints
+            raise CodecError("dz varint longer than 10 bytes")
+
+
+def _is_tile(t):
+    return (len(t) == 2 and type(t[0]) is int and type(t[1]) is int
+            and 0 <= t[0] < 16 and 0 <= t[1] < 16)
+
+
+def _enc(obj, out, refs):
+    t = type(obj)
+    if t is str:
+        ref = refs.get(obj)
+        if ref is not None:
+            out += ref
+        else:
+            b = obj.encode("utf-8")
+            out.append(T_STR)
+            _varint(len(b), out)
+            out += b
+    elif t is int:
+        if 0 <= obj < 128:
+            out.append(0x80 | obj)
+        else:
+            out.append(T_INT)
+            _varint(obj << 1 if obj >= 0 else (-obj << 1) - 1, out)  # zigzag
+    elif t is tuple:
+        if _is_tile(obj):
+            out.append(T_TILE)
+            out.append(obj[0] << 4 | obj[1])
+        else:
+            out.append(T_TUPLE)
+            _varint(len(obj), out)
+            for item in obj:
+                _enc(item, out, refs)
+    elif t is list:
+        if obj and all(type(x) is tuple and _is_tile(x) for x in obj):
+            out.append(T_TILES)
+            _varint(len(obj), out)
+            out += bytes(a << 4 | b for a, b in obj)
+        else:
+            out.append(T_LIST)
+            _varint(len(obj), out)
+            for item in obj:
+                _enc(item, out, refs)
+    elif t is dict:
+        if obj and all(type(v) is int and v >= 0 for v in obj.values()):
+            out.append(T_INTMAP)
+            _varint(len(obj), out)
+            for k, v in obj.items():
+                _enc(k, out, refs)
+                _varint(v, out)
+        else:
+            out.append(T_DICT)
+            _varint(len(obj), out)
+            for k, v in obj.items():
+                _enc(k, out, refs)
+                _enc(v, out, refs)
+    elif obj is None:
+        out.append(T_NONE)
+    elif obj is True:
+        out.append(T_TRUE)
+    elif obj is False:
+        out.append(T_FALSE)
+    elif t is float:
+        out.append(T_FLOAT)
+        out += DOUBLE.pack(obj)
+    else:
+        raise CodecError(f"dz cannot encode {t.__name__}")
+
+
+def _dec(data, pos, strings):
+    tag = data[pos]
+    pos += 1
+    if tag & 0x80:
+        return tag & 0x7F, pos
+    if tag == T_REF:
+        return strings[data[pos]], pos + 1
+    if tag == T_TILE:
+        b = data[pos]
+        return (b >> 4, b & 0x0F), pos + 1
+    if tag == T_TILES:
+        n, pos = _read_varint(data, pos)
+        raw = data[pos:pos + n]
+        if len(raw) != n:
+            raise CodecError("truncated tile array")
+        return [(b >> 4, b & 0x0F) for b in raw], pos + n
+    if tag == T_STR:
+        n, pos = _read_varint(data, pos)
+        raw = data[pos:pos + n]
+        if len(raw) != n:
+            raise CodecError("truncated string")
+        return raw.decode("utf-8"), pos + n
+    if tag == T_DICT:
+        n, pos = _read_varint(data, pos)
+        d = {}
+        for _ in range(n):
+            k, pos = _dec(data, pos, strings)
+            d[k], pos = _dec(data, pos, strings)
+        return d, pos
+    if tag == T_INTMAP:
+        n, pos = _read_varint(data, pos)
+        d = {}
+        for _ in range(n):
+            k, pos = _dec(data, pos, strings)
+            d[k], pos = _read_varint(data, pos)
+        return d, pos
+    if tag == T_LIST or tag == T_TUPLE:
+        n, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(n):
+            item, pos = _dec(data, pos, strings)
+            items.append(item)
+        return (items if tag == T_LIST else tuple(items)), pos
+    if tag == T_INT:
+        z, pos = _read_varint(data, pos)
+        return (z >> 1) ^ -(z & 1), pos
+    if tag == T_NONE:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_FLOAT:
+        return DOUBLE.unpack_from(data, pos)[0], pos + DOUBLE.size
+    raise CodecError(f"unknown dz tag {tag}")
+
+
+class BinaryCodec:
+    def __init__(self, name, magic, strings):
+        assert len(strings) <= 256 and len(set(strings)) == len(strings)
+        self.name = name
+        self.magic = bytes((magic,))
+        self.strings = strings
+        self.refs = {s: bytes((T_REF, i)) for i, s in enumerate(strings)}
+
+    def encode(self, payload):
+        out = bytearray(self.magic)
+        _enc(payload, out, self.refs)
+        return bytes(out)
+
+    def decode(self, data):
+        if data[:1] != self.magic:
+            raise CodecError(f"not a {self.name} message")
+        try:
+            value, pos = _dec(data, 1, self.strings)
+        except CodecError:
+            raise
+        except (IndexError, KeyError, ValueError, TypeError, struct.error, RecursionError) as e:
+            # malformed input: truncated, bad unicode, unhashable dict key, too deeply nested...
+            raise CodecError(f"bad {self.name} message: {e!r}")
+        if pos != len(data):
+            raise CodecError(f"trailing bytes after {self.name} message")
+        return value
+
+
+BINARY = BinaryCodec("dz1", 0xd7, STRINGS)  # what hello goes out in
+BINARY_2 = BinaryCodec("dz2", 0xd8, STRINGS_2)
+PICKLE = PickleCodec()
+CODECS = {BINARY_2.name: BINARY_2, BINARY.name: BINARY, PICKLE.name: PICKLE}  # in order of preference
+_BY_FIRST_BYTE = {BINARY.magic[0]: BINARY, BINARY_2.magic[0]: BINARY_2, 0x80: PICKLE}
+
+
+def codec_for_frame(frame, enabled=CODECS):
+    # which of the enabled codecs produced this frame body (None if none of them)
+    codec = _BY_FIRST_BYTE.get(frame[0]) if frame else None
+    return codec if codec is not None and codec.name in enabled else None
+
+
+def negotiate(offered, enabled=CODECS):
+    # first codec in our order of preference that the peer also offered
+    for name, codec in enabled.items():
+        if name in offered:
+            return codec
+    return None
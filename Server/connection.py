@@ -0,0 +1,169 @@
+"""
+Server-side client connections
+- Connection wraps a blocking socket for the threaded engine (aio_server.StreamConn wraps a stream)
+- each connection carries the codec negotiated in hello; replies are encoded with it
+- deltas: whether the client asked for delta move updates in hello; chat_batches: whether it
+  reads batched chat (see chat.py), older clients get "user: text" lines
+- outbound frames go on a bounded per-connection queue drained by a writer (thread or task),
+  so a broadcast never blocks on a slow client's socket
+- backpressure: a newer frame of a coalescable kind (snapshots, status, server info, full
+  updates) replaces the queued one; if the queue is still full the client is disconnected
+- detach() flushes the queue and stops the writer but leaves the socket open, so the socket
+  can be handed to another worker process (see supervisor.py)
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+
+from codec import PICKLE
+from profiler import current
+from protocol import pack_message
+
+DEFAULT_MAX_QUEUE = 256  # frames
+DETACH_TIMEOUT = 5.0  # seconds to flush the queue before a handoff
+# message kinds where only the newest queued copy matters
+COALESCE = {"snapshot", "status", "server_info", "update_full"}
+
+
+class Connection:
+    bot = False  # see bots.BotConn
+
+    def __init__(self, sock, max_queue=DEFAULT_MAX_QUEUE):
+        self.sock = sock
+        self.codec = PICKLE  # until hello says otherwise
+        self.deltas = False
+        self.chat_batches = False
+        self.session = None  # token issued in hello
+        self.migrate_to = None  # worker a join_lobby asked to move this connection to (supervisor mode)
+        self.max_queue = max_queue
+        self.queue = deque()  # (kind, frame)
+        self.qcond = threading.Condition()
+        self.closed = False
+        self.detached = False
+        self.writer_thread = None
+        self.slow = False  # disconnected for not keeping up
+        self.max_depth = 0
+        self.sent = 0
+        self.bytes_in = 0  # counted by the reader
+        self.bytes_out = 0  # counted by the writer
+        self.last_active = time.monotonic()  # last read from the client, set by the reader
+        self.coalesced = 0
+
+    def start(self):
+        self.writer_thread = threading.Thread(target=self._writer, daemon=True)
+        self.writer_thread.start()
+
+    def sendall(self, frame, kind=None):
+        # queue an encoded frame; never blocks
+        trace = current()
+        if trace is None:
+            return self._enqueue(frame, kind)
+        t0 = time.perf_counter()
+        ok = self._enqueue(frame, kind)
+        trace.add("send", time.perf_counter() - t0)
+        return ok
+
+    def _enqueue(self, frame, kind):
+        with self.qcond:
+            if self.closed:
+                return False
+            if kind in COALESCE:
+                for entry in self.queue:
+                    if entry[0] == kind:
+                        # the newer copy goes last so it lands after any deltas it already includes
+                        self.queue.remove(entry)
+                        self.coalesced += 1
+                        break
+            overflow = len(self.queue) >= self.max_queue
+            if not overflow:
+                self.queue.append((kind, frame))
+                self.max_depth = max(self.max_depth, len(self.queue))
+                self.qcond.notify()
+        if overflow:
+            self.slow = True
+            self.abort()
+            return False
+        self._wake()
+        return True
+
+    def send_message(self, payload, kind=None):
+        trace = current()
+        if trace is None:
+            return self.sendall(pack_message(payload, self.codec), kind)
+        t0 = time.perf_counter()
+        frame = pack_message(payload, self.codec)
+        trace.add("encode", time.perf_counter() - t0)
+        return self.sendall(frame, kind)
+
+    def depth(self):
+        return len(self.queue)
+
+    def metrics(self):
+        return {"depth": len(self.queue), "max_depth": self.max_depth, "sent": self.sent,
+                "coalesced": self.coalesced, "slow": self.slow}
+
+    def close(self):
+        # graceful: the writer flushes what is queued, then closes the socket
+        with self.qcond:
+            self.closed = True
+            self.qcond.notify()
+        self._wake()
+
+    def abort(self):
+        # drop everything queued and cut the connection; the reader sees EOF and cleans up
+        with self.qcond:
+            self.closed = True
+            self.queue.clear()
+            self.qcond.notify()
+        self._shutdown()
+
+    def detach(self):
+        # stop queueing, let the writer send what is queued and exit, keep the socket open;
+        # False if the queue could not be flushed in time (the connection is cut then)
+        with self.qcond:
+            self.closed = True
+            self.detached = True
+            self.qcond.notify()
+        self.writer_thread.join(DETACH_TIMEOUT)
+        if self.writer_thread.is_alive() or not self.detached:
+            self.detached = False
+            self.abort()
+            self.sock.close()
+            return False
+        return True
+
+    # --- engine-specific parts (threaded engine below) ---
+
+    def _wake(self):
+        pass  # the writer thread waits on qcond
+
+    def _shutdown(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _writer(self):
+        while True:
+            with self.qcond:
+                while not self.queue and not self.closed:
+                    self.qcond.wait()
+                if not self.queue:
+                    break  # closed and drained
+                batch = list(self.queue)
+                self.queue.clear()
+            try:
+                # one syscall for everything that piled up
+                data = b"".join(frame for _, frame in batch)
+                self.sock.sendall(data)
+                self.bytes_out += len(data)
+            except OSError:
+                self.detached = False  # nothing left to hand over
+                self.abort()
+                break
+            self.sent += len(batch)
+        if not self.detached:
+            self._shutdown()  # wakes a reader still blocked in recv; closing alone would not
+            self.sock.close()
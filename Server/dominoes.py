@@ -0,0 +1,254 @@
+"""
+Domino sets and hands
+- TileSet numbers every tile of a double-N set and precomputes, per pip, the mask of tiles showing it;
+  the supported sets (double-6/9/12/15) are built once at import and never change
+- deal() runs a partial Fisher-Yates shuffle over a copy of the set's id template, shuffling only
+  the tiles that actually get dealt
+- Hand is a bitmask over those tile ids (28 bits for double-six; Python ints grow for bigger sets):
+  membership and removal are single bit ops, "which of my tiles match end X" is one AND,
+  and the pip total is kept up to date as tiles leave the hand
+- Chain is the layout on the table: a deque (O(1) plays on either side) with the two open end
+  values, a per-pip count of tiles already played and the positions of doubles/the spinner cached
+"""
+
+import random
+from collections import deque
+
+SET_SIZES = (6, 9, 12, 15)  # double-N sets a lobby can play with
+
+
+class TileSet:
+    def __init__(self, max_pip):
+        self.max_pip = max_pip
+        self.tiles = tuple((i, j) for i in range(max_pip + 1) for j in range(i, max_pip + 1))
+        self.ids = {}  # (a,b) and (b,a) -> tile id
+        self.pip_masks = [0] * (max_pip + 1)  # pip -> mask of tiles with that pip on either face
+        for tid, (a, b) in enumerate(self.tiles):
+            self.ids[(a, b)] = self.ids[(b, a)] = tid
+            self.pip_masks[a] |= 1 << tid
+            self.pip_masks[b] |= 1 << tid
+        self.pips = tuple(a + b for a, b in self.tiles)
+        self.deck_template = tuple(range(len(self.tiles)))  # tile ids, copied for every deal
+
+    def tiles_in(self, mask):
+        # tiles for the set bits of a mask, in id order
+        tiles = self.tiles
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(tiles[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+
+def valid_tile(tile, max_pip):
+    # exactly two int pips (bools and floats don't count) in 0..max_pip; moves come off the wire
+    return (isinstance(tile, (tuple, list)) and len(tile) == 2
+            and all(type(p) is int and 0 <= p <= max_pip for p in tile))
+
+
+def orient_for_left(tile, left_val):
+    a, b = tile
+    if b == left_val:
+        return (a, b)  # new_tile right == left_val
+    if a == left_val:
+        return (b, a)
+    return None
+
+
+def orient_for_right(tile, right_val):
+    a, b = tile
+    if a == right_val:
+        return (a, b)  # new_tile left == right_val
+    if b == right_val:
+        return (b, a)
+    return None
+
+
+_TILE_SETS = {n: TileSet(n) for n in SET_SIZES}
+
+
+def tile_set(max_pip=6):
+    ts = _TILE_SETS.get(max_pip)
+    if ts is None:
+        ts = _TILE_SETS[max_pip] = TileSet(max_pip)
+    return ts
+
+
+def deal(tileset, n_hands, per_hand, rnd=random.random):
+    # n_hands Hands of up to per_hand tiles each (the last ones come up short if the set runs out)
+    ids = list(tileset.deck_template)
+    n = len(ids)
+    k = min(n_hands * per_hand, n)
+    # partial Fisher-Yates: only the first k slots need to be random
+    for i in range(k):
+        j = i + int(rnd() * (n - i))
+        ids[i], ids[j] = ids[j], ids[i]
+    return [Hand.from_ids(tileset, ids[h * per_hand:min((h + 1) * per_hand, k)]) for h in range(n_hands)]
+
+
+class Hand:
+    __slots__ = ("tileset", "mask", "pips", "count")
+
+    def __init__(self, tileset, tiles=()):
+        self.tileset = tileset
+        self.mask = 0
+        self.pips = 0
+        self.count = 0
+        for t in tiles:
+            self.add(t)
+
+    @classmethod
+    def from_ids(cls, tileset, ids):
+        hand = cls(tileset)
+        pips = tileset.pips
+        mask = total = 0
+        for tid in ids:
+            mask |= 1 << tid
+            total += pips[tid]
+        hand.mask, hand.pips, hand.count = mask, total, len(ids)
+        return hand
+
+    @classmethod
+    def from_mask(cls, tileset, mask):
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(low.bit_length() - 1)
+            mask ^= low
+        return cls.from_ids(tileset, ids)
+
+    def _id(self, tile):
+        try:
+            return self.tileset.ids.get((tile[0], tile[1]))
+        except (TypeError, IndexError, KeyError):
+            return None
+
+    def __contains__(self, tile):
+        # either orientation counts
+        tid = self._id(tile)
+        return tid is not None and (self.mask >> tid) & 1 == 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.tiles())
+
+    def add(self, tile):
+        tid = self.tileset.ids[(tile[0], tile[1])]
+        if not (self.mask >> tid) & 1:
+            self.mask |= 1 << tid
+            self.pips += self.tileset.pips[tid]
+            self.count += 1
+
+    def remove(self, tile):
+        tid = self._id(tile)
+        if tid is None or not (self.mask >> tid) & 1:
+            raise ValueError(f"{tile} not in hand")
+        self.mask &= ~(1 << tid)
+        self.pips -= self.tileset.pips[tid]
+        self.count -= 1
+
+    def matching(self, end):
+        # mask of tiles that can be played against an open end showing `end` pips
+        return self.mask & self.tileset.pip_masks[end]
+
+    def tiles(self, mask=None):
+        return self.tileset.tiles_in(self.mask if mask is None else mask)
+
+
+class Chain:
+    __slots__ = ("tiles", "left", "right", "pip_counts", "doubles", "spinner", "first")
+
+    def __init__(self, max_pip=6):
+        self.tiles = deque()  # oriented tiles, left to right
+        self.left = None  # open end values
+        self.right = None
+        self.pip_counts = [0] * (max_pip + 1)  # pip -> tiles on the table showing it
+        # positions are stable across left plays: the first tile placed is 0, tiles to its left go negative
+        self.doubles = []  # positions of doubles, in the order they were played
+        self.spinner = None  # position of the first double
+        self.first = 0  # position of tiles[0]
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def __getitem__(self, i):
+        # deque indexing is O(1) at both ends, which is what chain[0] / chain[-1] callers use
+        return self.tiles[i]
+
+    def orient_left(self, tile):
+        return orient_for_left(tile, self.left)
+
+    def orient_right(self, tile):
+        return orient_for_right(tile, self.right)
+
+    def _check(self, tile):
+        # before anything changes, so a bad tile leaves the chain as it was
+        if not valid_tile(tile, len(self.pip_counts) - 1):
+            raise ValueError(f"not a tile of this set: {tile!r}")
+
+    def _count(self, tile, pos):
+        a, b = tile
+        self.pip_counts[a] += 1
+        if a == b:
+            self.doubles.append(pos)
+            if self.spinner is None:
+                self.spinner = pos
+        else:
+            self.pip_counts[b] += 1
+
+    def append(self, oriented):
+        # place on the right; the caller has already oriented the tile to match
+        self._check(oriented)
+        if not self.tiles:
+            self.left = oriented[0]
+        self.tiles.append(oriented)
+        self.right = oriented[1]
+        self._count(oriented, self.first + len(self.tiles) - 1)
+
+    def appendleft(self, oriented):
+        self._check(oriented)
+        if not self.tiles:
+            self.right = oriented[1]
+        else:
+            self.first -= 1
+        self.tiles.appendleft(oriented)
+        self.left = oriented[0]
+        self._count(oriented, self.first)
+
+    def index(self, pos):
+        # list index of a stable position (e.g. spinner) in to_list()
+        return pos - self.first
+
+    def exhausted(self, pip, tiles_per_pip):
+        # every tile showing this pip is already on the table, so nobody can match it
+        return self.pip_counts[pip] >= tiles_per_pip
+
+    def to_list(self):
+        # the wire format: list of (a,b) tuples, left to right
+        return list(self.tiles)
+
+    def state(self):
+        # everything needed to rebuild the chain exactly (see restore)
+        return {"tiles": self.to_list(), "first": self.first, "doubles": list(self.doubles)}
+
+    @classmethod
+    def restore(cls, max_pip, state):
+        chain = cls(max_pip)
+        tiles = [tuple(t) for t in state["tiles"]]
+        chain.tiles.extend(tiles)
+        if tiles:
+            chain.left, chain.right = tiles[0][0], tiles[-1][1]
+        for a, b in tiles:
+            chain.pip_counts[a] += 1
+            if a != b:
+                chain.pip_counts[b] += 1
+        chain.first = state["first"]
+        chain.doubles = list(state["doubles"])  # in play order, which the layout alone doesn't tell
+        chain.spinner = chain.doubles[0] if chain.doubles else None
+        return chain
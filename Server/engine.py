@@ -0,0 +1,125 @@
+"""
+Game rules, free of sockets, locks and threads
+- GameState is one game: seats, hands (bitmask Hands), the chain, whose turn, passes in a row
+  and the event sequence number
+- start() deals, play() / pass_turn() apply a move after checking it, result() tells whether
+  the game is over (a hand emptied, or nobody can play) and who won
+- Lobby (main.py) is a GameState plus connections and a lock; the simulator (simulate.py),
+  the bots and the benchmarks use GameState directly
+"""
+
+import random
+
+from dominoes import Chain, deal, tile_set, valid_tile
+
+DEAL_SIZES = {"easy": 8, "normal": 12, "hard": 14}  # tiles per hand by lobby difficulty
+
+
+class IllegalMove(ValueError):
+    pass
+
+
+def sum_pips(tiles):
+    return sum(a + b for a, b in tiles)
+
+
+class GameState:
+    def __init__(self, max_pip=6, player_names=()):
+        self.max_pip = max_pip  # double-N domino set
+        self.player_names = list(player_names)
+        self.chain = Chain(max_pip)
+        self.hands = {}  # username -> Hand
+        self.turn_index = 0
+        self.passes_in_row = 0
+        self.seq = 0  # number of the last move/pass event of the current game
+
+    def start(self, per_hand, rnd=random.random):
+        # deal a new game to the current seats
+        dealt = deal(tile_set(self.max_pip), len(self.player_names), per_hand, rnd)
+        self.hands = dict(zip(self.player_names, dealt))
+        self.chain = Chain(self.max_pip)
+        self.turn_index = 0
+        self.passes_in_row = 0
+        self.seq = 0
+
+    def reset(self):
+        self.hands = {}
+        self.chain = Chain(self.max_pip)
+        self.turn_index = 0
+
+    def current_turn_username(self):
+        if not self.player_names: return None
+        return self.player_names[self.turn_index % len(self.player_names)]
+
+    def hands_sizes(self):
+        return {u: len(h) for u,h in self.hands.items()}
+
+    def playable(self, hand):
+        # {"left": tiles, "right": tiles} the hand can play on each open end (anything on an empty chain)
+        if hand is None:
+            return {"left": [], "right": []}
+        if not self.chain:
+            tiles = hand.tiles()
+            return {"left": tiles, "right": tiles}
+        return {"left": hand.tiles(hand.matching(self.chain.left)), "right": hand.tiles(hand.matching(self.chain.right))}
+
+    def is_blocked(self):
+        # no hand can match either end: one AND per hand per end
+        if not self.chain or not self.hands:
+            return False
+        left, right = self.chain.left, self.chain.right
+        per_pip = len(self.chain.pip_counts)  # a double-N set has N+1 tiles showing each pip
+        if self.chain.exhausted(left, per_pip) and self.chain.exhausted(right, per_pip):
+            return True
+        for h in self.hands.values():
+            if h.matching(left) or h.matching(right):
+                return False
+        return True
+
+    def _advance(self):
+        self.turn_index = (self.turn_index + 1) % len(self.player_names)
+
+    def play(self, username, tile, side="right"):
+        # place a tile from username's hand; returns (tile as laid, side) or raises IllegalMove
+        if not valid_tile(tile, self.max_pip):
+            raise IllegalMove("Not a tile of this set")
+        tile = tuple(tile)
+        hand = self.hands.get(username)
+        # Hand membership is a bit test and covers both orientations
+        if hand is None or tile not in hand:
+            raise IllegalMove("You don't have that tile")
+        if not self.chain:
+            # the first tile goes down as dealt, [low|high]
+            placed, side = (min(tile), max(tile)), "right"
+            self.chain.append(placed)
+        elif side == "left":
+            placed = self.chain.orient_left(tile)  # against the cached leftmost face
+            if placed is None:
+                raise IllegalMove("Tile does not match left end")
+            self.chain.appendleft(placed)
+        else:
+            side = "right"
+            placed = self.chain.orient_right(tile)
+            if placed is None:
+                raise IllegalMove("Tile does not match right end")
+            self.chain.append(placed)
+        hand.remove(tile)
+        self.passes_in_row = 0
+        self._advance()
+        return placed, side
+
+    def pass_turn(self):
+        self.passes_in_row += 1
+        self._advance()
+
+    def result(self):
+        # None while the game goes on; else {"winner"} when a hand is empty, or
+        # {"blocked", "winner", "sums"} when everyone passed or nobody holds a tile matching either
+        # open end (there is no boneyard to draw from) - least pips wins
+        for u,h in self.hands.items():
+            if len(h) == 0:
+                return {"winner": u}
+        if (self.passes_in_row >= len(self.player_names) and self.passes_in_row > 0) or self.is_blocked():
+            sums = {u: h.pips for u,h in self.hands.items()}  # each Hand keeps its running total
+            return {"blocked": True, "winner": min(sums, key=sums.get), "sums": sums}
+        return None
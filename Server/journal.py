@@ -0,0 +1,180 @@
+"""
+Crash-safe game state
+- every started game is journaled: a full lobby snapshot when it starts and again every
+  snapshot_every moves, with one small record per move or pass in between
+- the move handler only appends to an in-memory queue; a writer thread encodes the records as
+  JSON lines, appends them to the journal and fsyncs every fsync_interval seconds
+- the writer keeps, per live game, its latest snapshot line plus the move lines after it; once the
+  journal passes compact_after lines those go to a fresh checkpoint file and the journal starts
+  over, so finished games and moves already folded into a snapshot drop out
+- recover() reads checkpoint + journal and returns, per live game, its last snapshot and the moves
+  made after it; GameServer rebuilds those as started lobbies (see Lobby.from_state / replay)
+
+records: ["snap", lid, state] ["move", lid, seq, username, tile, side] ["pass", lid, seq, username] ["end", lid]
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_SNAPSHOT_EVERY = 32  # moves between lobby snapshots
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_FSYNC_INTERVAL = 1.0
+DEFAULT_COMPACT_AFTER = 500000  # journal lines
+
+
+class GameJournal:
+    def __init__(self, path, snapshot_every=DEFAULT_SNAPSHOT_EVERY, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, compact_after=DEFAULT_COMPACT_AFTER):
+        self.path = path
+        self.checkpoint_path = path + ".ckpt"
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.live = {}  # lid -> [snapshot line, move lines...]; writer thread only
+        self.pending = []  # records not yet written
+        self.cond = threading.Condition()
+        self.closed = False
+        self.file = None
+        self.lines = 0
+        self.last_sync = time.monotonic()
+        self.records = 0
+        self.thread = None
+
+    # --- called from the game (under the lobby lock) ---
+
+    def started(self, lobby):
+        self._queue(["snap", lobby.lobby_id, lobby.state()])
+
+    def event(self, lobby, event):
+        # one broadcast move/pass event; every snapshot_every-th also snapshots the lobby
+        if "passed_by" in event:
+            rec = ["pass", lobby.lobby_id, event["seq"], event["passed_by"]]
+        else:
+            rec = ["move", lobby.lobby_id, event["seq"], event["placed_by"], event["placed_tile"], event["side"]]
+        if event["seq"] % self.snapshot_every == 0:
+            self._queue(rec, ["snap", lobby.lobby_id, lobby.state()])
+        else:
+            self._queue(rec)
+
+    def ended(self, lobby_id):
+        self._queue(["end", lobby_id])
+
+    def _queue(self, *recs):
+        with self.cond:
+            self.pending.extend(recs)
+
+    # --- recovery, before the writer starts ---
+
+    def _apply(self, rec, line, parsed=None):
+        kind, lid = rec[0], rec[1]
+        if kind == "snap":
+            self.live[lid] = [line]
+            if parsed is not None:
+                parsed[lid] = [rec]
+        elif kind == "end":
+            self.live.pop(lid, None)
+            if parsed is not None:
+                parsed.pop(lid, None)
+        elif lid in self.live:
+            self.live[lid].append(line)
+            if parsed is not None:
+                parsed[lid].append(rec)
+
+    def _read(self, path):
+        # (records, lines) of a journal file, dropping a torn or corrupt tail
+        with open(path, "rb") as f:
+            data = f.read()
+        lines = data[:data.rfind(b"\n") + 1].decode("utf-8", "replace").splitlines(keepends=True)
+        try:
+            # one parse for the whole file instead of one per line
+            return json.loads("[" + ",".join(lines) + "]"), lines
+        except ValueError:
+            recs = []
+            for line in lines:
+                try:
+                    recs.append(json.loads(line))
+                except ValueError:
+                    break
+            return recs, lines[:len(recs)]
+
+    def recover(self):
+        # [(state, [move/pass records after it]), ...] for every game still running at the crash
+        parsed = {}
+        for path in (self.checkpoint_path, self.path):
+            if not os.path.exists(path):
+                continue
+            recs, lines = self._read(path)
+            for rec, line in zip(recs, lines):
+                self._apply(rec, line, parsed)
+            if path == self.path:
+                self.lines = len(lines)
+                with open(path, "r+b") as f:
+                    f.truncate(sum(len(l.encode("utf-8")) for l in lines))
+        return [(recs[0][2], recs[1:]) for recs in parsed.values()]
+
+    def start(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # --- writer thread ---
+
+    def flush(self, sync=False):
+        with self.cond:
+            recs, self.pending = self.pending, []
+        if recs:
+            out = []
+            for rec in recs:
+                line = json.dumps(rec, separators=(",", ":")) + "\n"
+                self._apply(rec, line)
+                out.append(line)
+            self.file.write("".join(out))
+            self.file.flush()
+            self.lines += len(out)
+            self.records += len(out)
+        now = time.monotonic()
+        if self.lines >= self.compact_after:
+            self.compact()
+        elif recs and (sync or now - self.last_sync >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_sync = now
+
+    def compact(self):
+        # live games only, into a new checkpoint; the old one stays valid until the rename
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for lines in self.live.values():
+                f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+        self.file.close()
+        self.file = open(self.path, "w", encoding="utf-8")
+        os.fsync(self.file.fileno())
+        self.lines = 0
+        self.last_sync = time.monotonic()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.closed:
+                    self.cond.wait(self.flush_interval)
+                closed = self.closed
+            try:
+                self.flush()
+            except OSError as e:
+                print("game journal write failed:", e)
+            if closed:
+                break
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread:
+            self.thread.join()
+            self.flush(sync=True)
+            self.file.close()
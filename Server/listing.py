@@ -0,0 +1,174 @@
+"""
+Cached, versioned server info for the lobby browser
+- the server bumps a version whenever a lobby row changes (lobby created, removed,
+  started/finished, a seat taken or freed); logins and logouts don't
+- the lobby rows are rebuilt lazily, at most once per version, on the first list after a change
+- each (codec, page, filters) reply is encoded once per version and kept as a ready frame,
+  so answering list is a single buffer write
+- players_connected is versioned apart: the listed count is refreshed at most every
+  PLAYERS_REFRESH seconds, and a new count only re-encodes the frames (same rows, same version)
+- a client that sends if_version equal to the current version gets a tiny "unchanged" reply,
+  which carries the current player count
+- listing can be paged and filtered by difficulty, open seats and not-started
+- under the supervisor (supervisor.py) each worker also lists the lobbies its peers publish;
+  versions then count in steps of the worker count from a per-worker start, so a version
+  seen on one worker never matches another's
+"""
+
+import threading
+import time
+
+from protocol import pack_message
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_CACHED_FRAMES = 256  # per version; odd filter combinations beyond this are encoded per request
+PLAYERS_REFRESH = 1.0  # seconds the listed player count may lag behind logins and logouts
+
+
+def list_params(req):
+    # normalised (page, page_size, difficulty, open_only, waiting_only) from a list request
+    page = req.get("page")
+    size = req.get("page_size")
+    if page is not None or size is not None:
+        try:
+            page = max(int(page or 0), 0)
+            size = min(max(int(size or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            page, size = 0, DEFAULT_PAGE_SIZE
+    difficulty = req.get("difficulty")
+    if not isinstance(difficulty, str):
+        difficulty = None
+    return (page, size, difficulty, bool(req.get("open")), bool(req.get("waiting")))
+
+
+class ServerInfoCache:
+    def __init__(self, server, version=1, step=1):
+        self.server = server
+        self.version = version
+        self.step = step
+        self.local_changes = 0  # touch() calls only; what the supervisor publishes to peers
+        self.lock = threading.Lock()  # version bumps and rebuilds
+        self.built_version = 0
+        self.header = {}
+        self.rows = []  # lobby rows sorted by lobby id
+        self.frames = {}  # (codec name, params) -> frame for built_version and players
+        self.players = 0  # players_connected as listed
+        self.players_at = None  # when it was last counted (monotonic)
+
+    def touch(self):
+        # something in the listing changed; the next reader rebuilds
+        with self.lock:
+            self.version += self.step
+            self.local_changes += 1
+
+    def refresh(self):
+        # a peer worker's lobbies changed: rebuild, but there is nothing new to publish
+        with self.lock:
+            self.version += self.step
+
+    def local_rows(self):
+        # this process's own lobbies, sorted by lobby id
+        rows = []
+        for l in sorted(self.server.lobbies.values(), key=lambda l: l.lobby_id):
+            rows.append({
+                "lobby_id": l.lobby_id,
+                "host": l.host_name,
+                "players": len(l.players),
+                "max_players": l.max_players,
+                "difficulty": l.difficulty,
+                "max_pip": l.max_pip,
+                "turn_seconds": l.turn_seconds,
+                "started": l.started
+            })
+        return rows
+
+    def _build(self):
+        # caller holds self.lock; read the version first so a concurrent change forces another rebuild
+        version = self.version
+        server = self.server
+        rows = self.local_rows()
+        max_lobbies = server.max_lobbies
+        if server.cluster is not None:
+            for peer in server.cluster.peer_listings():
+                rows += peer["rows"]
+            rows.sort(key=lambda r: r["lobby_id"])
+            max_lobbies = server.cluster.max_lobbies
+        self.header = {
+            "server_name": server.server_name,
+            "max_lobbies": max_lobbies,
+            "max_players_per_lobby": server.max_players_per_lobby,
+            "default_difficulty": server.default_difficulty,
+            "current_lobby_count": len(rows),
+            "version": version,
+        }
+        self.rows = rows
+        self.frames = {}
+        self.built_version = version
+
+    def _count_players(self):
+        # caller holds self.lock; a changed count drops the encoded frames, not the rows
+        now = time.monotonic()
+        if self.players_at is not None and now - self.players_at < PLAYERS_REFRESH:
+            return
+        self.players_at = now
+        server = self.server
+        players = len(server.clients)
+        if server.cluster is not None:
+            players += server.cluster.peer_players()
+        if players != self.players:
+            self.players = players
+            self.frames = {}
+
+    def _current(self):
+        # (header, rows, frames) for the current version, rebuilding if stale; caller holds self.lock
+        if self.built_version != self.version:
+            self._build()
+        self._count_players()
+        return dict(self.header, players_connected=self.players), self.rows, self.frames
+
+    def info(self, params=(None, None, None, False, False)):
+        with self.lock:
+            header, rows = self._current()[:2]
+        page, size, difficulty, open_only, waiting_only = params
+        if difficulty:
+            rows = [r for r in rows if r["difficulty"] == difficulty]
+        if open_only:
+            rows = [r for r in rows if r["players"] < r["max_players"]]
+        if waiting_only:
+            rows = [r for r in rows if not r["started"]]
+        info = dict(header)
+        if page is None:
+            info["lobbies"] = rows
+        else:
+            info["lobbies"] = rows[page * size:(page + 1) * size]
+            info["page"], info["page_size"], info["total"] = page, size, len(rows)
+        return info
+
+    def frame(self, codec, params):
+        # the encoded {"server_info": ...} reply for this codec and listing
+        key = (codec.name, params)
+        with self.lock:
+            frames = self._current()[2]
+            frame = frames.get(key)
+        if frame is None:
+            info = self.info(params)
+            frame = pack_message({"server_info": info}, codec)
+            with self.lock:
+                # only keep it if nothing changed while we were encoding
+                if (self.built_version == info["version"] and self.players == info["players_connected"]
+                        and len(self.frames) < MAX_CACHED_FRAMES):
+                    self.frames[key] = frame
+        return frame
+
+    def unchanged(self, codec, version):
+        # frame telling a client its copy is current, or None if it is stale
+        key = (codec.name, "unchanged")
+        with self.lock:
+            if version != self.version:
+                return None
+            frame = self._current()[2].get(key)
+            if frame is None:
+                unchanged = {"version": version, "players_connected": self.players}
+                frame = self.frames[key] = pack_message({"server_info_unchanged": unchanged}, codec)
+        return frame
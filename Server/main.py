@@ -2,16 +2,88 @@
 Dominoes Server (prototype)
 - supports multiple lobbies
 - server settings provided at startup (server name, max players per lobby, max lobbies, difficulty)
-- in-memory player stats and levels
-- clients talk via pickle-serialized dicts
+- player stats and levels, in memory and optionally persisted through a write-behind store (see stats_store.py)
+- lobbies live in a sharded registry (see registry.py); each lobby has its own lock
+- the lobby listing is cached per version and pre-encoded (see listing.py); anything that changes
+  a lobby row calls self.server_info.touch() (the player count is refreshed on its own)
+- clients talk via dicts in length-prefixed frames (see protocol.py), encoded with the
+  compact dz2 (or dz1) binary codec or, for old clients, a restricted pickle (see codec.py).
+  Replies use the codec negotiated in hello; requests are read in whichever enabled codec they
+  arrive in, since a client sends in dz1 until it has read our hello reply
+- threaded engine (one thread per connection) or asyncio engine (see aio_server.py)
+- bot seats (see bots.py) play through the same move handler, on their own threads
+- optional game journal (see journal.py): running games survive a restart, and players get back
+  into their seat by saying hello with the session token they were given
+- optional supervisor mode (see supervisor.py): N worker processes, each a GameServer owning a
+  partition of lobby ids; connections move to the worker that owns the lobby they join
+- metrics (see metrics.py): per-action latency, lock waits, broadcast fan-out, bytes and
+  swallowed errors, on a local Prometheus scrape port and through the stats admin action
+- opt-in profiling (see profiler.py): sampled per-phase request timings and a slow-request log,
+  switched at runtime with the profile admin action, which needs the server's admin token
+- sessions: connections quiet for longer than the idle timeout are cut (clients ping, see the
+  heartbeat in the hello reply); a player who drops out of a running game keeps the seat for a
+  grace window and gets it back by saying hello with their session token, after that their
+  turns are passed for them. The timers all run on one timer wheel (see timers.py)
+- turn clocks: a lobby may limit each turn (turn_seconds, by default set by its difficulty);
+  updates carry the deadline, and when it passes the server plays for the player (their
+  heaviest tile that fits, else a pass). The clocks are timers on the same wheel
+- optional replay archive (see replays.py): every finished game is kept as a compact record
+  (seed, deal, a byte or two per move); players look up games with the replays action and
+  watch one with replay, all at once or paced on the timer wheel
+- matchmaking (see matchmaking.py): the queue action puts a player in line by level, difficulty
+  and lobby size; matched groups get a lobby made, joined and started for them through the same
+  create/join/start code as by hand, and a sweep on the timer wheel widens skill windows
+- spectators (see spectators.py): the spectate action watches a lobby without a seat; they get
+  its public broadcasts (never a hand) through one fan-out thread, optionally delayed
+- tournaments (see tournaments.py): admins (a server with an admin token) create bracket or round-robin tournaments; their
+  tables are ordinary lobbies made, seated and started by the server, each game_over feeds the
+  standings, and finished tables and new seatings are worked through in batches on the timer wheel
+- chat (see chat.py): the chat action (or a move's chat field) posts to the lobby's room behind
+  the chat's own lock, rate limited per player; rooms are flushed as one frame each on the timer
+  wheel, and newcomers get the recent history
 """
 
+import gc
+import os
+import random
+import secrets
 import socket
 import threading
-import pickle
-import random
 import time
 
+from bots import DEFAULT_BUDGET, DEFAULT_THREADS, BotConn, BotRunner
+from chat import FLUSH as CHAT_FLUSH, Chat, legacy as chat_legacy
+from codec import CODECS, PICKLE, codec_for_frame, negotiate
+from connection import DEFAULT_MAX_QUEUE, Connection
+from dominoes import SET_SIZES, Chain, Hand, tile_set
+from engine import DEAL_SIZES, GameState, IllegalMove
+from journal import GameJournal
+from listing import ServerInfoCache, list_params
+from matchmaking import Matchmaker
+from metrics import Metrics, MetricsHTTP
+from profiler import Profiler, current
+from registry import LobbyRegistry, StatsTable
+from replays import GameRecord, ReplayArchive, recordable, rerun
+from spectators import Feed, Hub
+from stats_store import StatsWriter, store_for
+from supervisor import Supervisor, worker_path
+from timers import TimerWheel
+from tournaments import FORMATS, MAX_ENTRANTS, Tournaments
+from protocol import DEFAULT_MAX_FRAME, RECV_SIZE, UNFRAMED_ERROR, FrameDecoder, FrameTooLarge, pack_message, unframed
+
+IDLE_TIMEOUT = 60.0  # seconds without a frame from the client before its connection is cut
+GRACE = 60.0  # seconds a seat in a running game waits for its disconnected player
+TURN_SECONDS = {"easy": 60, "normal": 45, "hard": 30}  # default turn time limit by lobby difficulty
+TURN_RANGE = (5, 600)  # turn limits a lobby may ask for; 0 means no limit
+MATCH_INTERVAL = 1.0  # seconds between matchmaking sweeps, which widen the skill windows
+REPLAY_CHUNK = 32  # events per frame when a replay is sent all at once
+REPLAY_LIMIT = 100  # most games one replays query returns
+REPLAY_MAX_INTERVAL = 5.0  # slowest replay pacing, seconds per move
+SPECTATORS = 1000  # spectators one lobby takes
+SPECTATOR_DELAY_MAX = 300  # longest spectator delay a lobby may ask for, seconds
+TOURNAMENT_TICK = 0.5  # seconds between passes over finished tournament tables and tables to seat
+TABLE_BATCH = 100  # finished tables, and tables seated, per pass
+
 def print_logo():
     logo = r"""
                                                                                                                                                     
@@ -42,405 +114,1331 @@ print_logo()
 
 # --- Helper functions and classes ---
 
-def make_domino_set(max_pip=6):
-    return [(i, j) for i in range(max_pip + 1) for j in range(i, max_pip + 1)]
-
-def sum_pips(hand):
-    return sum(a + b for a, b in hand)
-
 def player_level(wins, games):
     if games == 0: return 0
     ratio = wins / games
     return int(ratio * 10)  # scale 0..10
 
-def orient_for_left(tile, left_val):
-    a, b = tile
-    if b == left_val:
-        return (a, b)  # new_tile right == left_val
-    if a == left_val:
-        return (b, a)
-    return None
-
-def orient_for_right(tile, right_val):
-    a, b = tile
-    if a == right_val:
-        return (a, b)  # new_tile left == right_val
-    if b == right_val:
-        return (b, a)
-    return None
-
 # --- Server state ---
 
-class Lobby:
-    def __init__(self, lobby_id, max_players, difficulty, host_name):
+class Lobby(GameState):
+    # the game itself (hands, chain, turn, rules) is the GameState part, see engine.py
+    def __init__(self, lobby_id, max_players, difficulty, host_name, max_pip=6, metrics=None, turn_seconds=0, spectator_delay=0):
+        super().__init__(max_pip)
         self.lobby_id = lobby_id
         self.max_players = max_players
         self.difficulty = difficulty  # "easy"/"normal"/"hard"
         self.host_name = host_name
         self.players = []  # list of (conn, username, stats_ref)
-        self.player_names = []
         self.started = False
-        self.chain = []
-        self.hands = {}  # username -> list of tiles
-        self.turn_index = 0
-        self.passes_in_row = 0
-        self.lock = threading.Lock()
+        self.tokens = {}  # username -> session token of the seat's owner
+        self.grace = {}  # username -> when (monotonic) the grace window of their vacant seat ends
+        self.away = set()  # usernames whose grace ran out: their turns are passed for them
+        self.turn_seconds = turn_seconds  # time limit per turn, 0 for none
+        self.turn_deadline = None  # when (epoch seconds) the current turn's clock runs out, if it runs
+        self.clock = None  # the lobby's armed turn_expired timer, if any
+        self.journal = None  # GameJournal when games are journaled
+        self.record = None  # replays.GameRecord of the running game when games are archived
+        self.spectator_delay = spectator_delay  # seconds spectators see the game behind the players
+        self.feed = None  # spectators.Feed, made when the first spectator comes
+        self.tournament = None  # (Tournament, round, table index) when the lobby is a tournament table
+        self.metrics = metrics  # the server's Metrics, for broadcast timings and lock waits
+        self.lock = metrics.lock_for("lobby") if metrics else threading.Lock()
+
+    def remove_player(self, conn):
+        # drop every seat held by conn; True if it had one (caller holds self.lock)
+        removed = False
+        for i in range(len(self.players) - 1, -1, -1):
+            if self.players[i][0] == conn:
+                self.players.pop(i)
+                self.player_names.pop(i)
+                if self.started and self.record is not None:
+                    self.record.leave(i)
+                removed = True
+        return removed
+
+    def vacate(self, conn):
+        # keep conn's seats but without a connection (caller holds self.lock); returns their names
+        names = []
+        for i, (c, u, stats_ref) in enumerate(self.players):
+            if c == conn:
+                self.players[i] = (None, u, stats_ref)
+                names.append(u)
+        return names
+
+    def empty(self):
+        # no human left (bots alone don't keep a lobby alive; vacant seats do)
+        return all(c is not None and c.bot for c, _, _ in self.players)
 
-    def current_turn_username(self):
-        if not self.players: return None
-        return self.player_names[self.turn_index % len(self.player_names)]
+    def bot_name(self):
+        n = 1
+        while f"bot{n}" in self.player_names:
+            n += 1
+        return f"bot{n}"
 
-    def broadcast(self, payload):
+    def snapshot(self):
+        # full public game state, for clients resyncing after a sequence gap
+        return {"lobby_id": self.lobby_id, "seq": self.seq, "players": self.player_names, "chain": self.chain.to_list(), "spinner": self.chain.index(self.chain.spinner) if self.chain.spinner is not None else None, "hands_sizes": self.hands_sizes(), "turn": self.current_turn_username(), "deadline": self.turn_deadline}
+
+    def state(self):
+        # everything needed to rebuild a running game after a restart (see from_state)
+        return {"lobby_id": self.lobby_id, "max_players": self.max_players, "difficulty": self.difficulty,
+                "max_pip": self.max_pip, "host": self.host_name, "turn_seconds": self.turn_seconds,
+                "spectator_delay": self.spectator_delay, "seats": [[u, self.tokens.get(u)] for u in self.player_names],
+                "bots": {u: c.difficulty for c, u, _ in self.players if c is not None and c.bot},
+                "hands": {u: h.mask for u, h in self.hands.items()}, "chain": self.chain.state(),
+                "turn_index": self.turn_index, "passes": self.passes_in_row, "seq": self.seq,
+                "record": self.record.state() if self.record is not None else None}
+
+    @classmethod
+    def from_state(cls, state, metrics=None):
+        # a started lobby whose seats have no connection until their players resume
+        lobby = cls(state["lobby_id"], state["max_players"], state["difficulty"], state["host"], state["max_pip"], metrics,
+                    state.get("turn_seconds", 0), state.get("spectator_delay", 0))
+        ts = tile_set(lobby.max_pip)
+        bots = state.get("bots", {})
+        for u, token in state["seats"]:
+            lobby.players.append((BotConn(u, bots[u]) if u in bots else None, u, None))
+            lobby.player_names.append(u)
+            lobby.tokens[u] = token
+        lobby.hands = {u: Hand.from_mask(ts, mask) for u, mask in state["hands"].items()}
+        lobby.chain = Chain.restore(lobby.max_pip, state["chain"])
+        lobby.turn_index, lobby.passes_in_row, lobby.seq = state["turn_index"], state["passes"], state["seq"]
+        if state.get("record"):
+            lobby.record = GameRecord.from_state(lobby.lobby_id, lobby.max_pip, state["record"])
+        lobby.started = True
+        return lobby
+
+    def replay(self, rec):
+        # re-apply one journaled move/pass made after the last snapshot
+        if rec[0] == "move":
+            _, _, seq, u, tile, side = rec
+            placed, side = self.play(u, tuple(tile), side)  # already oriented when it was played, so it lands the same way
+            if self.record is not None:
+                self.record.play(placed, side)
+        else:
+            seq = rec[2]
+            self.pass_turn()
+            if self.record is not None:
+                self.record.pass_turn()
+        self.seq = seq
+
+    def broadcast(self, payload, legacy=None, wants="deltas"):
         # sends payload to all clients in this lobby (non-blocking best-effort)
+        # legacy: optional callable building the message for clients without the wants flag
+        t0 = time.perf_counter()
+        frames = {}  # encode once per codec in use, not once per player
+        sent = 0
         for conn, uname, stats in list(self.players):
+            if conn is None or conn.bot:
+                continue  # recovered seat whose player isn't back yet, or a bot (it reads the lobby directly)
             try:
-                conn.send(pickle.dumps(payload))
-            except:
-                pass
+                full = legacy is not None and not getattr(conn, wants)
+                key = (conn.codec.name, full)
+                frame = frames.get(key)
+                if frame is None:
+                    trace = current()
+                    t1 = time.perf_counter()
+                    frame = frames[key] = pack_message(legacy() if full else payload, conn.codec)
+                    if trace is not None:
+                        trace.add("encode", time.perf_counter() - t1)
+                # queued, not written: a stalled client can't hold up the lobby
+                conn.sendall(frame, "update_full" if full else None)
+                sent += 1
+            except Exception as e:
+                if self.metrics:
+                    self.metrics.error("broadcast", e)
+        if self.metrics:
+            self.metrics.broadcast(time.perf_counter() - t0, sent)
+        if self.feed is not None:
+            self.feed.publish(payload, legacy, frames, wants=wants)  # after the players, reusing their frames
+
+    def show(self, payload):
+        # send payload to the spectators only (caller holds self.lock)
+        if self.feed is not None:
+            self.feed.publish(payload)
+
+    def broadcast_event(self, event):
+        # one move or pass as a sequence-numbered delta: {"seq", "placed_by", "placed_tile",
+        # "side", "hand_size", "turn"} or {"seq", "passed_by", "turn"}, plus "deadline" when the
+        # next turn is timed and "auto" ("away"/"timeout") when the server moved for the player
+        self.seq += 1
+        event["seq"] = self.seq
+        event["turn"] = self.current_turn_username()
+        if self.record is not None:
+            self.record.event(event)  # before the journal, whose snapshots include the record
+        if self.journal:
+            self.journal.event(self, event)
+        def legacy():
+            # the pre-delta update: whole chain and every hand size
+            full = {k: event[k] for k in ("placed_by", "placed_tile") if k in event}
+            full.update(chain=self.chain.to_list(), hands_sizes=self.hands_sizes(), turn=event["turn"])
+            if "deadline" in event:
+                full["deadline"] = event["deadline"]
+            return {"update": full}
+        self.broadcast({"update": event}, legacy)
 
 class GameServer:
-    def __init__(self, host, port, server_name, max_players_per_lobby, max_lobbies, difficulty):
+    def __init__(self, host, port, server_name, max_players_per_lobby, max_lobbies, difficulty, max_frame=DEFAULT_MAX_FRAME, codecs=tuple(CODECS), max_queue=DEFAULT_MAX_QUEUE, stats_store=None, journal=None, bot_budget=DEFAULT_BUDGET, bot_threads=DEFAULT_THREADS, cluster=None, metrics=True, metrics_port=None, admin_token=None, profiler=None, idle_timeout=IDLE_TIMEOUT, grace=GRACE, archive=None):
         self.host = host
         self.port = port
         self.server_name = server_name
         self.max_players_per_lobby = max_players_per_lobby
         self.max_lobbies = max_lobbies
         self.default_difficulty = difficulty.lower()
-        self.lobbies = {}  # lobby_id -> Lobby
-        self.next_lobby_id = 1
+        self.cluster = cluster  # supervisor.Cluster when this is one of several worker processes
+        # worker k of N numbers its lobbies k+1, k+1+N, ... and its listing versions the same way
+        part = (cluster.index + 1, cluster.workers) if cluster else (1, 1)
+        self.lobbies = LobbyRegistry(max_lobbies, id_start=part[0], id_step=part[1])  # lobby_id -> Lobby, sharded
         self.clients = {}  # conn -> (username, stats)
-        self.stats = {}    # username -> {"wins":int,"games":int}
-        self.lock = threading.Lock()
+        self.stats = StatsTable()  # username -> {"wins":int,"games":int}, lock-striped
+        self.metrics = Metrics(metrics)
+        self.lock = self.metrics.lock_for("server")  # guards clients only
+        self.closed_bytes = [0, 0]  # bytes in/out of connections already gone (under self.lock)
+        self.admin_token = admin_token  # required by the admin actions; without one stats is open, profile and tournament admin refused
+        self.profiler = profiler or Profiler()  # off unless configured on
         self.sock = None
         self.running = True
+        self.max_frame = max_frame  # largest request frame accepted from a client
+        self.codecs = {name: CODECS[name] for name in codecs}  # wire codecs accepted, in order of preference
+        self.max_queue = max_queue  # outbound frames buffered per client before it counts as too slow
+        self.slow_disconnects = 0
+        self.server_info = ServerInfoCache(self, *part)
+        self.metrics_http = None
+        if metrics_port:
+            self.metrics_http = MetricsHTTP(self.render_metrics, "127.0.0.1", metrics_port)
+            self.metrics_http.start()
+        self.stats_writer = None
+        if stats_store is not None:
+            t0 = time.perf_counter()
+            gc.disable()  # a million small dicts: the collector would rescan them over and over while loading
+            try:
+                self.stats.load(stats_store.load())
+            finally:
+                gc.enable()
+            print(f"Loaded stats for {len(self.stats)} players in {time.perf_counter() - t0:.2f}s")
+            self.stats_writer = StatsWriter(stats_store)
+        self.sessions = {}  # username -> session token handed out in hello
+        self.live = {}  # session token -> its current connection
+        self.orphans = {}  # username -> lobby ids of vacant seats waiting for that player
+        self.idle_timeout = idle_timeout  # 0: never cut quiet connections
+        self.grace = grace
+        self.idle_disconnects = 0
+        self.timers = TimerWheel(on_error=lambda e: self.metrics.error("timer", e))
+        self.bots = BotRunner(self, bot_budget, bot_threads)
+        self.matchmaker = Matchmaker()
+        self.spectators = Hub(on_error=lambda e: self.metrics.error("spectators", e))
+        self.watching = {}  # conn -> id of the lobby it spectates (under self.lock)
+        self.tournaments = Tournaments()
+        self.timers.schedule(TOURNAMENT_TICK, self.tournament_tick)
+        self.chat = Chat()
+        self.timers.schedule(CHAT_FLUSH, self.chat_tick)
+        self.timers.schedule(MATCH_INTERVAL, self.match_tick)
+        self.archive = archive  # replays.ReplayArchive of finished games, numbered like this server's lobbies
+        self.journal = journal
+        if journal is not None:
+            gc.disable()  # same reason as the stats load: lots of small objects at once
+            try:
+                self.recover_games()
+            finally:
+                gc.enable()
+            journal.start()
 
-    def create_lobby(self, host_name, requested_max=None, difficulty=None):
-        with self.lock:
-            if len(self.lobbies) >= self.max_lobbies:
-                return None, "No lobby slots available on server."
-            lid = self.next_lobby_id
-            self.next_lobby_id += 1
-            mp = requested_max if requested_max else self.max_players_per_lobby
-            diff = difficulty if difficulty else self.default_difficulty
-            lobby = Lobby(lid, mp, diff, host_name)
-            self.lobbies[lid] = lobby
-            return lobby, None
+    def recover_games(self):
+        # rebuild every game the journal says was running; seats stay empty until their players resume
+        t0 = time.perf_counter()
+        games = self.journal.recover()
+        for state, moves in games:
+            lobby = Lobby.from_state(state, self.metrics)
+            for rec in moves:
+                lobby.replay(rec)
+            lobby.players = [(c, u, self.stats.ref(u)) for c, u, _ in lobby.players]
+            lobby.journal = self.journal
+            self.lobbies.restore(lobby)
+            self.start_clock(lobby)
+            self.bots.poke(lobby)
+            for c, u, _ in lobby.players:
+                if c is not None:
+                    continue  # bots are back already
+                self.orphans.setdefault(u, set()).add(lobby.lobby_id)
+                self.start_grace(lobby, u)
+                if lobby.tokens.get(u):
+                    self.sessions[u] = lobby.tokens[u]  # so only the seat's owner can claim the name's session
+        if games:
+            self.server_info.touch()
+        print(f"Recovered {len(games)} running games in {time.perf_counter() - t0:.2f}s")
 
-    def remove_lobby_if_empty(self, lid):
+    def resume(self, conn, username, token):
+        # put a returning player back into the vacant seats their token matches; returns lobby ids
+        resumed = []
         with self.lock:
+            lids = self.orphans.pop(username, ())
+        for lid in lids:
             lobby = self.lobbies.get(lid)
             if not lobby:
+                continue
+            with lobby.lock:
+                if lobby.tokens.get(username) != token:
+                    # not theirs; keep waiting. A seat with no token (its player never had a session)
+                    # is nobody's to claim: anyone can say hello under a name
+                    with self.lock:
+                        self.orphans.setdefault(username, set()).add(lid)
+                    continue
+                for i, (c, u, stats_ref) in enumerate(lobby.players):
+                    if u == username and c is None:
+                        lobby.players[i] = (conn, u, stats_ref)
+                lobby.tokens[username] = token
+                lobby.grace.pop(username, None)  # its timer finds nothing to do
+                lobby.away.discard(username)
+                self.lobbies.seat(conn, lid)
+                resumed.append(lid)
+                hand = lobby.hands.get(username)
+                conn.send_message({"game_start": True, "resumed": True, "lobby_id": lid, "your_hand": hand.tiles() if hand else [], "players": lobby.player_names, "turn": lobby.current_turn_username(), "chain": lobby.chain.to_list(), "hands_sizes": lobby.hands_sizes(), "seq": lobby.seq, "deadline": lobby.turn_deadline})
+                lobby.broadcast({"lobby_update": {"players": lobby.player_names, "resumed": username}})
+        return resumed
+
+    def start_grace(self, lobby, username):
+        # username's seat is vacant: hold it for them for self.grace seconds (caller holds lobby.lock)
+        deadline = lobby.grace[username] = time.monotonic() + self.grace
+        self.timers.schedule(self.grace, self.grace_over, lobby, username, deadline)
+
+    def grace_over(self, lobby, username, deadline):
+        # timer: the player didn't come back in time
+        with lobby.lock:
+            if lobby.grace.get(username) != deadline:
+                return  # resumed, or the game ended, in the meantime
+            del lobby.grace[username]
+            if not lobby.started or self.lobbies.get(lobby.lobby_id) is not lobby:
+                return
+            lobby.away.add(username)
+            if any(c is not None and not c.bot for c, _, _ in lobby.players):
+                lobby.broadcast({"lobby_update": {"players": lobby.player_names, "away": username}})
+                if not self.skip_away(lobby):
+                    self.bots.poke(lobby)
+                return
+            # nobody left to play with: the game is abandoned (and not archived)
+            self.drop_vacant(lobby)
+            lobby.record = None
+            lobby.started = False
+            lobby.reset()
+            self.start_clock(lobby)  # stops it
+        self.remove_lobby_if_empty(lobby.lobby_id)
+
+    def skip_away(self, lobby):
+        # pass for seats whose grace ran out until a present player is to move (caller holds
+        # lobby.lock); True if that ended the game
+        while lobby.started and lobby.current_turn_username() in lobby.away:
+            username = lobby.current_turn_username()
+            lobby.pass_turn()
+            self.next_turn(lobby, {"passed_by": username, "auto": "away"})
+            if self.end_game_if_over(lobby):
+                return True
+        return False
+
+    def next_turn(self, lobby, event):
+        # broadcast one move/pass, with the deadline of the turn it hands over (caller holds lobby.lock)
+        self.start_clock(lobby)
+        if lobby.turn_deadline is not None:
+            event["deadline"] = lobby.turn_deadline
+        lobby.broadcast_event(event)
+
+    def start_clock(self, lobby):
+        # time the turn starting now, if the lobby has a limit and a player who is here is to move
+        # (caller holds lobby.lock). A move only sets the deadline: the lobby's one timer re-arms
+        # itself when it fires early, so quick moves cost no timer operations
+        lobby.turn_deadline = None
+        if not lobby.turn_seconds or not lobby.started or not lobby.players:
+            return
+        conn, username, _ = lobby.players[lobby.turn_index % len(lobby.players)]
+        if (conn is not None and conn.bot) or username in lobby.away:
+            return  # bots move on their own, away seats are passed at once
+        lobby.turn_deadline = time.time() + lobby.turn_seconds
+        if lobby.clock is None:
+            lobby.clock = self.timers.schedule(lobby.turn_seconds, self.turn_expired, lobby)
+
+    def turn_expired(self, lobby):
+        # timer: if the turn's clock ran out, play the player's heaviest tile that fits, else pass
+        with lobby.lock:
+            lobby.clock = None
+            if lobby.turn_deadline is None or not lobby.started or self.lobbies.get(lobby.lobby_id) is not lobby:
+                return  # no turn being timed, or the game is over or gone
+            left = lobby.turn_deadline - time.time()
+            if left > 0:
+                lobby.clock = self.timers.schedule(left, self.turn_expired, lobby)  # moves were made meanwhile
                 return
-            if not lobby.players:
-                del self.lobbies[lid]
+            username = lobby.current_turn_username()
+            opts = lobby.playable(lobby.hands.get(username))
+            moves = [(tile, side) for side in ("left", "right") for tile in opts[side]]
+            if moves:
+                tile, side = max(moves, key=lambda m: m[0][0] + m[0][1])
+                placed, side = lobby.play(username, tuple(tile), side)
+                self.next_turn(lobby, {"placed_by": username, "placed_tile": placed, "side": side, "hand_size": len(lobby.hands[username]), "auto": "timeout"})
+            else:
+                lobby.pass_turn()
+                self.next_turn(lobby, {"passed_by": username, "auto": "timeout"})
+            if not (self.end_game_if_over(lobby) or self.skip_away(lobby)):
+                self.bots.poke(lobby)
+
+    def end_game_if_over(self, lobby):
+        # someone emptied their hand, or the game is blocked (caller holds lobby.lock)
+        outcome = lobby.result()
+        if not outcome:
+            return False
+        # update stats
+        self.record_game(outcome["winner"], list(lobby.hands))
+        over = dict(outcome, hands={u: h.tiles() for u,h in lobby.hands.items()})
+        if lobby.tournament is not None:
+            # only queued here; tournament_tick does the rest
+            self.tournaments.report(lobby.tournament, lobby.lobby_id, outcome["winner"], {u: h.pips for u, h in lobby.hands.items()})
+        if lobby.record is not None and self.archive is not None:
+            try:
+                over["game"] = self.archive.add(lobby.record, outcome["winner"], outcome.get("blocked", False))  # its replay id
+            except (ValueError, OSError) as e:
+                self.metrics.error("archive", e)
+        lobby.record = None
+        lobby.broadcast({"game_over": over})
+        # reset lobby state to allow restart later; seats still vacant go with the game
+        lobby.started = False
+        lobby.reset()
+        self.start_clock(lobby)  # stops it
+        self.drop_vacant(lobby)
+        self.server_info.touch()
+        if self.journal:
+            self.journal.ended(lobby.lobby_id)
+        return True
+
+    def drop_vacant(self, lobby):
+        # remove the seats nobody came back to (caller holds lobby.lock)
+        for i in range(len(lobby.players) - 1, -1, -1):
+            if lobby.players[i][0] is not None:
+                continue
+            username = lobby.player_names.pop(i)
+            lobby.players.pop(i)
+            lobby.tokens.pop(username, None)
+            with self.lock:
+                lids = self.orphans.get(username)
+                if lids:
+                    lids.discard(lobby.lobby_id)
+                    if not lids:
+                        del self.orphans[username]
+        lobby.grace.clear()
+        lobby.away.clear()
+
+    def lobby_settings_error(self, max_pip=None, turn_seconds=None, spectator_delay=None):
+        # what is wrong with these create_lobby settings, or None
+        if max_pip is not None and max_pip not in SET_SIZES:
+            return f"Unsupported domino set, choose double-{'/'.join(map(str, SET_SIZES))}."
+        if turn_seconds is not None and (not isinstance(turn_seconds, (int, float)) or isinstance(turn_seconds, bool)
+                                         or turn_seconds and not TURN_RANGE[0] <= turn_seconds <= TURN_RANGE[1]):
+            return f"Turn time must be 0 (no limit) or {TURN_RANGE[0]}-{TURN_RANGE[1]} seconds."
+        if spectator_delay is not None and (not isinstance(spectator_delay, (int, float)) or isinstance(spectator_delay, bool)
+                                            or not 0 <= spectator_delay <= SPECTATOR_DELAY_MAX):
+            return f"Spectator delay must be 0-{SPECTATOR_DELAY_MAX} seconds."
+        return None
+
+    def create_lobby(self, host_name, requested_max=None, difficulty=None, max_pip=None, turn_seconds=None, spectator_delay=None):
+        err = self.lobby_settings_error(max_pip, turn_seconds, spectator_delay)
+        if err:
+            return None, err
+        lid = self.lobbies.reserve_id()
+        if lid is None:
+            return None, "No lobby slots available on server."
+        mp = requested_max if requested_max else self.max_players_per_lobby
+        diff = difficulty if difficulty else self.default_difficulty
+        turns = TURN_SECONDS.get(diff, 0) if turn_seconds is None else turn_seconds
+        lobby = Lobby(lid, mp, diff, host_name, max_pip or 6, self.metrics, turns, spectator_delay or 0)
+        self.lobbies.add(lobby)
+        self.server_info.touch()
+        return lobby, None
+
+    def seat_player(self, lobby, conn, username):
+        # add a player to a lobby that has room (caller holds lobby.lock); a player doesn't spectate too
+        self.unwatch(conn)
+        lobby.players.append((conn, username, self.stats.ref(username)))
+        lobby.player_names.append(username)
+        lobby.tokens[username] = conn.session
+        self.lobbies.seat(conn, lobby.lobby_id)
+        self.server_info.touch()
+        conn.send_message({"joined": True, "lobby_id": lobby.lobby_id, "players": lobby.player_names, "difficulty": lobby.difficulty, "max_players": lobby.max_players, "max_pip": lobby.max_pip, "turn_seconds": lobby.turn_seconds})
+        history = self.chat.history(lobby.lobby_id)
+        if history:
+            conn.send_message({"chat": {"lobby_id": lobby.lobby_id, "messages": history, "history": True}} if conn.chat_batches else chat_legacy(history))
+        # notify others in lobby
+        lobby.broadcast({"lobby_update": {"players": lobby.player_names}})
+
+    def start_game(self, lobby):
+        # deal and start a game for the seated players (caller holds lobby.lock and checked there are 2+)
+        lobby.started = True
+        self.server_info.touch()
+        # prepare domino deck and deal based on difficulty
+        per_hand = DEAL_SIZES.get(lobby.difficulty, DEAL_SIZES["hard"])
+        if self.archive is not None and recordable(lobby.player_names):
+            # a seeded deal, so the archived game can be re-dealt and checked
+            seed = random.getrandbits(64)
+            lobby.start(per_hand, random.Random(seed).random)
+            lobby.record = GameRecord(lobby.lobby_id, seed, lobby.max_pip, per_hand, lobby.player_names,
+                                      [lobby.hands[u].mask for u in lobby.player_names])
+        else:
+            lobby.start(per_hand)
+        self.start_clock(lobby)
+        hands = lobby.hands
+        if self.journal:
+            lobby.journal = self.journal
+            self.journal.started(lobby)
+        # flag each player's 'started' status by sending initial update
+        for conn2, uname2, _ in lobby.players:
+            try:
+                conn2.send_message({"game_start": True, "lobby_id": lobby.lobby_id, "your_hand": hands[uname2].tiles(), "players": lobby.player_names, "turn": lobby.current_turn_username(), "chain": lobby.chain.to_list(), "hands_sizes": lobby.hands_sizes(), "seq": lobby.seq, "deadline": lobby.turn_deadline})
+            except:
+                pass
+        lobby.show({"game_start": True, "spectating": True, "lobby_id": lobby.lobby_id, "players": lobby.player_names, "turn": lobby.current_turn_username(), "chain": lobby.chain.to_list(), "hands_sizes": lobby.hands_sizes(), "seq": lobby.seq, "deadline": lobby.turn_deadline})
+        self.bots.poke(lobby)
+
+    def start_match(self, group):
+        # a group the matchmaker made (matchmaking.Tickets, its anchor first): a lobby hosted by
+        # the anchor, everyone seated, game started
+        first = group[0]
+        lobby, err = self.create_lobby(first.name, len(group), first.difficulty)
+        if lobby is None:
+            self.matchmaker.requeue(group)  # no lobby slot free: they keep their place in line
+            return
+        now = time.monotonic()
+        with lobby.lock:
+            for t in group:
+                if t.conn.closed:
+                    continue  # dropped after being matched
+                t.conn.send_message({"matched": {"lobby_id": lobby.lobby_id, "players": [x.name for x in group], "waited": round(now - t.since, 1)}})
+                self.seat_player(lobby, t.conn, t.name)
+            if len(lobby.players) >= 2:
+                self.start_game(lobby)
+        self.remove_lobby_if_empty(lobby.lobby_id)
+
+    def match_tick(self):
+        # timer: match again with the skill windows of everyone still waiting widened
+        if not self.running:
+            return
+        self.timers.schedule(MATCH_INTERVAL, self.match_tick)
+        for group in self.matchmaker.sweep():
+            self.start_match(group)
+
+    def tournament_tick(self):
+        # timer: take in a batch of finished tables (standings, next rounds), then seat a batch of tables
+        if not self.running:
+            return
+        self.timers.schedule(TOURNAMENT_TICK, self.tournament_tick)
+        tourneys = self.tournaments
+        for t, rnd, index, lid, winner, pips in tourneys.take(TABLE_BATCH):
+            self.close_table(lid)
+            with tourneys.lock:
+                over = t.finished_table(rnd, index, winner, pips) and t.auto and not tourneys.start_round(t)
+            if over:
+                self.tournament_over(t)
+        for _ in range(TABLE_BATCH):
+            with tourneys.lock:
+                if not tourneys.to_seat:
+                    break
+                t, rnd, index = tourneys.to_seat.popleft()
+                if rnd != t.round:
+                    continue
+                lineup = t.tables[index]
+            if not self.seat_table(t, rnd, index, lineup):
+                with tourneys.lock:
+                    tourneys.to_seat.appendleft((t, rnd, index))  # no lobby slot free: next pass
+                break
+
+    def seat_table(self, t, rnd, index, lineup):
+        # make a table's lobby, seat its players and start the game; False if no lobby slot is free.
+        # Entrants who aren't connected get a vacant seat, theirs when they say hello with their session
+        # (the turn clock plays for them meanwhile, and the grace window applies as to anyone who
+        # dropped out); one who never had a session can't claim it, so it is passed once grace runs out
+        lobby, err = self.create_lobby(lineup[0], len(lineup), **t.settings)
+        if lobby is None:
+            return False
+        lobby.tournament = (t, rnd, index)
+        info = {"tournament": t.tid, "name": t.name, "round": rnd, "table": index + 1, "lobby_id": lobby.lobby_id, "players": lineup}
+        absent = []
+        with lobby.lock:
+            for u in lineup:
+                conn = self.conn_of(u)
+                if conn is None:
+                    lobby.players.append((None, u, self.stats.ref(u)))
+                    lobby.player_names.append(u)
+                    lobby.tokens[u] = self.sessions.get(u)
+                    absent.append(u)
+                    continue
+                self.matchmaker.cancel(u, conn)
+                conn.send_message({"tournament_table": info})
+                self.seat_player(lobby, conn, u)
+            self.start_game(lobby)
+            for u in absent:
+                with self.lock:
+                    self.orphans.setdefault(u, set()).add(lobby.lobby_id)
+                self.start_grace(lobby, u)
+        with self.tournaments.lock:
+            if rnd == t.round:
+                t.lobbies[index] = lobby.lobby_id
+        return True
+
+    def close_table(self, lid):
+        # a tournament table is done: its players leave it and the lobby goes
+        lobby = self.lobbies.get(lid)
+        if lobby is None:
+            return
+        with lobby.lock:
+            if lobby.started:
+                return  # a new game in it already; it stays an ordinary lobby
+            for conn, u, _ in lobby.players:
+                if conn is not None and not conn.bot:
+                    self.lobbies.unseat(conn, lid)
+                    conn.send_message({"left": True, "lobby_id": lid})
+            lobby.players = []
+            lobby.player_names = []
+            self.server_info.touch()
+        self.remove_lobby_if_empty(lid)
+
+    def tournament_over(self, t):
+        over = {"tournament_over": {"id": t.tid, "name": t.name, "champion": t.champion, "standings": t.standings.top(10)}}
+        for u in t.players:
+            conn = self.conn_of(u)
+            if conn is not None:
+                conn.send_message(over)
+
+    def conn_of(self, username):
+        # username's live connection, if they are connected
+        with self.lock:
+            conn = self.live.get(self.sessions.get(username))
+        return conn if conn is not None and not conn.closed else None
+
+    def chat_tick(self):
+        # timer: what each room got since the last tick goes out as one frame. The lobby lock is
+        # held only to queue it (spectators' feeds rely on it for order), never while posting
+        if not self.running:
+            return
+        self.timers.schedule(CHAT_FLUSH, self.chat_tick)
+        for lid, msgs in self.chat.flush():
+            lobby = self.lobbies.get(lid)
+            if lobby is not None:
+                with lobby.lock:
+                    lobby.broadcast({"chat": {"lobby_id": lid, "messages": msgs}}, lambda: chat_legacy(msgs), "chat_batches")
+
+    def record_game(self, winner, players):
+        self.stats.record_game(winner, players)
+        if self.stats_writer:
+            self.stats_writer.record(winner, players)  # queued; written behind by the stats thread
+
+    def remove_lobby_if_empty(self, lid):
+        lobby = self.lobbies.get(lid)
+        if self.lobbies.remove_if_empty(lid):
+            if lobby.feed is not None:
+                with lobby.lock:
+                    lobby.show({"spectate_end": {"lobby_id": lid}})
+            if lobby.tournament is not None:
+                self.tournaments.report(lobby.tournament, lid, None, {})  # abandoned, unless its result came first
+            self.chat.drop(lid)
+            self.server_info.touch()
+            if self.journal:
+                self.journal.ended(lid)
 
     def list_servers_info(self):
-        # return basic server info
+        # basic server info plus every lobby, from the versioned cache
+        return self.server_info.info()
+
+    def decode_request(self, conn, frame):
+        # by the frame's first byte: requests sent before the hello reply arrived are still in dz1
+        return (codec_for_frame(frame, self.codecs) or conn.codec).decode(frame)
+
+    def handle_hello(self, conn, addr, frame):
+        # initial handshake: expect {"action":"hello","username":str,"codecs":[names]} in any accepted codec
+        # returns the registered username, or None if the handshake was rejected
+        codec = codec_for_frame(frame, self.codecs)
+        data = codec.decode(frame) if codec else None
+        if not isinstance(data, dict) or data.get("action") != "hello":
+            conn.send_message({"error":"Invalid hello"})
+            conn.close()
+            return None
+        # old clients offer nothing and keep talking the codec they said hello in
+        conn.codec = negotiate(data.get("codecs") or [codec.name], self.codecs) or codec
+        # ask for "deltas" to get sequence-numbered move events instead of the whole chain each turn
+        conn.deltas = bool(data.get("deltas"))
+        # and "chat_batches" to get chat as batches of [seq, user, text, time] rather than text lines
+        conn.chat_batches = bool(data.get("chat_batches"))
+        username = data.get("username", f"guest_{addr[1]}")
+        token = data.get("session")
+        with self.lock:
+            # register client
+            self.clients[conn] = (username, self.stats.ref(username))
+            # a session token identifies the player across reconnects (and, with a journal, restarts)
+            known = self.sessions.get(username)
+            if not token or not isinstance(token, str) or known not in (None, token):
+                token = secrets.token_hex(16)  # new, or someone else holds this name's session
+            if known is None:
+                self.sessions[username] = token
+            conn.session = token
+            old = self.live.get(token)
+            self.live[token] = conn
+        if old is not None and old is not conn:
+            # the same session again, usually after a dead link the server hadn't noticed yet:
+            # the new connection takes over (its game seats go vacant and are resumed below)
+            self.disconnect(old)
+            old.abort()
+        reply = {"ok": True, "codec": conn.codec.name, "session": token, "server_info": self.list_servers_info()}
+        if self.idle_timeout:
+            reply["heartbeat"] = self.idle_timeout / 3  # seconds between pings that keep an idle client connected
+        conn.send_message(reply)
+        if username in self.orphans:
+            self.resume(conn, username, token)
+        return username
+
+    def refuse_unframed(self, conn):
+        # a client from before framing: it reads bare pickle, so that is how it hears why it's cut off
+        conn.sendall(PICKLE.encode({"error": UNFRAMED_ERROR}))
+        conn.close()
+
+    def adopt(self, conn, moved):
+        # a connection handed over by another worker: registered as its hello there left it, no reply
+        username = moved["username"]
+        conn.codec = self.codecs.get(moved["codec"], conn.codec)
+        conn.deltas = bool(moved["deltas"])
+        conn.chat_batches = bool(moved.get("chat_batches"))
+        conn.session = moved["token"]
         with self.lock:
-            info = {
-                "server_name": self.server_name,
-                "max_lobbies": self.max_lobbies,
-                "max_players_per_lobby": self.max_players_per_lobby,
-                "default_difficulty": self.default_difficulty,
-                "current_lobby_count": len(self.lobbies),
-                "players_connected": len(self.clients),
-            }
-            # per-lobby short info
-            info["lobbies"] = []
-            for lid, l in self.lobbies.items():
-                info["lobbies"].append({
-                    "lobby_id": lid,
-                    "host": l.host_name,
-                    "players": len(l.players),
-                    "max_players": l.max_players,
-                    "difficulty": l.difficulty,
-                    "started": l.started
-                })
-            return info
-
-    def client_thread(self, conn, addr):
+            self.clients[conn] = (username, self.stats.ref(username))
+            self.sessions.setdefault(username, conn.session)
+            self.live[conn.session] = conn
+        return username
+
+    def handle_request(self, conn, username, req):
+        # dispatch one decoded client request; shared by the threaded and asyncio engines
+        if not isinstance(req, dict):
+            return
+        action = req.get("action")
+        t0 = time.perf_counter()
+        failed = True
         try:
-            # initial handshake: expect {"action":"hello","username":str}
-            data = pickle.loads(conn.recv(4096))
-            if not isinstance(data, dict) or data.get("action") != "hello":
-                conn.send(pickle.dumps({"error":"Invalid hello"}))
-                conn.close()
+            # unknown actions are timed as "unknown", not under whatever name the client made up
+            action = self._handle(conn, username, req, action) or action
+            failed = False
+        finally:
+            took = time.perf_counter() - t0
+            self.metrics.request(action, took, failed)
+            if self.profiler.enabled:
+                self.profiler.finish(action, username, req, took, conn)
+
+    def _handle(self, conn, username, req, action):
+        # --- list server info ---
+        if action == "list":
+            # optional: if_version (last version seen), page/page_size, difficulty, open, waiting
+            frame = self.server_info.unchanged(conn.codec, req.get("if_version"))
+            if frame is None:
+                frame = self.server_info.frame(conn.codec, list_params(req))
+            conn.sendall(frame, "server_info")
+
+        # --- create lobby ---
+        elif action == "create_lobby":
+            requested_max = req.get("max_players")
+            difficulty = req.get("difficulty")
+            max_pip = req.get("max_pip")  # 6, 9, 12 or 15
+            turn_seconds = req.get("turn_seconds")  # 0 for no limit; default: by difficulty
+            spectator_delay = req.get("spectator_delay")  # seconds spectators are behind the game; default 0
+            lobby, err = self.create_lobby(username, requested_max, difficulty, max_pip, turn_seconds, spectator_delay)
+            if lobby is None:
+                conn.send_message({"error": err})
+            else:
+                conn.send_message({"created": True, "lobby_id": lobby.lobby_id})
+        
+        # --- join lobby ---
+        elif action == "join_lobby":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            owner = self.cluster.owner(lid) if self.cluster else None
+            if not lobby and owner is not None and owner != self.cluster.index:
+                # another worker's lobby: client_thread moves the connection there, the join is redone on arrival
+                if self.in_game(conn):
+                    conn.send_message({"error":"Lobby is on another server process; finish or leave your game first"})
+                else:
+                    conn.migrate_to = owner
                 return
-            username = data.get("username", f"guest_{addr[1]}")
-            with self.lock:
-                # register client
-                self.clients[conn] = (username, self.stats.setdefault(username, {"wins":0,"games":0}))
-            conn.send(pickle.dumps({"ok": True, "server_info": self.list_servers_info()}))
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"})
+                return
+            with lobby.lock:
+                if lobby.started:
+                    # a seat taken mid-game would have no hand, and the game's record no join to replay
+                    conn.send_message({"error":"Game already started; spectate it or join when it ends"})
+                    return
+                if len(lobby.players) >= lobby.max_players:
+                    conn.send_message({"error":"Lobby full"})
+                    return
+                self.seat_player(lobby, conn, username)
+            self.matchmaker.cancel(username, conn)  # found a game by hand
+        
+        # --- leave lobby ---
+        elif action == "leave_lobby":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"})
+                return
+            with lobby.lock:
+                # remove player
+                removed = lobby.remove_player(conn)
+                if removed:
+                    self.lobbies.unseat(conn, lid)
+                    self.server_info.touch()
+                    lobby.broadcast({"lobby_update":{"players": lobby.player_names}})
+                    conn.send_message({"left":True})
+            self.remove_lobby_if_empty(lid)
 
-            # listen for client requests
-            while self.running:
-                try:
-                    raw = conn.recv(4096)
-                    if not raw:
+        # --- start game (host only) ---
+        elif action == "start_lobby":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"}); return
+            if username != lobby.host_name:
+                conn.send_message({"error":"Only host can start"}); return
+            if lobby.tournament is not None:
+                conn.send_message({"error":"Tournament tables are started by the tournament"}); return
+            with lobby.lock:
+                if lobby.started:
+                    conn.send_message({"error":"Already started"}); return
+                if len(lobby.players) < 2:
+                    conn.send_message({"error":"Need at least 2 players to start"}); return
+                self.start_game(lobby)
+
+        # --- add a bot seat (host only, before the game starts). payload: {"lobby_id", "difficulty" (default: the lobby's), "count"} ---
+        elif action == "add_bot":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"}); return
+            if username != lobby.host_name:
+                conn.send_message({"error":"Only host can add bots"}); return
+            difficulty = req.get("difficulty") or lobby.difficulty
+            if difficulty not in ("easy","normal","hard"):
+                conn.send_message({"error":"Unknown bot difficulty"}); return
+            try:
+                count = max(int(req.get("count", 1)), 1)
+            except (TypeError, ValueError):
+                count = 1
+            with lobby.lock:
+                if lobby.started:
+                    conn.send_message({"error":"Already started"}); return
+                added = []
+                while len(added) < count and len(lobby.players) < lobby.max_players:
+                    name = lobby.bot_name()
+                    lobby.players.append((BotConn(name, difficulty), name, self.stats.ref(name)))
+                    lobby.player_names.append(name)
+                    added.append(name)
+                if not added:
+                    conn.send_message({"error":"Lobby full"}); return
+                self.server_info.touch()
+                lobby.broadcast({"lobby_update": {"players": lobby.player_names, "bots_added": added}})
+
+        # --- move (place tile or pass). payload: {"action":"move", "lobby_id":int, "move": (a,b) or "pass", "side":"left"|"right", "chat": str} ---
+        elif action == "move":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"}); return
+            chat = req.get("chat")
+            if chat and lid in self.lobbies.seated(conn):
+                # the chat action's path: rate limited and sent with the next chat flush, not under the game lock
+                err = self.chat.post(lid, username, chat)
+                if err:
+                    conn.send_message({"error": err})
+            with lobby.lock:
+                # determine who this is
+                player_index = None
+                for idx, (c, uname, _) in enumerate(lobby.players):
+                    if c == conn:
+                        player_index = idx
                         break
-                    req = pickle.loads(raw)
-                except Exception:
-                    break
+                if player_index is None:
+                    conn.send_message({"error":"You are not in the lobby"}); return
+                if not lobby.started:
+                    conn.send_message({"error":"Game not started"}); return
+                if lobby.player_names[lobby.turn_index % len(lobby.player_names)] != username:
+                    conn.send_message({"error":"Not your turn"}); return
 
-                if not isinstance(req, dict):
-                    continue
+                move = req.get("move")
+                side = req.get("side","right")
+                if move == "pass":
+                    lobby.pass_turn()
+                    self.next_turn(lobby, {"passed_by": username})
+                else:
+                    # attempt to place tile; the rules live in engine.GameState
+                    try:
+                        placed, side = lobby.play(username, move, side)  # play checks move is a tile first
+                    except IllegalMove as e:
+                        hand = lobby.hands.get(username)
+                        conn.send_message({"error": str(e), "your_hand": hand.tiles() if hand else []})
+                        return
+                    self.next_turn(lobby, {"placed_by": username, "placed_tile": placed, "side": side, "hand_size": len(lobby.hands[username])})
+                # the game may be over, and the next seats may be away
+                if self.end_game_if_over(lobby) or self.skip_away(lobby):
+                    return
+                self.bots.poke(lobby)  # next seat may be a bot
+
+        # --- request hand or lobby status ---
+        elif action == "status":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"})
+                return
+            with lobby.lock:
+                if self.behind(conn, lobby):
+                    conn.send_message({"error":"This lobby shows its game with a delay; spectate it"}); return
+                # send status to requester
+                owner_stats = self.stats.get(username, {"wins":0,"games":0})
+                user_hand = lobby.hands.get(username)
+                conn.send_message({"status": {"players": lobby.player_names, "chain": lobby.chain.to_list(), "your_hand": user_hand.tiles() if user_hand else [], "playable": lobby.playable(user_hand), "turn": lobby.current_turn_username(), "deadline": lobby.turn_deadline, "hands_sizes": lobby.hands_sizes(), "seq": lobby.seq, "your_level": player_level(owner_stats["wins"], owner_stats["games"])}}, "status")
+
+        # --- full snapshot for a client that noticed a gap in update seq numbers ---
+        elif action == "resync":
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"})
+                return
+            with lobby.lock:
+                if self.watching.get(conn) == lid:
+                    self.spectate(conn, lobby)  # a spectator starts over from a snapshot through the delay
+                elif self.behind(conn, lobby):
+                    conn.send_message({"error":"This lobby shows its game with a delay; spectate it"})
+                else:
+                    conn.send_message({"snapshot": lobby.snapshot()}, "snapshot")
+
+        # --- outbound queue metrics ---
+        elif action == "queue_stats":
+            conn.send_message({"queue_stats": self.queue_metrics(conn)})
+
+        # --- server metrics (admin). payload: {"token": admin token, when the server has one} ---
+        elif action == "stats":
+            if self.admin_token and req.get("token") != self.admin_token:
+                conn.send_message({"error":"Not allowed"}); return
+            conn.send_message({"stats": self.metrics.snapshot(self.gauges())})
+
+        # --- request profiling (admin; refused on a server without an admin token). payload: {"token", "enabled", "sample_rate" 0..1, "slow_ms", "slow_log": bool} ---
+        elif action == "profile":
+            if not self.admin_token or req.get("token") != self.admin_token:
+                conn.send_message({"error":"Not allowed"}); return
+            try:
+                self.profiler.configure(req.get("enabled"), req.get("sample_rate"), req.get("slow_ms"), req.get("slow_log"))
+            except (TypeError, ValueError):
+                conn.send_message({"error":"Bad profile settings"}); return
+            conn.send_message({"profile": self.profiler.status()})
+
+        # --- archived games, newest first. payload: {"player" (default: you), "lobby_id", "since", "until" (epoch seconds), "limit"} ---
+        elif action == "replays":
+            if self.archive is None:
+                conn.send_message({"error":"Replays are not kept on this server"}); return
+            player, lid = req.get("player"), req.get("lobby_id")
+            if player is None and lid is None:
+                player = username
+            try:
+                if not isinstance(player, (str, type(None))) or not isinstance(lid, (int, type(None))):
+                    raise TypeError
+                limit = min(max(int(req.get("limit", 20)), 1), REPLAY_LIMIT)
+                since, until = (None if req.get(k) is None else float(req[k]) for k in ("since", "until"))
+            except (TypeError, ValueError):
+                conn.send_message({"error":"Bad replays query"}); return
+            conn.send_message({"replays": self.archive.games(player, lid, since, until, limit)})
+
+        # --- one archived game, move by move. payload: {"game": id, "interval": seconds between moves, 0 (default) for all at once} ---
+        elif action == "replay":
+            if self.archive is None:
+                conn.send_message({"error":"Replays are not kept on this server"}); return
+            game = req.get("game")
+            owner = self.cluster.owner(game) if self.cluster else None
+            if owner is not None and owner != self.cluster.index:
+                # game ids are partitioned like lobby ids: the worker that ran it has it
+                if self.in_game(conn):
+                    conn.send_message({"error":"Replay is on another server process; finish or leave your game first"})
+                else:
+                    conn.migrate_to = owner
+                return
+            interval = req.get("interval", 0)
+            if not isinstance(interval, (int, float)) or isinstance(interval, bool) or not 0 <= interval <= REPLAY_MAX_INTERVAL:
+                conn.send_message({"error": f"Replay interval must be 0-{REPLAY_MAX_INTERVAL:g} seconds."}); return
+            rec = self.archive.get(game)
+            if rec is None:
+                conn.send_message({"error":"Replay not found"}); return
+            try:
+                events, final = rerun(rec)
+                outcome = final.result()
+            except ValueError as e:
+                self.metrics.error("replay", e)
+                outcome = None
+            if outcome is None:
+                conn.send_message({"error":"Replay is damaged"}); return
+            ts = tile_set(rec["max_pip"])
+            conn.send_message({"replay_start": {"game": game, "lobby_id": rec["lobby_id"], "ended": rec["ended"], "players": rec["players"], "max_pip": rec["max_pip"], "seed": rec["seed"], "hands": {u: ts.tiles_in(m) for u, m in zip(rec["players"], rec["deal"])}, "moves": len(events)}})
+            end = {"replay_end": dict(outcome, game=game, hands={u: h.tiles() for u, h in final.hands.items()})}
+            if interval:
+                self.timers.schedule(interval, self.replay_step, conn, game, events, 0, interval, end)
+            else:
+                for i in range(0, len(events), REPLAY_CHUNK):
+                    conn.send_message({"replay": {"game": game, "events": events[i:i + REPLAY_CHUNK]}})
+                conn.send_message(end)
 
-                action = req.get("action")
+        # --- matchmaking. payload: {"difficulty" (default: the server's), "players": lobby size (default: the server's max), "cancel": true to leave the queue} ---
+        elif action == "queue":
+            if req.get("cancel"):
+                conn.send_message({"unqueued": self.matchmaker.cancel(username, conn)}); return
+            if self.lobbies.seated(conn):
+                conn.send_message({"error":"Leave your lobby first"}); return
+            difficulty = req.get("difficulty") or self.default_difficulty
+            if difficulty not in DEAL_SIZES:
+                conn.send_message({"error":"Unknown difficulty"}); return
+            size = req.get("players", self.max_players_per_lobby)
+            if not isinstance(size, int) or isinstance(size, bool) or not 2 <= size <= self.max_players_per_lobby:
+                conn.send_message({"error": f"Players must be 2-{self.max_players_per_lobby}"}); return
+            stats = self.stats.get(username, {"wins":0,"games":0})
+            level = player_level(stats["wins"], stats["games"])
+            _, groups = self.matchmaker.add(username, conn, level, difficulty, size)
+            conn.send_message({"queued": {"difficulty": difficulty, "players": size, "level": level, "waiting": self.matchmaker.waiting(difficulty, size)}})
+            for group in groups:
+                self.start_match(group)
 
-                # --- list server info ---
-                if action == "list":
-                    conn.send(pickle.dumps({"server_info": self.list_servers_info()}))
+        # --- watch a lobby without a seat. payload: {"lobby_id", "leave": true to stop watching} ---
+        elif action == "spectate":
+            if req.get("leave"):
+                conn.send_message({"unspectated": self.unwatch(conn)}); return
+            lid = req.get("lobby_id")
+            lobby = self.lobbies.get(lid)
+            owner = self.cluster.owner(lid) if self.cluster else None
+            if not lobby and owner is not None and owner != self.cluster.index:
+                # another worker's lobby: the connection moves there, like a join
+                if self.in_game(conn):
+                    conn.send_message({"error":"Lobby is on another server process; finish or leave your game first"})
+                else:
+                    conn.migrate_to = owner
+                return
+            if not lobby:
+                conn.send_message({"error":"Lobby not found"}); return
+            if self.lobbies.seated(conn):
+                conn.send_message({"error":"Leave your lobby first"}); return
+            self.unwatch(conn)
+            with lobby.lock:
+                if self.lobbies.get(lid) is not lobby:
+                    conn.send_message({"error":"Lobby not found"}); return
+                if not self.spectate(conn, lobby):
+                    conn.send_message({"error":"Too many spectators"}); return
+                if lobby.spectator_delay:
+                    conn.send_message({"spectate_delay": {"lobby_id": lid, "delay": lobby.spectator_delay}})
 
-                # --- create lobby ---
-                elif action == "create_lobby":
-                    requested_max = req.get("max_players")
-                    difficulty = req.get("difficulty")
-                    lobby, err = self.create_lobby(username, requested_max, difficulty)
-                    if lobby is None:
-                        conn.send(pickle.dumps({"error": err}))
+        # --- tournaments. payload: {"op": "list" | "standings" (anyone) | "create" | "seat" | "advance" (admin, refused without an admin token), "id", ...} ---
+        elif action == "tournament":
+            op = req.get("op")
+            tourneys = self.tournaments
+            if op == "list":
+                with tourneys.lock:
+                    conn.send_message({"tournaments": [t.summary() for t in tourneys.by_id.values()]})
+                return
+            if op in ("create", "seat", "advance") and (not self.admin_token or req.get("token") != self.admin_token):
+                conn.send_message({"error":"Not allowed"}); return
+            if op == "create":
+                # {"name", "format": "bracket"|"round_robin", "players": [usernames, in seeding order for equal levels],
+                #  "seats": players per table, "auto": next round as soon as one ends (default true),
+                #  "difficulty", "max_pip", "turn_seconds", "spectator_delay": as create_lobby, for every table}
+                fmt = req.get("format", "bracket")
+                players = req.get("players")
+                seats = req.get("seats", 2)
+                if fmt not in FORMATS:
+                    conn.send_message({"error": f"Format must be {' or '.join(FORMATS)}"}); return
+                if (not isinstance(players, list) or not all(isinstance(u, str) and u for u in players)
+                        or len(set(players)) != len(players) or not 2 <= len(players) <= MAX_ENTRANTS):
+                    conn.send_message({"error": f"Players must be 2-{MAX_ENTRANTS} different names"}); return
+                if not isinstance(seats, int) or isinstance(seats, bool) or not 2 <= seats <= self.max_players_per_lobby or fmt == "round_robin" and seats != 2:
+                    conn.send_message({"error": "Round robin tables have 2 seats" if fmt == "round_robin" else f"Seats must be 2-{self.max_players_per_lobby}"}); return
+                difficulty = req.get("difficulty") or self.default_difficulty
+                if difficulty not in DEAL_SIZES:
+                    conn.send_message({"error":"Unknown difficulty"}); return
+                settings = {"difficulty": difficulty, "max_pip": req.get("max_pip"), "turn_seconds": req.get("turn_seconds"), "spectator_delay": req.get("spectator_delay")}
+                err = self.lobby_settings_error(settings["max_pip"], settings["turn_seconds"], settings["spectator_delay"])
+                if err:
+                    conn.send_message({"error": err}); return
+                # seeded by level, best first
+                levels = {u: player_level(s["wins"], s["games"]) for u, s in ((u, self.stats.get(u, {"wins":0,"games":0})) for u in players)}
+                seeds = sorted(players, key=lambda u: -levels[u])
+                t = tourneys.create(str(req.get("name") or "Tournament"), fmt, seeds, seats, settings, req.get("auto", True) is not False)
+                conn.send_message({"tournament": t.summary()})
+                return
+            t = tourneys.get(req.get("id"))
+            if t is None:
+                conn.send_message({"error":"Tournament not found"}); return
+            if op == "standings":
+                # {"id", "limit" (default 20)}
+                try:
+                    limit = min(max(int(req.get("limit", 20)), 1), MAX_ENTRANTS)
+                except (TypeError, ValueError):
+                    limit = 20
+                with tourneys.lock:
+                    conn.send_message({"standings": dict(t.summary(), rows=t.standings.top(limit), you=t.standings.rank(username),
+                                                         version=t.standings.version, lobbies=sorted(t.lobbies.values()))})
+            elif op in ("seat", "advance"):
+                # seat: play the first round; advance: the next one, once every table of this one is done
+                with tourneys.lock:
+                    if op == "seat" and t.state != "open":
+                        err = "Tournament already started"
+                    elif op == "advance" and t.state != "ready":
+                        err = {"open": "Tournament not started, seat it first", "finished": "Tournament is over",
+                               "playing": f"Round {t.round} still has {t.left} tables playing"}[t.state]
                     else:
-                        conn.send(pickle.dumps({"created": True, "lobby_id": lobby.lobby_id}))
-                
-                # --- join lobby ---
-                elif action == "join_lobby":
-                    lid = req.get("lobby_id")
-                    lobby = self.lobbies.get(lid)
-                    if not lobby:
-                        conn.send(pickle.dumps({"error":"Lobby not found"}))
-                        continue
-                    with lobby.lock:
-                        if len(lobby.players) >= lobby.max_players:
-                            conn.send(pickle.dumps({"error":"Lobby full"}))
-                            continue
-                        # add player
+                        err = None
+                        over = not tourneys.start_round(t)
+                if err:
+                    conn.send_message({"error": err}); return
+                conn.send_message({"tournament": t.summary()})
+                if over:
+                    self.tournament_over(t)
+            else:
+                conn.send_message({"error":"Unknown tournament op"})
+
+        # --- chat to your lobby. payload: {"lobby_id", "text"}; it arrives batched as {"chat": {"lobby_id", "messages": [[seq, user, text, time], ...]}} ---
+        elif action == "chat":
+            lid = req.get("lobby_id")
+            if lid not in self.lobbies.seated(conn) or self.lobbies.get(lid) is None:
+                conn.send_message({"error":"You are not in the lobby"}); return
+            err = self.chat.post(lid, username, req.get("text"))
+            if err:
+                conn.send_message({"error": err})
+
+        # --- heartbeat / ping ---
+        elif action == "ping":
+            conn.send_message({"pong": time.time()})
+
+        else:
+            conn.send_message({"error":"Unknown action"})
+            return "unknown"
+
+    def in_game(self, conn):
+        # whether conn holds a seat in a running game (it can't move to another worker then)
+        return any(l and l.started for l in map(self.lobbies.get, self.lobbies.seated(conn)))
+
+    def spectate(self, conn, lobby):
+        # conn watches lobby from a public snapshot on, through the lobby's delay (caller holds
+        # lobby.lock); False when the lobby has all the spectators it takes
+        if lobby.feed is None:
+            lobby.feed = Feed(self.spectators, lobby.lobby_id, lobby.spectator_delay)
+        view = dict(lobby.snapshot(), started=lobby.started, host=lobby.host_name, difficulty=lobby.difficulty,
+                    max_players=lobby.max_players, max_pip=lobby.max_pip, delay=lobby.spectator_delay,
+                    chat=self.chat.history(lobby.lobby_id, time.time() - lobby.spectator_delay if lobby.spectator_delay else None))
+        if not lobby.feed.add(conn, pack_message({"spectating": view}, conn.codec), SPECTATORS):
+            return False
+        with self.lock:
+            self.watching[conn] = lobby.lobby_id
+        return True
+
+    def behind(self, conn, lobby):
+        # whether the game in lobby is delayed for conn: it has a spectator delay and conn has no seat there
+        return bool(lobby.spectator_delay) and lobby.started and lobby.lobby_id not in self.lobbies.seated(conn)
+
+    def unwatch(self, conn):
+        # stop spectating; True if conn was
+        with self.lock:
+            lid = self.watching.pop(conn, None)
+        lobby = self.lobbies.get(lid) if lid is not None else None
+        return bool(lobby and lobby.feed and lobby.feed.remove(conn))
+
+    def replay_step(self, conn, game, events, i, interval, end):
+        # timer: the next move of a paced replay, then the result
+        if conn.closed:
+            return
+        if i == len(events):
+            conn.send_message(end)
+            return
+        conn.send_message({"replay": {"game": game, "events": [events[i]]}})
+        self.timers.schedule(interval, self.replay_step, conn, game, events, i + 1, interval, end)
+
+    def queue_metrics(self, conn=None):
+        # outbound queue depth across all clients (plus the asking client's own numbers)
+        with self.lock:
+            conns = list(self.clients)
+            slow = self.slow_disconnects
+        depths = [c.depth() for c in conns]
+        info = {"connections": len(conns), "total_depth": sum(depths), "max_depth": max(depths, default=0),
+                "slow_disconnects": slow}
+        if conn is not None:
+            info["you"] = conn.metrics()
+        return info
+
+    def gauges(self):
+        # [(name, kind, help, value)] read at scrape time, so nothing on the hot path keeps them
+        with self.lock:
+            conns = list(self.clients)
+            bytes_in, bytes_out = self.closed_bytes
+            slow = self.slow_disconnects
+            idle = self.idle_disconnects
+            orphans = list(self.orphans.values())
+        lobbies = self.lobbies.values()
+        running = self.tournaments.running()
+        return [
+            ("connections", "gauge", "Connected clients.", len(conns)),
+            ("lobbies", "gauge", "Lobbies open.", len(lobbies)),
+            ("games_running", "gauge", "Lobbies with a game in progress.", sum(1 for l in lobbies if l.started)),
+            ("received_bytes_total", "counter", "Bytes read from clients.", bytes_in + sum(c.bytes_in for c in conns)),
+            ("sent_bytes_total", "counter", "Bytes written to clients.", bytes_out + sum(c.bytes_out for c in conns)),
+            ("outbound_queue_frames", "gauge", "Frames queued to clients, all connections.", sum(c.depth() for c in conns)),
+            ("slow_disconnects_total", "counter", "Clients cut off for not reading fast enough.", slow),
+            ("bot_moves_total", "counter", "Moves made by bots.", self.bots.moves),
+            ("idle_disconnects_total", "counter", "Connections cut for staying quiet past the idle timeout.", idle),
+            ("vacant_seats", "gauge", "Seats in running games waiting for their player to come back.", sum(map(len, orphans))),
+            ("timers_pending", "gauge", "Timers on the timer wheel.", self.timers.pending),
+            ("players_queued", "gauge", "Players waiting in the matchmaking queue.", len(self.matchmaker)),
+            ("matches_total", "counter", "Lobbies the matchmaker assembled.", self.matchmaker.matches),
+            ("spectators", "gauge", "Connections spectating a lobby.", sum(len(l.feed) for l in lobbies if l.feed is not None)),
+            ("spectator_frames_total", "counter", "Frames queued to spectators by the fan-out thread.", self.spectators.frames),
+            ("spectator_backlog", "gauge", "Broadcasts waiting for the fan-out thread, spectator delays included.", len(self.spectators)),
+            ("tournaments_running", "gauge", "Tournaments not over yet.", len(running)),
+            ("tournament_tables", "gauge", "Tournament tables playing.", sum(t.left for t in running)),
+            ("tournament_backlog", "gauge", "Finished tournament tables and tables to seat waiting for a tournament pass.", len(self.tournaments.results) + len(self.tournaments.to_seat)),
+            ("chat_messages_total", "counter", "Chat messages posted.", self.chat.posted),
+            ("chat_limited_total", "counter", "Chat messages refused by the per-player rate limit.", self.chat.limited),
+            ("chat_rooms", "gauge", "Lobbies with chat history.", len(self.chat)),
+        ] + ([
+            ("games_archived_total", "counter", "Finished games in the replay archive.", len(self.archive)),
+            ("archive_bytes", "gauge", "Size of the replay archive's records.", self.archive.size()),
+        ] if self.archive is not None else [])
+
+    def render_metrics(self):
+        return self.metrics.render(self.gauges())
+
+    def watch(self, conn):
+        # start idle checks for a new connection: one timer at a time, re-armed lazily when it
+        # fires rather than on every read
+        if self.idle_timeout:
+            self.timers.schedule(self.idle_timeout, self.check_idle, conn)
+
+    def check_idle(self, conn):
+        # timer: cut the connection if nothing came from it for idle_timeout seconds
+        if conn.closed:
+            return  # gone already, or handed over to another worker
+        quiet = time.monotonic() - conn.last_active
+        if quiet < self.idle_timeout:
+            self.timers.schedule(self.idle_timeout - quiet, self.check_idle, conn)
+            return
+        with self.lock:
+            self.idle_disconnects += 1
+        conn.abort()  # the reader sees EOF and disconnects it
+
+    def disconnect(self, conn):
+        # cleanup on disconnect
+        with self.lock:
+            entry = self.clients.pop(conn, None)
+            if self.live.get(conn.session) is conn:
+                del self.live[conn.session]
+            if conn.slow:
+                self.slow_disconnects += 1
+            if entry is not None:
+                self.closed_bytes[0] += conn.bytes_in
+                self.closed_bytes[1] += conn.bytes_out
+        if entry is not None:
+            self.matchmaker.cancel(entry[0], conn)
+        self.unwatch(conn)
+        # remove from the lobbies it sat in (reverse index, no scan over every lobby)
+        for lid in self.lobbies.unseat_all(conn):
+            lobby = self.lobbies.get(lid)
+            if not lobby:
+                continue
+            with lobby.lock:
+                if lobby.started:
+                    # mid-game: the seat waits for its player to come back (see resume)
+                    for u in lobby.vacate(conn):
                         with self.lock:
-                            stats_ref = self.stats.setdefault(username, {"wins":0,"games":0})
-                        lobby.players.append((conn, username, stats_ref))
-                        lobby.player_names.append(username)
-                        conn.send(pickle.dumps({"joined": True, "lobby_id": lid, "players": lobby.player_names, "difficulty": lobby.difficulty, "max_players": lobby.max_players}))
-                        # notify others in lobby
-                        lobby.broadcast({"lobby_update": {"players": lobby.player_names}})
-                
-                # --- leave lobby ---
-                elif action == "leave_lobby":
-                    lid = req.get("lobby_id")
-                    lobby = self.lobbies.get(lid)
-                    if not lobby:
-                        conn.send(pickle.dumps({"error":"Lobby not found"}))
-                        continue
-                    with lobby.lock:
-                        # remove player
-                        removed = False
-                        for i, (c, uname, stats) in enumerate(list(lobby.players)):
-                            if c == conn:
-                                lobby.players.pop(i)
-                                lobby.player_names.pop(i)
-                                removed = True
-                                break
-                        if removed:
-                            lobby.broadcast({"lobby_update":{"players": lobby.player_names}})
-                            conn.send(pickle.dumps({"left":True}))
-                    self.remove_lobby_if_empty(lid)
-
-                # --- start game (host only) ---
-                elif action == "start_lobby":
-                    lid = req.get("lobby_id")
-                    lobby = self.lobbies.get(lid)
-                    if not lobby:
-                        conn.send(pickle.dumps({"error":"Lobby not found"})); continue
-                    if username != lobby.host_name:
-                        conn.send(pickle.dumps({"error":"Only host can start"})); continue
-                    with lobby.lock:
-                        if lobby.started:
-                            conn.send(pickle.dumps({"error":"Already started"})); continue
-                        if len(lobby.players) < 2:
-                            conn.send(pickle.dumps({"error":"Need at least 2 players to start"})); continue
-                        # start a game
-                        lobby.started = True
-                        # prepare domino deck and deal based on difficulty
-                        deck = make_domino_set(6)
-                        random.shuffle(deck)
-                        per_player = 8 if lobby.difficulty == "easy" else 12 if lobby.difficulty == "normal" else 14
-                        hands = {}
-                        for _, uname, _ in lobby.players:
-                            hand = [deck.pop() for _ in range(min(per_player, len(deck)))]
-                            hands[uname] = hand
-                        lobby.chain = []
-                        lobby.hands = hands
-                        lobby.turn_index = 0
-                        lobby.passes_in_row = 0
-                        # flag each player's 'started' status by sending initial update
-                        for conn2, uname2, _ in lobby.players:
-                            try:
-                                conn2.send(pickle.dumps({"game_start": True, "lobby_id": lid, "your_hand": hands[uname2], "players": lobby.player_names, "turn": lobby.current_turn_username(), "chain": lobby.chain}))
-                            except:
-                                pass
-
-                # --- move (place tile or pass). payload: {"action":"move", "lobby_id":int, "move": (a,b) or "pass", "side":"left"|"right", "chat": str} ---
-                elif action == "move":
-                    lid = req.get("lobby_id")
-                    lobby = self.lobbies.get(lid)
-                    if not lobby:
-                        conn.send(pickle.dumps({"error":"Lobby not found"})); continue
-                    with lobby.lock:
-                        # determine who this is
-                        player_index = None
-                        for idx, (c, uname, _) in enumerate(lobby.players):
-                            if c == conn:
-                                player_index = idx
-                                break
-                        if player_index is None:
-                            conn.send(pickle.dumps({"error":"You are not in the lobby"})); continue
-                        if lobby.player_names[lobby.turn_index % len(lobby.player_names)] != username:
-                            conn.send(pickle.dumps({"error":"Not your turn"})); continue
-
-                        move = req.get("move")
-                        chat = req.get("chat","")
-                        side = req.get("side","right")
-                        # broadcast chat first if present
-                        if chat:
-                            lobby.broadcast({"chat": f"{username}: {chat}"})
-
-                        if move == "pass":
-                            lobby.passes_in_row += 1
-                            lobby.turn_index = (lobby.turn_index + 1) % len(lobby.player_names)
-                            lobby.broadcast({"update": {"chain": lobby.chain, "hands_sizes": {u: len(h) for u,h in lobby.hands.items()}, "turn": lobby.current_turn_username()}})
-                        else:
-                            # attempt to place tile
-                            tile = tuple(move)
-                            hand = lobby.hands.get(username, [])
-                            if tile not in hand and (tile[1], tile[0]) not in hand:
-                                conn.send(pickle.dumps({"error":"You don't have that tile", "your_hand": hand}))
-                                continue
-                            if not lobby.chain:
-                                # place as is
-                                # orient tile so it appears [a|b] and will be the only tile
-                                if tile in hand:
-                                    placed = tile
-                                    hand.remove(tile)
-                                else:
-                                    placed = (tile[1], tile[0])
-                                    hand.remove((tile[1], tile[0]))
-                                lobby.chain.append(placed)
-                                lobby.passes_in_row = 0
-                                lobby.turn_index = (lobby.turn_index + 1) % len(lobby.player_names)
-                                lobby.broadcast({"update": {"placed_by":username, "placed_tile": placed, "chain": lobby.chain, "hands_sizes": {u: len(h) for u,h in lobby.hands.items()}, "turn": lobby.current_turn_username()}})
-                            else:
-                                if side not in ("left","right"): side = "right"
-                                if side == "left":
-                                    left_val = lobby.chain[0][0]  # leftmost face
-                                    oriented = orient_for_left(tile, left_val)
-                                    if oriented is None:
-                                        conn.send(pickle.dumps({"error":"Tile does not match left end", "your_hand": hand}))
-                                        continue
-                                    # remove tile (in whatever orientation it's in)
-                                    if tile in hand:
-                                        hand.remove(tile)
-                                    else:
-                                        hand.remove((tile[1], tile[0]))
-                                    lobby.chain.insert(0, oriented)
-                                    lobby.passes_in_row = 0
-                                    lobby.turn_index = (lobby.turn_index + 1) % len(lobby.player_names)
-                                    lobby.broadcast({"update": {"placed_by":username, "placed_tile": oriented, "chain": lobby.chain, "hands_sizes": {u: len(h) for u,h in lobby.hands.items()}, "turn": lobby.current_turn_username()}})
-                                else:
-                                    right_val = lobby.chain[-1][1]
-                                    oriented = orient_for_right(tile, right_val)
-                                    if oriented is None:
-                                        conn.send(pickle.dumps({"error":"Tile does not match right end", "your_hand": hand}))
-                                        continue
-                                    if tile in hand:
-                                        hand.remove(tile)
-                                    else:
-                                        hand.remove((tile[1], tile[0]))
-                                    lobby.chain.append(oriented)
-                                    lobby.passes_in_row = 0
-                                    lobby.turn_index = (lobby.turn_index + 1) % len(lobby.player_names)
-                                    lobby.broadcast({"update": {"placed_by":username, "placed_tile": oriented, "chain": lobby.chain, "hands_sizes": {u: len(h) for u,h in lobby.hands.items()}, "turn": lobby.current_turn_username()}})
-                        # check win condition (someone has 0 tiles)
-                        winner = None
-                        for u,h in lobby.hands.items():
-                            if len(h) == 0:
-                                winner = u
-                                break
-                        if winner:
-                            # update stats
-                            with self.lock:
-                                self.stats[winner]["wins"] += 1
-                                for u in lobby.hands:
-                                    self.stats[u]["games"] += 1
-                            lobby.broadcast({"game_over": {"winner": winner, "hands": lobby.hands}})
-                            # reset lobby state to allow restart later
-                            lobby.started = False
-                            lobby.hands = {}
-                            lobby.chain = []
-                            lobby.turn_index = 0
-                            continue
-                        # check blocked condition: if passes_in_row >= number players -> blocked
-                        if lobby.passes_in_row >= len(lobby.player_names) and lobby.passes_in_row > 0:
-                            # compute least pip sum
-                            sums = {u: sum_pips(h) for u,h in lobby.hands.items()}
-                            winner_u = min(sums, key=sums.get)
-                            with self.lock:
-                                self.stats[winner_u]["wins"] += 1
-                                for u in lobby.hands:
-                                    self.stats[u]["games"] += 1
-                            lobby.broadcast({"game_over": {"blocked": True, "winner": winner_u, "sums": sums, "hands": lobby.hands}})
-                            lobby.started = False
-                            lobby.hands = {}
-                            lobby.chain = []
-                            lobby.turn_index = 0
-
-                # --- request hand or lobby status ---
-                elif action == "status":
-                    lid = req.get("lobby_id")
-                    lobby = self.lobbies.get(lid)
-                    if not lobby:
-                        conn.send(pickle.dumps({"error":"Lobby not found"}))
-                        continue
-                    with lobby.lock:
-                        # send status to requester
-                        owner_stats = self.stats.get(username, {"wins":0,"games":0})
-                        user_hand = lobby.hands.get(username, [])
-                        conn.send(pickle.dumps({"status": {"players": lobby.player_names, "chain": lobby.chain, "your_hand": user_hand, "turn": lobby.current_turn_username(), "hands_sizes": {u: len(h) for u,h in lobby.hands.items()}, "your_level": player_level(owner_stats["wins"], owner_stats["games"])}}))
-
-                # --- heartbeat / ping ---
-                elif action == "ping":
-                    conn.send(pickle.dumps({"pong": time.time()}))
+                            self.orphans.setdefault(u, set()).add(lid)
+                        self.start_grace(lobby, u)
+                        lobby.broadcast({"lobby_update": {"players": lobby.player_names, "disconnected": u, "grace": self.grace}})
+                elif lobby.remove_player(conn):
+                    lobby.broadcast({"lobby_update":{"players": lobby.player_names}})
+                    self.server_info.touch()
+            self.remove_lobby_if_empty(lid)
+        conn.close()
 
-                else:
-                    conn.send(pickle.dumps({"error":"Unknown action"}))
+    def client_thread(self, conn, addr, pending=b"", moved=None):
+        # pending: bytes the supervisor already read from the socket; moved: session of a
+        # connection another worker handed over (it said hello there)
+        try:
+            self.watch(conn)
+            decoder = FrameDecoder(self.max_frame)
+            username = self.adopt(conn, moved) if moved else None
+            data = pending or conn.sock.recv(RECV_SIZE)
+            if username is None and unframed(data, self.max_frame):
+                self.refuse_unframed(conn)
+                return
+            while data:
+                conn.bytes_in += len(data)
+                conn.last_active = time.monotonic()
+                frames = decoder.feed(data)
+                for i, frame in enumerate(frames):
+                    if username is None:
+                        username = self.handle_hello(conn, addr, frame)
+                        if username is None:
+                            return
+                    elif not self.running:
+                        return
+                    else:
+                        trace = self.profiler.sample() if self.profiler.enabled else None
+                        if trace is None:
+                            req = self.decode_request(conn, frame)
+                        else:
+                            t0 = time.perf_counter()
+                            req = self.decode_request(conn, frame)
+                            trace.add("decode", time.perf_counter() - t0)
+                        self.handle_request(conn, username, req)
+                        if conn.migrate_to is not None:
+                            # joined another worker's lobby: that worker takes over from this frame on
+                            if self.cluster.migrate(conn, addr, username, frames[i:], decoder):
+                                return
+                            conn.migrate_to = None  # too much pipelined input to hand over: stay here
+                            conn.send_message({"error":"Lobby is on another server process and could not be joined now; try again"})
+                data = conn.sock.recv(RECV_SIZE)
 
+        except (OSError, FrameTooLarge):
+            pass  # connection reset, or a client over the frame limit: a plain disconnect
         except Exception as e:
-            # unexpected error for a client
-            #print("Client thread error:", e)
-            pass
+            # unexpected error for a client: counted, and the last few kept for the stats action
+            self.metrics.error("client_thread", e)
         finally:
-            # cleanup on disconnect
-            with self.lock:
-                entry = self.clients.pop(conn, None)
-            # remove from any lobby
-            for lid, lobby in list(self.lobbies.items()):
-                with lobby.lock:
-                    for i,(c,uname,_) in enumerate(list(lobby.players)):
-                        if c == conn:
-                            lobby.players.pop(i)
-                            lobby.player_names.pop(i)
-                            lobby.broadcast({"lobby_update":{"players": lobby.player_names}})
-            conn.close()
+            self.disconnect(conn)
 
     def start(self):
         print(f"Starting server '{self.server_name}' on {self.host}:{self.port}")
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # restart right after a crash
         self.sock.bind((self.host, self.port))
         self.sock.listen(64)
         try:
             while True:
                 conn, addr = self.sock.accept()
+                conn = Connection(conn, self.max_queue)
+                conn.start()
                 threading.Thread(target=self.client_thread, args=(conn, addr), daemon=True).start()
         except KeyboardInterrupt:
             print("Shutting down server.")
-            self.running = False
             self.sock.close()
+            self.shutdown()
+
+    def shutdown(self):
+        self.running = False
+        if self.stats_writer:
+            self.stats_writer.close()  # flush and sync queued results
+            self.stats_writer = None
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.archive is not None:
+            archive, self.archive = self.archive, None
+            archive.close()
+        if self.metrics_http:
+            self.metrics_http.close()
+            self.metrics_http = None
+        self.profiler.close()
+        self.bots.close()
+        self.timers.close()
+        self.spectators.close()
 
 
 # --- Run server (ask initial settings interactively) ---
@@ -459,5 +1457,50 @@ if __name__ == "__main__":
         max_lobbies = 4
     difficulty = input("Default difficulty (easy/normal/hard) (default normal): ").strip().lower() or "normal"
     difficulty = difficulty if difficulty in ("easy","normal","hard") else "normal"
-    server = GameServer(HOST, PORT, server_name, max_players_per_lobby, max_lobbies, difficulty)
-    server.start()
+    legacy = input("Accept legacy pickle clients? (y/n) (default y): ").strip().lower() or "y"
+    codecs = tuple(CODECS) if legacy.startswith("y") else tuple(name for name in CODECS if name != "pickle")
+    engine = input("Server engine (threaded/asyncio) (default threaded): ").strip().lower() or "threaded"
+    stats_path = input("Stats file (.db for SQLite, other names use a log) (default: memory only): ").strip()
+    journal_path = input("Game journal file, lets running games survive a restart (default: none): ").strip()
+    replay_path = input("Replay archive file, keeps every finished game (default: none): ").strip()
+    try:
+        metrics_port = int(input("Metrics port for Prometheus scrapes, on 127.0.0.1 (default: none): ") or 0)
+    except:
+        metrics_port = 0
+    admin_token = input("Admin token for the stats, profile and tournament admin actions (default: none; stats open to anyone, the rest off): ").strip() or None
+    slow_log = input("Slow request log file, turns request profiling on (default: off, the profile action can turn it on): ").strip()
+    try:
+        idle_timeout = float(input(f"Seconds before a silent client is disconnected, 0 = never (default {IDLE_TIMEOUT:g}): ") or IDLE_TIMEOUT)
+    except:
+        idle_timeout = IDLE_TIMEOUT
+    try:
+        grace = float(input(f"Seconds a dropped player keeps their seat in a running game (default {GRACE:g}): ") or GRACE)
+    except:
+        grace = GRACE
+    workers = 1
+    if engine != "asyncio":
+        try:
+            workers = int(input(f"Worker processes (lobbies are split between them, {os.cpu_count()} cores) (default 1): ") or 1)
+        except:
+            workers = 1
+
+    def make_server(cluster=None):
+        # in supervisor mode each worker gets its own stats and journal files and its share of the lobbies
+        path = (lambda p: worker_path(p, cluster.index)) if cluster else (lambda p: p)
+        store = store_for(path(stats_path)) if stats_path else None
+        journal = GameJournal(path(journal_path)) if journal_path else None
+        lobbies = cluster.worker_lobbies if cluster else max_lobbies
+        port = metrics_port + cluster.index if cluster and metrics_port else metrics_port  # one scrape port per worker
+        profiler = Profiler(enabled=True, path=path(slow_log)) if slow_log else None
+        # game ids are numbered like the worker's lobby ids
+        archive = ReplayArchive(path(replay_path), *((cluster.index + 1, cluster.workers) if cluster else (1, 1))) if replay_path else None
+        return GameServer(HOST, PORT, server_name, max_players_per_lobby, lobbies, difficulty, codecs=codecs, stats_store=store, journal=journal, cluster=cluster, metrics_port=port, admin_token=admin_token, profiler=profiler, idle_timeout=idle_timeout, grace=grace, archive=archive)
+
+    if workers > 1:
+        Supervisor(make_server, workers, HOST, PORT, max_lobbies).start()
+    elif engine == "asyncio":
+        server = make_server()
+        from aio_server import AsyncEngine
+        AsyncEngine(server).start()
+    else:
+        make_server().start()
@@ -0,0 +1,152 @@
+"""
+Matchmaking queue
+- players queue with a preferred difficulty and lobby size; each (difficulty, size) has one FIFO
+  queue per player level (0..MAX_LEVEL, see player_level in main.py), so finding opponents looks
+  at a dozen queue heads whatever the number of waiting players
+- a group is built around an anchor, the longest-waiting player at the head of some level's
+  queue: players of the anchor's level first, then one level either side, and so on out to the
+  anchor's window; within a level the earliest in line go first
+- the window starts at WINDOW levels and widens by one every WIDEN_EVERY seconds the anchor has
+  waited, so nobody waits forever for an exact skill match
+- add() tries to match at once; sweep() (run on the server's timer wheel) retries every queue
+  as windows widen. Both hand back the groups they made; the server turns each into a lobby
+- a cancelled ticket is only flagged, and dropped when it reaches the head of its queue
+"""
+
+import threading
+import time
+from collections import deque
+
+MAX_LEVEL = 10  # player_level() is 0..10
+WINDOW = 1  # levels either side of the anchor a new match may reach
+WIDEN_EVERY = 10.0  # seconds of waiting per extra level of window
+
+
+class Ticket:
+    __slots__ = ("name", "conn", "level", "difficulty", "size", "since", "active")
+
+    def __init__(self, name, conn, level, difficulty, size, since):
+        self.name = name
+        self.conn = conn
+        self.level = level
+        self.difficulty = difficulty
+        self.size = size  # players wanted in the lobby
+        self.since = since  # when it joined the queue (the matchmaker's clock)
+        self.active = True  # False once matched or cancelled
+
+
+class Matchmaker:
+    def __init__(self, window=WINDOW, widen_every=WIDEN_EVERY, clock=time.monotonic):
+        self.window = window
+        self.widen_every = widen_every
+        self.clock = clock
+        self.queues = {}  # (difficulty, size) -> [deque of Tickets per level]
+        self.counts = {}  # (difficulty, size) -> active tickets in those queues
+        self.tickets = {}  # username -> their active Ticket
+        self.matches = 0
+        self.matched = 0  # players placed
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def add(self, name, conn, level, difficulty, size, match=True):
+        # queue a player (replacing a ticket they already hold); returns (ticket, [groups made]).
+        # match=False only queues, the next sweep() matches
+        now = self.clock()
+        key = (difficulty, size)
+        level = min(max(level, 0), MAX_LEVEL)
+        with self.lock:
+            self._cancel(name)
+            ticket = Ticket(name, conn, level, difficulty, size, now)
+            queues = self.queues.get(key)
+            if queues is None:
+                queues = self.queues[key] = [deque() for _ in range(MAX_LEVEL + 1)]
+                self.counts[key] = 0
+            queues[level].append(ticket)
+            self.counts[key] += 1
+            self.tickets[name] = ticket
+            return ticket, self._match(key, now) if match else []
+
+    def cancel(self, name, conn=None):
+        # take a player out of the queue (only if conn holds the ticket, when given); True if queued
+        with self.lock:
+            ticket = self.tickets.get(name)
+            if ticket is None or (conn is not None and ticket.conn is not conn):
+                return False
+            return self._cancel(name)
+
+    def _cancel(self, name):
+        ticket = self.tickets.pop(name, None)
+        if ticket is None:
+            return False
+        ticket.active = False
+        self.counts[(ticket.difficulty, ticket.size)] -= 1
+        return True
+
+    def requeue(self, group):
+        # put a group that could not be seated back at the front of its queues, keeping their place
+        with self.lock:
+            for ticket in reversed(group):
+                if ticket.name in self.tickets:
+                    continue  # queued again meanwhile
+                ticket.active = True
+                self.queues[(ticket.difficulty, ticket.size)][ticket.level].appendleft(ticket)
+                self.counts[(ticket.difficulty, ticket.size)] += 1
+                self.tickets[ticket.name] = ticket
+
+    def waiting(self, difficulty, size):
+        return self.counts.get((difficulty, size), 0)
+
+    def sweep(self):
+        # match every queue again with the windows as they are now; returns the groups made
+        now = self.clock()
+        groups = []
+        with self.lock:
+            for key, count in list(self.counts.items()):
+                if count >= key[1]:
+                    groups += self._match(key, now)
+        return groups
+
+    def _match(self, key, now):
+        # build groups from one (difficulty, size) queue set until no anchor can fill one
+        queues = self.queues[key]
+        size = key[1]
+        groups = []
+        while self.counts[key] >= size:
+            heads = []
+            for q in queues:
+                while q and not q[0].active:
+                    q.popleft()
+                if q:
+                    heads.append(q[0])
+            heads.sort(key=lambda t: t.since)
+            for anchor in heads:
+                group = self._fill(queues, anchor, size, now)
+                if group:
+                    break
+            else:
+                break
+            for ticket in group:
+                ticket.active = False
+                del self.tickets[ticket.name]
+            self.counts[key] -= size
+            self.matches += 1
+            self.matched += size
+            groups.append(group)
+        return groups
+
+    def _fill(self, queues, anchor, size, now):
+        # size players around anchor within its window, closest levels first; None if too few
+        window = min(self.window + int((now - anchor.since) / self.widen_every), MAX_LEVEL)
+        group = []
+        for d in range(window + 1):
+            for level in (anchor.level - d, anchor.level + d) if d else (anchor.level,):
+                if not 0 <= level <= MAX_LEVEL:
+                    continue
+                for ticket in queues[level]:
+                    if ticket.active:
+                        group.append(ticket)
+                        if len(group) == size:
+                            return group
+        return None
@@ -0,0 +1,245 @@
+"""
+Server metrics, cheap enough to leave on
+- Counter is a number behind a lock; Histogram has fixed exponential buckets (50us .. ~3s) plus
+  count and sum, so an observation is one bisect and a few adds under the histogram's own lock
+- TimedLock is a drop-in for threading.Lock that only reads the clock when it has to wait;
+  the wait goes into a histogram, an uncontended acquire costs one extra non-blocking try
+- Metrics holds per-action request latency and failures, lock waits, broadcast fan-out and the
+  errors the server swallows (with the last few messages); GameServer adds its gauges
+  (lobbies, connections, bytes, queues) when asked
+- render() gives the Prometheus text format, MetricsHTTP serves it at /metrics on a local port,
+  snapshot() the same numbers as a dict for the stats admin action
+- Metrics(enabled=False) makes every call a no-op and hands out plain locks
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from profiler import current
+
+BUCKETS = tuple(0.00005 * 2 ** i for i in range(17))  # upper bounds in seconds, 50us .. 3.3s
+MAX_LABELS = 64  # distinct actions / lock names / error sites; more are counted as "other"
+RECENT_ERRORS = 20
+
+
+def _label_value(v):
+    # label values come from clients (action names): escape them for the text format
+    return str(v)[:64].replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum
+
+    def summary(self):
+        # {"count", "mean", "p50", "p99"}; quantiles are bucket upper bounds
+        counts, count, total = self.snapshot()
+        out = {"count": count, "mean": total / count if count else 0.0}
+        for name, q in (("p50", 0.5), ("p99", 0.99)):
+            acc, out[name] = 0, 0.0
+            for i, c in enumerate(counts):
+                acc += c
+                if count and acc >= q * count:
+                    out[name] = BUCKETS[i] if i < len(BUCKETS) else float("inf")
+                    break
+        return out
+
+
+class TimedLock:
+    __slots__ = ("_lock", "wait")
+
+    def __init__(self, wait):
+        self._lock = threading.Lock()
+        self.wait = wait  # Histogram of contended acquire times
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True  # uncontended: no clock reads
+        if not blocking:
+            return False
+        t0 = time.perf_counter()
+        got = self._lock.acquire(True, timeout)
+        waited = time.perf_counter() - t0
+        self.wait.observe(waited)
+        trace = current()
+        if trace is not None:
+            trace.add("lock", waited)  # a sampled request (see profiler.py)
+        return got
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.requests = {}  # action -> Histogram of handling time
+        self.failures = {}  # action -> Counter of requests that raised
+        self.lock_waits = {}  # lock name -> Histogram
+        self.broadcasts = Histogram()  # time to encode and queue one broadcast
+        self.fanout = 0  # frames queued by broadcasts (under broadcasts.lock)
+        self.errors = {}  # where -> Counter of swallowed exceptions
+        self.recent_errors = deque(maxlen=RECENT_ERRORS)  # (time, where, message)
+        self.lock = threading.Lock()  # the label tables above
+        self.started = time.time()
+
+    def _label(self, table, key, factory):
+        item = table.get(key)
+        if item is None:
+            with self.lock:
+                if key not in table and len(table) >= MAX_LABELS:
+                    key = "other"
+                item = table.setdefault(key, factory())
+        return item
+
+    def lock_for(self, name):
+        # a lock whose contended waits are timed under name
+        if not self.enabled:
+            return threading.Lock()
+        return TimedLock(self._label(self.lock_waits, name, Histogram))
+
+    def request(self, action, seconds, failed=False):
+        if self.enabled:
+            action = action if isinstance(action, str) else "invalid"
+            self._label(self.requests, action, Histogram).observe(seconds)
+            if failed:
+                self._label(self.failures, action, Counter).inc()
+
+    def broadcast(self, seconds, frames):
+        if self.enabled:
+            # one lock for both numbers: this runs on every move
+            h = self.broadcasts
+            i = bisect_left(BUCKETS, seconds)
+            with h.lock:
+                h.counts[i] += 1
+                h.count += 1
+                h.sum += seconds
+                self.fanout += frames
+
+    def error(self, where, exc):
+        # an exception the server caught and carried on from
+        if self.enabled:
+            self._label(self.errors, where, Counter).inc()
+            self.recent_errors.append((time.time(), where, f"{type(exc).__name__}: {exc}"))
+
+    def snapshot(self, gauges=()):
+        # everything as plain numbers: {"uptime", "requests", "lock_wait", "broadcast", "errors", ...gauges}
+        out = {"uptime": time.time() - self.started, "enabled": self.enabled}
+        out["requests"] = {a: dict(h.summary(), failed=self.failures[a].value if a in self.failures else 0)
+                           for a, h in list(self.requests.items())}
+        out["lock_wait"] = {name: h.summary() for name, h in list(self.lock_waits.items())}
+        out["broadcast"] = dict(self.broadcasts.summary(), frames=self.fanout)
+        out["errors"] = {where: c.value for where, c in list(self.errors.items())}
+        out["recent_errors"] = [list(e) for e in list(self.recent_errors)]
+        for name, _, _, value in gauges:
+            out[name] = value
+        return out
+
+    def render(self, gauges=()):
+        # Prometheus text exposition; gauges: [(name, "gauge"|"counter", help, value)]
+        lines = []
+
+        def histogram(name, doc, label, table):
+            lines.append(f"# HELP dominoes_{name} {doc}")
+            lines.append(f"# TYPE dominoes_{name} histogram")
+            for key, h in table:
+                counts, count, total = h.snapshot()
+                labels = f'{label}="{_label_value(key)}",' if label else ""
+                acc = 0
+                for bound, c in zip(BUCKETS, counts):
+                    acc += c
+                    lines.append(f'dominoes_{name}_bucket{{{labels}le="{bound:g}"}} {acc}')
+                lines.append(f'dominoes_{name}_bucket{{{labels}le="+Inf"}} {count}')
+                labels = "{" + labels.rstrip(",") + "}" if labels else ""
+                lines.append(f"dominoes_{name}_sum{labels} {total}")
+                lines.append(f"dominoes_{name}_count{labels} {count}")
+
+        def counters(name, doc, label, table):
+            lines.append(f"# HELP dominoes_{name} {doc}")
+            lines.append(f"# TYPE dominoes_{name} counter")
+            for key, c in table:
+                lines.append(f'dominoes_{name}{{{label}="{_label_value(key)}"}} {c.value}')
+
+        histogram("request_seconds", "Time to handle one request, by action.", "action", sorted(self.requests.items()))
+        counters("request_failures_total", "Requests whose handler raised, by action.", "action", sorted(self.failures.items()))
+        histogram("lock_wait_seconds", "Time spent waiting for a contended lock.", "lock", sorted(self.lock_waits.items()))
+        histogram("broadcast_seconds", "Time to encode and queue one lobby broadcast.", None, [(None, self.broadcasts)])
+        lines.append("# HELP dominoes_broadcast_frames_total Frames queued by lobby broadcasts.")
+        lines.append("# TYPE dominoes_broadcast_frames_total counter")
+        lines.append(f"dominoes_broadcast_frames_total {self.fanout}")
+        counters("errors_total", "Exceptions caught and swallowed, by where.", "where", sorted(self.errors.items()))
+        for name, kind, doc, value in gauges:
+            lines.append(f"# HELP dominoes_{name} {doc}")
+            lines.append(f"# TYPE dominoes_{name} {kind}")
+            lines.append(f"dominoes_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHTTP:
+    # /metrics for a Prometheus scraper; render is called per scrape
+    def __init__(self, render, host, port):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,152 @@
+"""
+Sampled per-phase request timings and the slow-request log
+- off unless enabled; configure() changes the settings at runtime (the "profile" admin action),
+  except the slow log's file name, which is fixed at startup: at runtime it can only be paused
+- a sampled request carries a Trace in a thread-local while it is handled; the hooks on the hot
+  path add their time to it and cost one check when nothing is being traced:
+  decode  - codec.decode of the request frame (in the engines)
+  lock    - waiting for a contended lobby or server lock (metrics.TimedLock; needs metrics on)
+  encode  - pack_message for replies and broadcasts
+  send    - queueing frames on connections (the socket write itself is on the writer)
+  logic   - the rest of the handler: game rules, lookups, bookkeeping
+- while enabled, every request slower than slow_ms, sampled or not, is logged as one JSON line
+  {"ts", "action", "user", "lobby_id", "ms", "queue", "phases" (sampled requests only)}; a
+  background thread does the file writes, the last few entries are also kept in memory
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from queue import SimpleQueue
+
+PHASES = ("decode", "lock", "logic", "encode", "send")
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_SLOW_MS = 100.0
+RECENT_SLOW = 50
+
+_local = threading.local()
+_sampling = set()  # Profilers sampling now: only while there is one do the hooks look at the thread-local
+_sampling_lock = threading.Lock()
+
+
+def current():
+    # the Trace of the request this thread is handling, if it was sampled
+    return getattr(_local, "trace", None) if _sampling else None
+
+
+class Trace:
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+
+class Profiler:
+    def __init__(self, enabled=False, sample_rate=DEFAULT_SAMPLE_RATE, slow_ms=DEFAULT_SLOW_MS, path=None):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_ms = slow_ms
+        self.path = path  # slow log file, if any
+        self.logging = False
+        self.file = None
+        self.recent = deque(maxlen=RECENT_SLOW)  # slow entries, newest last
+        self.totals = dict.fromkeys(PHASES, 0.0)  # seconds per phase over all sampled requests
+        self.sampled = 0
+        self.slow = 0
+        self.lock = threading.Lock()  # totals and counts
+        self.out = SimpleQueue()  # slow log entries (or ("open", path)) for the writer thread
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+        self.configure(enabled, sample_rate, slow_ms, bool(path))
+
+    def configure(self, enabled=None, sample_rate=None, slow_ms=None, log=None):
+        # change settings on the fly; None keeps the current value. log: write slow entries to the file.
+        # Bad values raise before anything changes; only this profiler's own sampling is switched
+        if sample_rate is not None:
+            sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_ms is not None:
+            slow_ms = max(float(slow_ms), 0.0)
+        try:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if slow_ms is not None:
+                self.slow_ms = slow_ms
+            if log is not None and self.path and bool(log) != self.logging:
+                self.logging = bool(log)
+                self.out.put(("open", self.path if self.logging else None))
+            if enabled is not None:
+                self.enabled = bool(enabled)
+        finally:
+            with _sampling_lock:
+                if self.enabled and self.sample_rate > 0:
+                    _sampling.add(self)
+                else:
+                    _sampling.discard(self)
+
+    def sample(self):
+        # called per request by the engines: a Trace if this one is sampled, else None
+        sampled = self.enabled and self.sample_rate and random.random() < self.sample_rate
+        trace = _local.trace = Trace() if sampled else None
+        return trace
+
+    def finish(self, action, username, req, seconds, conn):
+        # called by handle_request once the request is handled (only while enabled)
+        trace = getattr(_local, "trace", None)
+        entry_ms = seconds * 1000
+        if trace is not None:
+            _local.trace = None
+            p = trace.phases
+            p["logic"] = max(seconds - p["lock"] - p["encode"] - p["send"], 0.0)
+            entry_ms += p["decode"] * 1000
+            with self.lock:
+                self.sampled += 1
+                for k, v in p.items():
+                    self.totals[k] += v
+        if entry_ms < self.slow_ms:
+            return
+        entry = {"ts": round(time.time(), 3), "action": action if isinstance(action, str) else None, "user": username,
+                 "lobby_id": req.get("lobby_id"), "ms": round(entry_ms, 3), "queue": conn.depth()}
+        if trace is not None:
+            entry["phases"] = {k: round(v * 1000, 3) for k, v in trace.phases.items()}
+        with self.lock:
+            self.slow += 1
+        self.recent.append(entry)
+        if self.logging:
+            self.out.put(entry)
+
+    def status(self, recent=10):
+        with self.lock:
+            sampled, slow, totals = self.sampled, self.slow, dict(self.totals)
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "slow_ms": self.slow_ms,
+                "slow_log": self.path if self.logging else None, "sampled": sampled, "slow": slow,
+                "avg_ms": {k: round(v * 1000 / sampled, 4) if sampled else 0.0 for k, v in totals.items()},
+                "recent_slow": list(self.recent)[-recent:]}
+
+    def _writer(self):
+        while True:
+            item = self.out.get()
+            if item is None:
+                break
+            try:
+                if isinstance(item, tuple):
+                    if self.file:
+                        self.file.close()
+                    self.file = open(item[1], "a", encoding="utf-8") if item[1] else None
+                elif self.file:
+                    self.file.write(json.dumps(item, separators=(",", ":"), default=str) + "\n")
+                    if self.out.empty():
+                        self.file.flush()
+            except OSError as e:
+                print("slow log write failed:", e)
+        if self.file:
+            self.file.close()
+
+    def close(self):
+        self.configure(enabled=False)
+        self.out.put(None)
+        self.thread.join()
@@ -0,0 +1,82 @@
+"""
+Dominoes wire protocol
+- every message travels as a frame: 4-byte big-endian body length + body
+- FrameDecoder buffers partial reads and returns every complete frame in a chunk,
+  so merged, split and pipelined messages all decode
+- max_frame caps the size a peer may announce, so one client can't make us buffer without bound
+- frame bodies are produced by a codec (see codec.py)
+- clients from before framing send bare pickle and read bare pickle back; unframed() spots them
+  so a server can answer in kind with UNFRAMED_ERROR instead of a silent disconnect
+- Client/protocol.py is a copy of this file; keep the two identical
+"""
+
+import struct
+
+HEADER = struct.Struct("!I")
+DEFAULT_MAX_FRAME = 1 << 20  # 1 MiB
+RECV_SIZE = 65536
+
+
+UNFRAMED_ERROR = "This server needs a newer client: please update"
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+def unframed(data, max_frame=DEFAULT_MAX_FRAME):
+    # a connection's first bytes are bare pickle: 0x80 would announce a frame of over 2 GiB,
+    # which no length within max_frame can
+    return data[:1] == b"\x80" and max_frame < 1 << 31
+
+
+def encode_frame(body):
+    return HEADER.pack(len(body)) + body
+
+
+class FrameDecoder:
+    def __init__(self, max_frame=DEFAULT_MAX_FRAME):
+        self.max_frame = max_frame
+        self.buf = bytearray()
+
+    def feed(self, data):
+        # append a chunk and return the list of complete frame bodies it finished
+        buf = self.buf
+        buf += data
+        frames = []
+        pos = 0
+        end_of_data = len(buf)
+        while end_of_data - pos >= HEADER.size:
+            (size,) = HEADER.unpack_from(buf, pos)
+            if size > self.max_frame:
+                raise FrameTooLarge(f"frame of {size} bytes exceeds limit of {self.max_frame}")
+            end = pos + HEADER.size + size
+            if end > end_of_data:
+                break
+            frames.append(bytes(buf[pos + HEADER.size:end]))
+            pos = end
+        if pos:
+            del buf[:pos]
+        return frames
+
+    def pending(self):
+        # bytes buffered towards the next (incomplete) frame
+        return len(self.buf)
+
+
+def recv_frames(sock, decoder, recv_size=RECV_SIZE):
+    # blocking generator over complete frames read from a socket; ends on EOF
+    while True:
+        data = sock.recv(recv_size)
+        if not data:
+            return
+        for frame in decoder.feed(data):
+            yield frame
+
+
+def pack_message(payload, codec):
+    return encode_frame(codec.encode(payload))
+
+
+def send_message(sock, payload, codec):
+    sock.sendall(pack_message(payload, codec))
@@ -0,0 +1,148 @@
+"""
+Lobby registry and player stats with fine-grained locking
+- LobbyRegistry splits lobbies into shards by lobby id, each with its own lock; lookups are
+  plain dict reads and take no lock at all
+- a conn -> lobby ids reverse index makes disconnect cleanup touch only the lobbies the
+  player actually sat in
+- StatsTable stripes player stats over many locks keyed by username
+- id_start/id_step let several worker processes share one id space: worker k of N hands out
+  k+1, k+1+N, k+1+2N, ... (see supervisor.py)
+"""
+
+import threading
+
+DEFAULT_SHARDS = 16
+DEFAULT_STRIPES = 64
+
+
+class LobbyRegistry:
+    def __init__(self, max_lobbies, shards=DEFAULT_SHARDS, id_start=1, id_step=1):
+        self.max_lobbies = max_lobbies
+        self.shards = [{} for _ in range(shards)]
+        self.shard_locks = [threading.Lock() for _ in range(shards)]
+        self.count = 0
+        self.next_id = id_start
+        self.id_step = id_step
+        self.id_lock = threading.Lock()  # lobby count and id allocation only
+        self.seats = {}  # conn -> set of lobby ids
+        self.seats_lock = threading.Lock()
+
+    def _shard(self, lid):
+        return hash(lid) % len(self.shards)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, lid):
+        return self.shards[self._shard(lid)].get(lid)
+
+    def reserve_id(self):
+        # next lobby id, or None when the server is at max_lobbies
+        with self.id_lock:
+            if self.count >= self.max_lobbies:
+                return None
+            lid = self.next_id
+            self.next_id += self.id_step
+            self.count += 1
+            return lid
+
+    def add(self, lobby):
+        i = self._shard(lobby.lobby_id)
+        with self.shard_locks[i]:
+            self.shards[i][lobby.lobby_id] = lobby
+
+    def restore(self, lobby):
+        # a lobby recovered at startup keeps its id; new ids continue after it
+        with self.id_lock:
+            self.count += 1
+            self.next_id = max(self.next_id, lobby.lobby_id + self.id_step)
+        self.add(lobby)
+
+    def remove_if_empty(self, lid):
+        i = self._shard(lid)
+        with self.shard_locks[i]:
+            lobby = self.shards[i].get(lid)
+            if not lobby or not lobby.empty():
+                return False
+            del self.shards[i][lid]
+        with self.id_lock:
+            self.count -= 1
+        return True
+
+    def values(self):
+        # point-in-time list of every lobby (each shard copied under its own lock)
+        out = []
+        for shard, lock in zip(self.shards, self.shard_locks):
+            with lock:
+                out.extend(shard.values())
+        return out
+
+    # --- conn -> lobby reverse index ---
+
+    def seat(self, conn, lid):
+        with self.seats_lock:
+            self.seats.setdefault(conn, set()).add(lid)
+
+    def unseat(self, conn, lid):
+        with self.seats_lock:
+            lids = self.seats.get(conn)
+            if lids:
+                lids.discard(lid)
+                if not lids:
+                    del self.seats[conn]
+
+    def seated(self, conn):
+        with self.seats_lock:
+            return set(self.seats.get(conn, ()))
+
+    def unseat_all(self, conn):
+        with self.seats_lock:
+            return self.seats.pop(conn, set())
+
+
+class StatsTable:
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        self.stripes = [{} for _ in range(stripes)]
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def _stripe(self, username):
+        return hash(username) % len(self.stripes)
+
+    def ref(self, username):
+        # the live stats dict for a player, created on first sight
+        i = self._stripe(username)
+        with self.locks[i]:
+            return self.stripes[i].setdefault(username, {"wins":0,"games":0})
+
+    def get(self, username, default=None):
+        return self.stripes[self._stripe(username)].get(username, default)
+
+    def record_game(self, winner, players):
+        # one finished game: every player gets a game, the winner a win
+        for u in players:
+            i = self._stripe(u)
+            with self.locks[i]:
+                s = self.stripes[i].setdefault(u, {"wins":0,"games":0})
+                s["games"] += 1
+                if u == winner:
+                    s["wins"] += 1
+
+    def load(self, totals):
+        # bulk fill at startup from a stats store: {username: (wins, games)}
+        n = len(self.stripes)
+        parts = [{} for _ in range(n)]
+        for u, (w, g) in totals.items():
+            parts[hash(u) % n][u] = {"wins": w, "games": g}
+        for stripe, part, lock in zip(self.stripes, parts, self.locks):
+            with lock:
+                stripe.update(part)
+
+    def __len__(self):
+        return sum(len(s) for s in self.stripes)
+
+    def items(self):
+        out = []
+        for stripe, lock in zip(self.stripes, self.locks):
+            with lock:
+                out.extend((u, dict(s)) for u, s in stripe.items())
+        return out
@@ -0,0 +1,509 @@
+"""
+Game replays
+- every finished game is archived as one compact binary record: the seed its deal came from,
+  the deal itself (a hand bitmask per seat), the seats and the result, then a move stream of one
+  byte per move (two when the set's tiles don't fit a byte's codes: double-15, or >16 seats)
+- move codes: 0 a pass, 1 + 2 * tile id + (1 on the left end) a tile, LEAVE + seat a player
+  leaving mid-game; whose turn it was follows from the seats, so it is not stored
+- GameRecord collects a running game's moves (Lobby.record); it is journaled with the lobby,
+  so a game recovered after a restart is still archived when it ends
+- ReplayArchive is one append-only file, memory-mapped: records are copied into the map behind a
+  header holding the committed length, and the file grows GROW bytes at a time. On open the
+  records are walked once to rebuild the index by lobby, player and end time; a torn tail
+  (crash mid-append) is dropped there
+- game ids are numbered like lobby ids, id_start + n * id_step, so each worker process of a
+  supervised server has its own archive and the owner of a game id is arithmetic
+- rerun() plays a record back on engine.GameState and gives the update events its players saw;
+  check() re-runs one on bare bitmasks (no Hand/Chain objects) and says whether it is a legal game
+  that ends where and how the record says; verify() checks a whole archive on a process pool,
+  each worker mapping the file itself
+
+usage: python Server/replays.py verify ARCHIVE [--workers N] [--no-seed]
+       python Server/replays.py list ARCHIVE [--player NAME] [--lobby ID] [--limit N]
+       python Server/replays.py show ARCHIVE GAME
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from multiprocessing import Pool
+
+from dominoes import Hand, deal, tile_set
+from engine import GameState
+
+MAGIC = b"DZRP"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHQ")  # magic, version, unused, committed length
+# record: length, lobby id, ended (epoch), seed, max_pip, per_hand, seats, winner seat, flags, moves
+RECORD = struct.Struct("<IIdQBBBBBH")
+BLOCKED, WIDE = 1, 2  # flags: the game ended blocked, moves take two bytes
+PASS = 0
+LEAVE = {1: 0xF0, 2: 0xFF00}  # + seat index, by move width
+MAX_SEATS = 255
+MAX_MOVES = 0xFFFF
+GROW = 1 << 20  # bytes the archive file grows by
+VERIFY_CHUNK = 20000  # records per verify task
+
+
+def move_width(max_pip, seats):
+    # bytes per move code for a game on this set with this many seats
+    tiles = len(tile_set(max_pip).tiles)
+    return 1 if 2 * tiles + 1 < LEAVE[1] and seats <= 16 else 2
+
+
+def recordable(names):
+    # whether a game with these seats fits a record (a seat byte, one hand per distinct name)
+    return 0 < len(names) <= MAX_SEATS and len(set(names)) == len(names)
+
+
+class GameRecord:
+    # one running game's record, kept by its lobby until the game ends
+    __slots__ = ("lobby_id", "seed", "max_pip", "per_hand", "names", "deal", "width", "moves", "ids")
+
+    def __init__(self, lobby_id, seed, max_pip, per_hand, names, masks, moves=b""):
+        self.lobby_id = lobby_id
+        self.seed = seed  # the deal is deal(tile_set(max_pip), seats, per_hand, Random(seed).random)
+        self.max_pip = max_pip
+        self.per_hand = per_hand
+        self.names = [str(u) for u in names]  # seats at the deal
+        self.deal = list(masks)  # hand masks at the deal, by seat
+        self.width = move_width(max_pip, len(self.names))
+        self.moves = bytearray(moves)
+        self.ids = tile_set(max_pip).ids
+
+    def _code(self, code):
+        if self.width == 1:
+            self.moves.append(code)
+        else:
+            self.moves += code.to_bytes(2, "little")
+
+    def event(self, event):
+        # one broadcast move/pass event (see Lobby.broadcast_event)
+        if "passed_by" in event:
+            self._code(PASS)
+        else:
+            self.play(event["placed_tile"], event["side"])
+
+    def play(self, tile, side):
+        self._code(1 + 2 * self.ids[tile] + (side == "left"))
+
+    def pass_turn(self):
+        self._code(PASS)
+
+    def leave(self, seat):
+        # the player in seat (its index at the time) left the running game
+        self._code(LEAVE[self.width] + seat)
+
+    def state(self):
+        # for the journal's lobby snapshots (see Lobby.state)
+        return {"seed": self.seed, "per_hand": self.per_hand, "names": self.names, "deal": self.deal,
+                "moves": self.moves.hex()}
+
+    @classmethod
+    def from_state(cls, lobby_id, max_pip, state):
+        return cls(lobby_id, state["seed"], max_pip, state["per_hand"], state["names"], state["deal"],
+                   bytes.fromhex(state["moves"]))
+
+    def encode(self, ended, winner, blocked):
+        # the archived record; winner is a seat name
+        count = len(self.moves) // self.width
+        if count > MAX_MOVES:
+            raise ValueError("game too long to archive")
+        size = (len(tile_set(self.max_pip).tiles) + 7) // 8
+        names = [u.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8") for u in self.names]
+        body = b"".join(bytes((len(n),)) + n for n in names)
+        body += b"".join(m.to_bytes(size, "little") for m in self.deal)
+        body += self.moves
+        flags = (BLOCKED if blocked else 0) | (WIDE if self.width == 2 else 0)
+        return RECORD.pack(RECORD.size + len(body), self.lobby_id, ended, self.seed, self.max_pip, self.per_hand,
+                           len(self.names), self.names.index(str(winner)), flags, count) + body
+
+
+def _names(buf, pos, seats):
+    # (seat names, position after them)
+    names = []
+    for _ in range(seats):
+        n = buf[pos]
+        names.append(bytes(buf[pos + 1:pos + 1 + n]).decode("utf-8", "replace"))
+        pos += 1 + n
+    return names, pos
+
+
+def parse(buf, off=0):
+    # one record as a dict: lobby_id, ended, seed, max_pip, per_hand, players, winner (a name),
+    # blocked, deal (masks by seat), width, moves (the raw move bytes)
+    length, lid, ended, seed, max_pip, per_hand, seats, winner, flags, count = RECORD.unpack_from(buf, off)
+    names, pos = _names(buf, off + RECORD.size, seats)
+    size = (len(tile_set(max_pip).tiles) + 7) // 8
+    masks = [int.from_bytes(buf[pos + i * size:pos + (i + 1) * size], "little") for i in range(seats)]
+    pos += seats * size
+    width = 2 if flags & WIDE else 1
+    return {"lobby_id": lid, "ended": ended, "seed": seed, "max_pip": max_pip, "per_hand": per_hand,
+            "players": names, "winner": names[winner] if winner < seats else None, "blocked": bool(flags & BLOCKED),
+            "deal": masks, "width": width, "moves": bytes(buf[pos:pos + count * width])}
+
+
+def codes(rec):
+    # the move codes of a parsed record
+    if rec["width"] == 1:
+        return rec["moves"]
+    return struct.unpack(f"<{len(rec['moves']) // 2}H", rec["moves"])
+
+
+def rerun(rec):
+    # play a parsed record back on the game rules: ([update events], final GameState); events look
+    # like the live ones ({"seq", "placed_by", "placed_tile", "side", "hand_size", "turn"} or
+    # {"seq", "passed_by", "turn"}) plus {"left", "players"} for a seat that left.
+    # Raises engine.IllegalMove (a ValueError) if the record breaks the rules
+    ts = tile_set(rec["max_pip"])
+    game = GameState(rec["max_pip"], rec["players"])
+    game.hands = {u: Hand.from_mask(ts, m) for u, m in zip(rec["players"], rec["deal"])}
+    leave = LEAVE[rec["width"]]
+    out = []
+    for code in codes(rec):
+        if code >= leave:
+            out.append({"left": game.player_names.pop(code - leave), "players": list(game.player_names)})
+            continue
+        username = game.current_turn_username()
+        if code == PASS:
+            game.pass_turn()
+            event = {"passed_by": username}
+        else:
+            placed, side = game.play(username, ts.tiles[(code - 1) >> 1], "left" if (code - 1) & 1 else "right")
+            event = {"placed_by": username, "placed_tile": placed, "side": side, "hand_size": len(game.hands[username])}
+        game.seq += 1
+        event["seq"] = game.seq
+        event["turn"] = game.current_turn_username()
+        out.append(event)
+    return out, game
+
+
+def check(rec, seed=True):
+    # None if a parsed record is a legal game that ends with its last move, the way the record
+    # says; else what is wrong. The same rules as engine.GameState, on plain ints. seed: also
+    # check that the seed deals the recorded hands
+    ts = tile_set(rec["max_pip"])
+    hands = list(rec["deal"])
+    names = rec["players"]
+    if seed and [h.mask for h in deal(ts, len(hands), rec["per_hand"], random.Random(rec["seed"]).random)] != hands:
+        return "the deal does not come from the seed"
+    tiles, pm = ts.tiles, ts.pip_masks
+    seats = list(range(len(hands)))  # seat numbers still at the table
+    leave = LEAVE[rec["width"]]
+    held = 0  # every tile still in a hand: a tile is in one hand only, so blocked is one AND
+    for h in hands:
+        held |= h
+    dealt_empty = not all(hands)  # a hand dealt no tiles ends the game at the first move
+    turn = passes = 0
+    left = right = None
+    over = False
+    for i, code in enumerate(codes(rec)):
+        if over:
+            return f"move {i} comes after the game ended"
+        if code >= leave:
+            if code - leave >= len(seats) or len(seats) == 1:
+                return f"move {i}: no seat {code - leave} to leave"
+            seats.pop(code - leave)
+            continue  # not a turn, and the server doesn't look for the end here either
+        seat = seats[turn % len(seats)]
+        turn = (turn + 1) % len(seats)
+        if code == PASS:
+            passes += 1
+            over = dealt_empty or passes >= len(seats) or (left is not None and not held & (pm[left] | pm[right]))
+            continue
+        tid = (code - 1) >> 1
+        bit = 1 << tid
+        if tid >= len(tiles) or not hands[seat] & bit:
+            return f"move {i}: {names[seat]} does not hold tile {tid}"
+        a, b = tiles[tid]
+        if left is None:
+            if (code - 1) & 1:
+                return f"move {i}: the first tile goes on the right"
+            left, right = a, b
+        elif (code - 1) & 1:
+            if b == left:
+                left = a
+            elif a == left:
+                left = b
+            else:
+                return f"move {i}: {tiles[tid]} does not fit the left end"
+        elif a == right:
+            right = b
+        elif b == right:
+            right = a
+        else:
+            return f"move {i}: {tiles[tid]} does not fit the right end"
+        hands[seat] ^= bit
+        held ^= bit
+        passes = 0
+        over = dealt_empty or not hands[seat] or not held & (pm[left] | pm[right])
+    if not over:
+        return "the game does not end"
+    empty = [s for s, h in enumerate(hands) if not h]
+    if empty:
+        winner, blocked = names[empty[0]], False
+    else:
+        pips = ts.pips
+        sums = [sum(pips[t] for t in range(len(tiles)) if h >> t & 1) for h in hands]
+        winner, blocked = names[sums.index(min(sums))], True
+    if (winner, blocked) != (rec["winner"], rec["blocked"]):
+        return f"recorded winner {rec['winner']} (blocked {rec['blocked']}), the moves give {winner} (blocked {blocked})"
+    return None
+
+
+class ReplayArchive:
+    def __init__(self, path, id_start=1, id_step=1):
+        self.path = path
+        self.id_start = id_start
+        self.id_step = id_step
+        self.lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) < FILE_HEADER.size
+        self.file = open(path, "w+b" if new else "r+b")
+        if new:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, FILE_HEADER.size))
+            self.file.truncate(GROW)
+            self.file.flush()
+        self.mm = mmap.mmap(self.file.fileno(), os.fstat(self.file.fileno()).st_size)
+        magic, version, _, end = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            self.file.close()
+            raise ValueError(f"{path} is not a replay archive")
+        self.offsets = []  # n -> record offset, for game id id_start + n * id_step
+        self.ended = []  # n -> end time, never decreasing (so a time range is two bisects)
+        self.by_lobby = {}  # lobby id -> [n]
+        self.by_player = {}  # username -> [n]
+        self.end = FILE_HEADER.size
+        t0 = time.perf_counter()
+        for off in walk(self.mm, min(end, len(self.mm))):
+            self._index(off)
+        if self.end != end:
+            FILE_HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, self.end)  # drop a torn tail
+        self.load_time = time.perf_counter() - t0
+
+    def _index(self, off):
+        length, lid, ended, _, _, _, seats = RECORD.unpack_from(self.mm, off)[:7]
+        names, _ = _names(self.mm, off + RECORD.size, seats)
+        n = len(self.offsets)
+        self.offsets.append(off)
+        self.ended.append(max(ended, self.ended[-1]) if self.ended else ended)
+        self.by_lobby.setdefault(lid, []).append(n)
+        for u in names:
+            self.by_player.setdefault(u, []).append(n)
+        self.end = off + length
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, record, winner, blocked, ended=None):
+        # archive a finished game (GameRecord); returns its game id
+        data = record.encode(time.time() if ended is None else ended, winner, blocked)
+        with self.lock:
+            if self.end + len(data) > len(self.mm):
+                self._grow(self.end + len(data))
+            off = self.end
+            self.mm[off:off + len(data)] = data
+            FILE_HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, off + len(data))  # commit
+            self._index(off)
+            return self.id_start + (len(self.offsets) - 1) * self.id_step
+
+    def _grow(self, need):
+        # remap rather than mmap.resize(), which not every platform has (caller holds self.lock)
+        size = len(self.mm)
+        while size < need:
+            size += GROW
+        self.mm.close()
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+
+    def _n(self, game):
+        if not isinstance(game, int) or isinstance(game, bool):
+            return None
+        n, rem = divmod(game - self.id_start, self.id_step)
+        return n if rem == 0 and 0 <= n < len(self.offsets) else None
+
+    def _raw(self, n):
+        # a copy of record n's bytes (caller holds self.lock)
+        off = self.offsets[n]
+        return self.mm[off:off + RECORD.unpack_from(self.mm, off)[0]]
+
+    def get(self, game):
+        # the parsed record of a game id, None if there is no such game here
+        with self.lock:
+            n = self._n(game)
+            raw = self._raw(n) if n is not None else None
+        if raw is None:
+            return None
+        rec = parse(raw)
+        rec["game"] = game
+        return rec
+
+    def games(self, player=None, lobby_id=None, since=None, until=None, limit=50):
+        # summaries of matching games, newest first: {"game", "lobby_id", "ended", "players",
+        # "winner", "blocked", "moves"}
+        with self.lock:
+            lo = bisect.bisect_left(self.ended, since) if since is not None else 0
+            hi = bisect.bisect_right(self.ended, until) if until is not None else len(self.ended)
+            if player is not None:
+                ns = self.by_player.get(player, ())
+            elif lobby_id is not None:
+                ns = self.by_lobby.get(lobby_id, ())
+            else:
+                ns = range(lo, hi)
+            out = []
+            for n in reversed(ns):
+                if len(out) >= limit or n < lo:
+                    break
+                if n >= hi:
+                    continue
+                off = self.offsets[n]
+                _, lid, ended, _, _, _, seats, winner, flags, count = RECORD.unpack_from(self.mm, off)
+                if lobby_id is not None and lid != lobby_id:
+                    continue
+                names, _ = _names(self.mm, off + RECORD.size, seats)
+                out.append({"game": self.id_start + n * self.id_step, "lobby_id": lid, "ended": ended,
+                            "players": names, "winner": names[winner] if winner < seats else None,
+                            "blocked": bool(flags & BLOCKED), "moves": count})
+        return out
+
+    def size(self):
+        return self.end
+
+    def flush(self):
+        with self.lock:
+            self.mm.flush()
+
+    def close(self):
+        with self.lock:
+            self.mm.flush()
+            self.mm.close()
+            self.file.truncate(self.end)  # give back the unused tail of the last GROW step
+            self.file.close()
+
+
+def walk(buf, end, off=FILE_HEADER.size):
+    # offsets of the whole records in buf[off:end]
+    while off + RECORD.size <= end:
+        length = RECORD.unpack_from(buf, off)[0]
+        if length < RECORD.size or off + length > end:
+            break  # torn or never committed
+        yield off
+        off += length
+
+
+_mapped = {}  # path -> mmap, per verify worker process
+
+
+def _verify_chunk(task):
+    # (records checked, [(n, what is wrong)]) for records [first, ...) at offsets [start, stop)
+    path, first, start, stop, seed = task
+    mm = _mapped.get(path)
+    if mm is None:
+        with open(path, "rb") as f:
+            mm = _mapped[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    count, bad = 0, []
+    for off in walk(mm, stop, start):
+        try:
+            problem = check(parse(mm, off), seed)
+        except (ValueError, IndexError, KeyError, struct.error) as e:
+            problem = f"unreadable: {e}"
+        if problem:
+            bad.append((first + count, problem))
+        count += 1
+    return count, bad
+
+
+def verify(path, workers=None, seed=True, chunk=VERIFY_CHUNK):
+    # check every record of an archive file: (games, [(n, what is wrong)], seconds)
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        end = min(FILE_HEADER.unpack_from(mm, 0)[3], len(mm))
+        tasks, first, start, n = [], 0, FILE_HEADER.size, 0
+        for off in walk(mm, end):
+            if n == chunk:
+                tasks.append((path, first, start, off, seed))
+                first, start, n = first + n, off, 0
+            n += 1
+        if n:
+            tasks.append((path, first, start, end, seed))
+    finally:
+        mm.close()
+    workers = workers or os.cpu_count() or 1
+    pool = Pool(workers) if workers > 1 and len(tasks) > 1 else None
+    games, bad = 0, []
+    try:
+        for count, problems in (pool.imap_unordered(_verify_chunk, tasks) if pool else map(_verify_chunk, tasks)):
+            games += count
+            bad += problems
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return games, sorted(bad), time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check, list and show archived games")
+    sub = ap.add_subparsers(dest="command", required=True)
+    v = sub.add_parser("verify", help="re-run every game of an archive and report the ones that don't add up")
+    v.add_argument("archive")
+    v.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    v.add_argument("--no-seed", action="store_true", help="don't re-deal from the seeds")
+    ls = sub.add_parser("list", help="newest games first")
+    ls.add_argument("archive")
+    ls.add_argument("--player")
+    ls.add_argument("--lobby", type=int)
+    ls.add_argument("--limit", type=int, default=20)
+    sh = sub.add_parser("show", help="one game, move by move (game ids of a worker's archive: see --id-start/--id-step)")
+    sh.add_argument("archive")
+    sh.add_argument("game", type=int)
+    for p in (ls, sh):
+        p.add_argument("--id-start", type=int, default=1)
+        p.add_argument("--id-step", type=int, default=1)
+    args = ap.parse_args()
+    if args.command == "verify":
+        games, bad, took = verify(args.archive, args.workers, not args.no_seed)
+        print(f"{games} games checked in {took:.2f}s ({games / took * 60 / 1e6:.2f}M games/min, {args.workers} worker(s))")
+        for n, problem in bad[:20]:
+            print(f"  record {n}: {problem}")
+        print(f"{len(bad)} bad" if bad else "all good")
+        return
+    archive = ReplayArchive(args.archive, args.id_start, args.id_step)
+    try:
+        if args.command == "list":
+            for g in archive.games(args.player, args.lobby, limit=args.limit):
+                when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(g["ended"]))
+                print(f"game {g['game']:>8}  lobby {g['lobby_id']:<5} {when}  {g['moves']:>3} moves  "
+                      f"winner {g['winner']}{' (blocked)' if g['blocked'] else ''}  {', '.join(g['players'])}")
+            return
+        rec = archive.get(args.game)
+        if rec is None:
+            print("no such game")
+            return
+        ts = tile_set(rec["max_pip"])
+        print(f"game {args.game}, lobby {rec['lobby_id']}, double-{rec['max_pip']}, seed {rec['seed']}")
+        for u, m in zip(rec["players"], rec["deal"]):
+            print(f"  {u}: {' '.join(f'[{a}|{b}]' for a, b in ts.tiles_in(m))}")
+        events, game = rerun(rec)
+        for e in events:
+            if "left" in e:
+                print(f"  {e['left']} left")
+            elif "passed_by" in e:
+                print(f"{e['seq']:>4} {e['passed_by']} passed")
+            else:
+                a, b = e["placed_tile"]
+                print(f"{e['seq']:>4} {e['placed_by']} [{a}|{b}] {e['side']}")
+        print("result:", game.result())
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
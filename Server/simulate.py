@@ -0,0 +1,118 @@
+"""
+Self-play simulator
+- plays whole games on engine.GameState (the same rules the server runs) with bot strategies
+  in every seat, across a multiprocessing pool
+- deterministic: game i of a run is seeded from (seed, difficulty, i), so a run gives the same
+  results whatever the worker count (hard bots excepted: they stop on a clock)
+- reports games/s, win rate by seat and by strategy, how often games end blocked and the average
+  game length, per difficulty (deal size); --per-hand overrides the deal size to tune it
+
+usage: python Server/simulate.py [--games 100000] [--workers N] [--players 4]
+       [--difficulty easy,normal,hard] [--per-hand N] [--max-pip 6] [--strategies easy,normal] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from bots import STRATEGIES, View
+from engine import DEAL_SIZES, GameState
+
+CHUNK = 2000  # games per pool task
+HARD_BUDGET = 0.01  # per-move budget for hard bots in simulation
+
+
+def play_game(players, per_hand, max_pip, strategies, rnd):
+    # one game; returns (winning seat, blocked, moves)
+    names = [f"seat{i}" for i in range(players)]
+    game = GameState(max_pip, names)
+    game.start(per_hand, rnd.random)
+    moves = 0
+    while True:
+        seat = game.turn_index
+        view = View(game, names[seat])
+        move = STRATEGIES[strategies[seat]](view, HARD_BUDGET, rnd)
+        if move is None:
+            game.pass_turn()
+        else:
+            tid, side = move
+            game.play(names[seat], view.ts.tiles[tid], side)
+        moves += 1
+        outcome = game.result()
+        if outcome:
+            return names.index(outcome["winner"]), bool(outcome.get("blocked")), moves
+
+
+def run_chunk(task):
+    # games [start, start+count) of one configuration; returns summed counters
+    seed, difficulty, start, count, players, per_hand, max_pip, strategies = task
+    wins = [0] * players
+    blocked = moves = 0
+    for i in range(start, start + count):
+        rnd = random.Random(f"{seed}/{difficulty}/{i}")
+        seat, was_blocked, n = play_game(players, per_hand, max_pip, strategies, rnd)
+        wins[seat] += 1
+        blocked += was_blocked
+        moves += n
+    return wins, blocked, moves
+
+
+def simulate(games, players, difficulty, per_hand, max_pip, strategies, seed, pool):
+    tasks = [(seed, difficulty, start, min(CHUNK, games - start), players, per_hand, max_pip, strategies)
+             for start in range(0, games, CHUNK)]
+    wins = [0] * players
+    blocked = moves = 0
+    results = pool.imap_unordered(run_chunk, tasks) if pool else map(run_chunk, tasks)
+    for w, b, m in results:
+        wins = [x + y for x, y in zip(wins, w)]
+        blocked += b
+        moves += m
+    return wins, blocked, moves
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Self-play simulation on the server's game rules")
+    ap.add_argument("--games", type=int, default=100000, help="games per difficulty")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--difficulty", default="easy,normal,hard", help="deal sizes to run, by lobby difficulty")
+    ap.add_argument("--per-hand", type=int, help="tiles per hand, instead of the difficulty's deal size")
+    ap.add_argument("--max-pip", type=int, default=6)
+    ap.add_argument("--strategies", default="easy", help="bot strategy per seat, repeated to fill the table")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    names = args.strategies.split(",")
+    strategies = [names[i % len(names)] for i in range(args.players)]
+    for s in strategies:
+        if s not in STRATEGIES:
+            ap.error(f"unknown strategy {s!r}")
+    print(f"{args.players} players, double-{args.max_pip}, seats {strategies}, {args.workers} worker(s), seed {args.seed}")
+    pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        for difficulty in args.difficulty.split(","):
+            per_hand = args.per_hand or DEAL_SIZES[difficulty]
+            t0 = time.perf_counter()
+            wins, blocked, moves = simulate(args.games, args.players, difficulty, per_hand, args.max_pip,
+                                            strategies, args.seed, pool)
+            took = time.perf_counter() - t0
+            print(f"\n{difficulty}: {per_hand} tiles per hand, {args.games} games in {took:.1f}s "
+                  f"({args.games / took:.0f} games/s)")
+            print(f"  blocked {blocked / args.games:.1%}, {moves / args.games:.1f} moves per game")
+            print("  win rate by seat: " + " ".join(f"{w / args.games:.3f}" for w in wins))
+            if len(set(strategies)) > 1:
+                by_strategy = {}
+                for s, w in zip(strategies, wins):
+                    n, total = by_strategy.get(s, (0, 0))
+                    by_strategy[s] = (n + 1, total + w)
+                print("  win rate per seat by strategy: " + " ".join(
+                    f"{s}={total / n / args.games:.3f}" for s, (n, total) in by_strategy.items()))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    main()
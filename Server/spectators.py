@@ -0,0 +1,160 @@
+"""
+Spectators
+- people watching a lobby are not players: they sit in the lobby's Feed, not in Lobby.players,
+  and don't count against max_players
+- they only get what every player gets (the lobby's broadcasts: moves as deltas, hand sizes,
+  lobby updates, chat, the result) plus a public snapshot when they start watching; never a hand
+- Lobby.broadcast hands the feed the frames it already encoded for the seated players (encoding
+  only for a codec no player uses); under the lobby lock that costs one push onto the hub's
+  queue whatever the number of spectators
+- one fan-out thread (Hub) queues each frame on every spectator's connection; the connections'
+  writers do the socket I/O, and a spectator that can't keep up is cut like any slow client, so
+  spectators never hold up the players' updates
+- a lobby may delay its feed: frames are held back for spectator_delay seconds, and a new
+  spectator's snapshot is held back the same, so watching can't tip off a player
+"""
+
+import heapq
+import threading
+import time
+
+from protocol import pack_message
+
+
+FLAGS = ("deltas", "chat_batches")  # connection flags a broadcast's legacy form may depend on
+
+
+class Watcher:
+    __slots__ = ("conn", "key")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.key = (conn.codec,) + tuple(getattr(conn, f) for f in FLAGS)  # which encoding of each broadcast it gets
+
+
+class Feed:
+    def __init__(self, hub, lobby_id, delay=0):
+        self.hub = hub
+        self.lobby_id = lobby_id
+        self.delay = delay  # seconds every frame is held back
+        self.members = {}  # conn -> Watcher, who is watching now
+        self.keys = {}  # (codec, *FLAGS) -> members using it
+        self.audience = []  # Watchers whose snapshot went out; only the hub's thread touches it
+        self.lock = threading.Lock()  # members and keys; never held while taking another lock
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, conn, frame, limit):
+        # conn watches from frame (its encoded snapshot) on, once it is through the delay; a conn
+        # already watching starts over from the new snapshot. False when the feed is full
+        with self.lock:
+            self._remove(conn)
+            if len(self.members) >= limit:
+                return False
+            watcher = self.members[conn] = Watcher(conn)
+            self.keys[watcher.key] = self.keys.get(watcher.key, 0) + 1
+            # pushed under the lock, so no broadcast published for this watcher can go out before its snapshot
+            self.hub.push(self, watcher, frame)
+        return True
+
+    def remove(self, conn):
+        with self.lock:
+            return self._remove(conn)
+
+    def _remove(self, conn):
+        watcher = self.members.pop(conn, None)
+        if watcher is None:
+            return False
+        self.keys[watcher.key] -= 1
+        if not self.keys[watcher.key]:
+            del self.keys[watcher.key]
+        return True
+
+    def publish(self, payload, legacy=None, frames=None, kind=None, wants="deltas"):
+        # queue one broadcast for every spectator (caller holds the lobby lock, so broadcasts keep
+        # their order). frames: {(codec name, full): frame} the seated broadcast already encoded;
+        # legacy goes to spectators without the wants flag, as in Lobby.broadcast
+        if not self.members:
+            return
+        if frames is None:
+            frames = {}
+        flag = 1 + FLAGS.index(wants)
+        with self.lock:
+            out = {}
+            for key in self.keys:
+                codec = key[0]
+                full = legacy is not None and not key[flag]
+                frame = frames.get((codec.name, full))
+                if frame is None:
+                    frame = frames[(codec.name, full)] = pack_message(legacy() if full else payload, codec)
+                out[key] = (frame, "update_full" if full else kind)
+            self.hub.push(self, None, out)
+
+
+class Hub:
+    def __init__(self, on_error=None):
+        self.heap = []  # (due, n, feed, watcher, frames), due on the monotonic clock
+        self.n = 0  # push order, which breaks ties so each feed's frames stay in order
+        self.cond = threading.Condition()
+        self.frames = 0  # frames queued on spectators' connections
+        self.on_error = on_error
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, feed, watcher, frames):
+        # watcher set: its snapshot frame; otherwise one broadcast, {key: (frame, kind)}
+        with self.cond:
+            self.n += 1
+            heapq.heappush(self.heap, (time.monotonic() + feed.delay, self.n, feed, watcher, frames))
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    wait = self.heap[0][0] - time.monotonic() if self.heap else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                if not self.running:
+                    return
+                now = time.monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap))
+            for _, _, feed, watcher, frames in due:
+                try:
+                    self._deliver(feed, watcher, frames)
+                except Exception as e:
+                    if self.on_error:
+                        self.on_error(e)
+
+    def _deliver(self, feed, watcher, frames):
+        members = feed.members
+        if watcher is not None:
+            # a new spectator: its snapshot, then every broadcast after it
+            if members.get(watcher.conn) is watcher:
+                feed.audience.append(watcher)
+                watcher.conn.sendall(frames)
+                self.frames += 1
+            return
+        keep = []
+        for w in feed.audience:
+            if members.get(w.conn) is not w or w.conn.closed:
+                continue  # stopped watching, or started over with a new snapshot
+            frame, kind = frames[w.key]
+            w.conn.sendall(frame, kind)
+            keep.append(w)
+        self.frames += len(keep)
+        feed.audience = keep
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
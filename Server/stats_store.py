@@ -0,0 +1,208 @@
+"""
+Persistent player stats
+- a store keeps {username: (wins, games)} on disk; two local backends:
+  LogStore (JSON snapshot file + append-only log of per-player deltas, compacted now and then)
+  and SqliteStore (one row per player, batched upserts)
+- StatsWriter is the write-behind: game results are queued in memory and a background thread
+  merges them into one delta per player and hands the batch to the store, so a game ending
+  never waits on the disk
+- fsync_interval: how often (seconds) a flushed batch is also fsynced; 0 syncs every batch.
+  A crash loses at most that window of results
+- store_for(path) picks the backend from the file name (.db/.sqlite -> SQLite, else the log)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 0.5  # seconds between batches
+DEFAULT_FSYNC_INTERVAL = 2.0
+DEFAULT_COMPACT_AFTER = 200000  # log lines before the log is folded into the snapshot
+
+
+class LogStore:
+    def __init__(self, path, compact_after=DEFAULT_COMPACT_AFTER):
+        self.snapshot_path = path
+        self.log_path = path + ".log"
+        self.compact_after = compact_after
+        self.totals = {}  # username -> [wins, games], exactly what snapshot + log hold
+        self.log = None
+        self.log_lines = 0
+
+    def load(self):
+        # snapshot then log; returns {username: [wins, games]} (the store's own table, read-only for callers)
+        totals = self.totals
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                totals.update(json.load(f))  # one document: parsed in C, far faster than line by line
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                good = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn write at the tail from a crash
+                    try:
+                        u, w, g = json.loads(line)
+                    except ValueError:
+                        break
+                    t = totals.setdefault(u, [0, 0])
+                    t[0] += w
+                    t[1] += g
+                    good += len(line)
+                    self.log_lines += 1
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good)
+        self.log = open(self.log_path, "ab", buffering=0)  # written with os.write, a batch at a time
+        return totals
+
+    def apply(self, deltas, sync=False):
+        # deltas: {username: (wins, games)} to add. A batch lands whole or not at all: a failed
+        # write is cut back off the log, so the writer retrying it can't count rows twice
+        data = "".join(json.dumps([u, w, g]) + "\n" for u, (w, g) in deltas.items()).encode()
+        fd = self.log.fileno()
+        start = os.lseek(fd, 0, os.SEEK_END)
+        try:
+            done = 0
+            while done < len(data):
+                done += os.write(fd, data[done:])
+        except OSError:
+            os.ftruncate(fd, start)
+            raise
+        self.log_lines += len(deltas)
+        for u, (w, g) in deltas.items():
+            t = self.totals.setdefault(u, [0, 0])
+            t[0] += w
+            t[1] += g
+        # the batch is in the log now; failing to sync or compact must not send it back for a retry
+        try:
+            if self.log_lines >= self.compact_after:
+                self.compact()
+            elif sync:
+                os.fsync(fd)
+        except OSError as e:
+            print("stats log sync failed:", e)  # compaction is tried again on the next batch
+
+    def compact(self):
+        # fold the log into a fresh snapshot; the old snapshot stays valid until the rename
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.totals, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.log.close()
+        self.log = open(self.log_path, "wb", buffering=0)
+        os.fsync(self.log.fileno())
+        self.log_lines = 0
+
+    def close(self):
+        if self.log:
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.log.close()
+            self.log = None
+
+
+class SqliteStore:
+    def __init__(self, path):
+        self.path = path
+        # used from the loading thread and then only from the writer thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # commits don't fsync; checkpoints do
+        self.db.execute("CREATE TABLE IF NOT EXISTS stats (username TEXT PRIMARY KEY, wins INTEGER NOT NULL, games INTEGER NOT NULL)")
+        self.db.commit()
+
+    def load(self):
+        return {u: (w, g) for u, w, g in self.db.execute("SELECT username, wins, games FROM stats")}
+
+    def apply(self, deltas, sync=False):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO stats VALUES (?, ?, ?) ON CONFLICT(username) "
+                "DO UPDATE SET wins = wins + excluded.wins, games = games + excluded.games",
+                [(u, w, g) for u, (w, g) in deltas.items()])
+        if sync:
+            self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def compact(self):
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.compact()
+        self.db.close()
+
+
+def store_for(path):
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteStore(path)
+    return LogStore(path)
+
+
+class StatsWriter:
+    def __init__(self, store, flush_interval=DEFAULT_FLUSH_INTERVAL, fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.pending = []  # (winner, players) not yet handed to the store
+        self.cond = threading.Condition()
+        self.closed = False
+        self.last_sync = time.monotonic()
+        self.batches = 0
+        self.results = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, winner, players):
+        # called from the move handler: just a list append under a lock
+        with self.cond:
+            self.pending.append((winner, players))
+
+    def _merge(self, results):
+        deltas = {}
+        for winner, players in results:
+            for u in players:
+                w, g = deltas.get(u, (0, 0))
+                deltas[u] = (w + (u == winner), g + 1)
+        return deltas
+
+    def flush(self, sync=False):
+        with self.cond:
+            results, self.pending = self.pending, []
+        if results:
+            now = time.monotonic()
+            sync = sync or now - self.last_sync >= self.fsync_interval
+            try:
+                self.store.apply(self._merge(results), sync)
+            except (OSError, sqlite3.Error):
+                with self.cond:
+                    self.pending[:0] = results  # keep them for the next attempt
+                raise
+            if sync:
+                self.last_sync = now
+            self.batches += 1
+            self.results += len(results)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.closed:
+                    self.cond.wait(self.flush_interval)
+                closed = self.closed
+            try:
+                self.flush()
+            except (OSError, sqlite3.Error) as e:
+                print("stats store write failed:", e)  # results stay queued, retried next tick
+            if closed:
+                break
+
+    def close(self):
+        # stop the thread, write out what is left and sync
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush(sync=True)
+        self.store.close()
@@ -0,0 +1,338 @@
+"""
+Multi-process server (threaded engine)
+- one GameServer runs every request under one GIL, so the supervisor forks N worker processes,
+  each a complete GameServer with its own lobbies, bots, stats store and journal
+- lobby ids are partitioned: worker k of N owns ids k+1, k+1+N, k+1+2N, ... (LobbyRegistry
+  id_start/id_step), so the owner of any lobby id is plain arithmetic
+- the supervisor accepts on the public port, reads the client's hello and hands the socket, with
+  the bytes read so far, to a worker over a unix SEQPACKET socket (SCM_RIGHTS): the owner of the
+  hello's lobby_id when it names one (a client reconnecting to its game), else the worker the
+  username hashes to, so a player lands on the same worker every time
+- join_lobby for a lobby another worker owns moves the connection there: the client's outbound
+  queue is flushed, it leaves this worker as on a disconnect, and the socket, its session (name,
+  codec, deltas, chat_batches, token) and every byte not yet handled, the join first, go to the owner, which
+  carries on without a second hello. A player seated in a running game is not moved, and a join
+  with more unhandled input behind it than a handoff carries is refused; the player stays put
+- each worker publishes its lobby rows into its own slot of an anonymous shared mmap (one writer
+  per slot, guarded by a seqlock) and polls its peers' slots, so list shows every worker's lobbies.
+  Its player count sits in the slot under a seqlock of its own, so logins and logouts rewrite
+  that, never the rows
+- per worker: max_lobbies / N lobbies, stats and journal files named name.<k>.ext. A game's stats
+  are recorded by the worker that ran it, so a player's level counts the games played there;
+  restart with the same worker count so journaled lobby ids stay with their owner
+"""
+
+import json
+import mmap
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from codec import CODECS, PICKLE, codec_for_frame
+from connection import Connection
+from protocol import HEADER, RECV_SIZE, UNFRAMED_ERROR, FrameDecoder, encode_frame, unframed
+
+SLOT_SIZE = 4 << 20  # shared memory per worker for its published lobby rows
+SLOT_HEADER = struct.Struct("!QI")  # seqlock counter (odd while being written), payload length
+SLOT_SEQ = struct.Struct("!Q")  # the player count's seqlock counter, right after SLOT_HEADER...
+SLOT_PLAYERS = struct.Struct("!I")  # ...then players connected
+SLOT_DATA = SLOT_HEADER.size + SLOT_SEQ.size + SLOT_PLAYERS.size  # where the rows start
+PUBLISH_INTERVAL = 0.05  # seconds between checks for local and peer listing changes
+HELLO_TIMEOUT = 10.0
+MAX_HANDOFF = 128 * 1024  # unhandled input that may travel with a socket
+
+
+def lobby_owner(lid, workers):
+    # index of the worker that owns a lobby id (None for anything that is not one)
+    if not isinstance(lid, int) or isinstance(lid, bool) or lid < 1:
+        return None
+    return (lid - 1) % workers
+
+
+def worker_path(path, index):
+    # stats.db -> stats.0.db
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def send_handoff(inbox, sock, header, data):
+    # one datagram: framed JSON header + raw pending bytes, with the socket's fd attached
+    msg = encode_frame(json.dumps(header).encode("utf-8")) + data
+    socket.send_fds(inbox, [msg], [sock.fileno()])
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Cluster:
+    # one worker's side of the supervisor: lobby ownership, connection handoffs, the shared listing
+    def __init__(self, index, workers, max_lobbies, inboxes, slots):
+        self.index = index
+        self.workers = workers
+        self.max_lobbies = max_lobbies  # across all workers
+        self.worker_lobbies = -(-max_lobbies // workers)
+        self.inboxes = inboxes  # worker -> socket whose datagrams that worker receives
+        self.inbox = None  # our own receiving end, set once forked
+        self.slots = slots
+        self.peers = {}  # worker -> (seq, {"rows"}) as last read
+        self.server = None
+        self.published = None
+        self.published_players = None
+        self.moved_in = 0
+        self.moved_out = 0
+
+    def owner(self, lid):
+        return lobby_owner(lid, self.workers)
+
+    # --- connection handoff ---
+
+    def migrate(self, conn, addr, username, frames, decoder):
+        # hand conn to the worker set in conn.migrate_to; frames are the unhandled ones, the join first.
+        # True once the connection has left this worker (moved, or lost if the handoff failed);
+        # False if it was not tried (too much unhandled input) and the connection is still ours
+        data = b"".join(encode_frame(f) for f in frames) + bytes(decoder.buf)
+        if len(data) > MAX_HANDOFF:
+            return False
+        if not conn.detach():
+            return True
+        state = {"username": username, "codec": conn.codec.name, "deltas": conn.deltas, "chat_batches": conn.chat_batches, "token": conn.session}
+        try:
+            send_handoff(self.inboxes[conn.migrate_to], conn.sock, {"addr": list(addr), "moved": state}, data)
+            self.moved_out += 1
+        except OSError as e:
+            print("connection handoff failed:", e)
+        finally:
+            conn.sock.close()  # the new owner holds its own copy of the fd
+        return True
+
+    def _receive(self):
+        # next handed-over socket as (sock, header, pending bytes); None once the supervisor is gone
+        while True:
+            msg, fds, flags, _ = socket.recv_fds(self.inbox, MAX_HANDOFF + 65536, 1)
+            if not msg:
+                return None
+            socks = [socket.socket(fileno=fd) for fd in fds]
+            if len(socks) != 1 or flags & (socket.MSG_TRUNC | socket.MSG_CTRUNC):
+                for s in socks:
+                    s.close()
+                continue
+            (n,) = HEADER.unpack_from(msg)
+            return socks[0], json.loads(msg[HEADER.size:HEADER.size + n]), msg[HEADER.size + n:]
+
+    def serve(self, server):
+        # worker main thread: run every socket the supervisor or a peer hands us
+        self.server = server
+        threading.Thread(target=self._publisher, daemon=True).start()
+        print(f"Worker {self.index} serving lobby ids {self.index + 1}, {self.index + 1 + self.workers}, ...")
+        while server.running:
+            got = self._receive()
+            if got is None:
+                break
+            sock, header, pending = got
+            moved = header.get("moved")
+            if moved:
+                self.moved_in += 1
+            conn = Connection(sock, server.max_queue)
+            conn.start()
+            threading.Thread(target=server.client_thread, args=(conn, tuple(header["addr"]), pending, moved), daemon=True).start()
+
+    # --- shared listing ---
+
+    def _publish(self, rows):
+        slot = self.slots[self.index]
+        data = json.dumps({"rows": rows}, separators=(",", ":")).encode("utf-8")
+        while SLOT_DATA + len(data) > SLOT_SIZE:
+            rows = rows[:len(rows) // 2]  # list what fits
+            data = json.dumps({"rows": rows}, separators=(",", ":")).encode("utf-8")
+        seq = SLOT_HEADER.unpack_from(slot)[0]
+        SLOT_HEADER.pack_into(slot, 0, seq + 1, 0)
+        slot[SLOT_DATA:SLOT_DATA + len(data)] = data
+        SLOT_HEADER.pack_into(slot, 0, seq + 2, len(data))
+
+    def _publish_players(self, players):
+        slot = self.slots[self.index]
+        seq = SLOT_SEQ.unpack_from(slot, SLOT_HEADER.size)[0]
+        SLOT_SEQ.pack_into(slot, SLOT_HEADER.size, seq + 1)
+        SLOT_PLAYERS.pack_into(slot, SLOT_HEADER.size + SLOT_SEQ.size, players)
+        SLOT_SEQ.pack_into(slot, SLOT_HEADER.size, seq + 2)
+
+    def _read(self, worker):
+        # (seq, listing) of a peer's slot, or None if it was being rewritten the whole time
+        slot = self.slots[worker]
+        for _ in range(100):
+            seq, n = SLOT_HEADER.unpack_from(slot)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            data = slot[SLOT_DATA:SLOT_DATA + n]
+            if SLOT_HEADER.unpack_from(slot)[0] != seq:
+                continue
+            try:
+                return seq, json.loads(data)
+            except ValueError:
+                return None
+        return None
+
+    def _poll_peers(self):
+        # True if any peer published since we last looked
+        changed = False
+        for j in range(self.workers):
+            if j == self.index:
+                continue
+            seq = SLOT_HEADER.unpack_from(self.slots[j])[0]
+            if seq and seq != self.peers.get(j, (0,))[0]:
+                got = self._read(j)
+                if got:
+                    self.peers[j] = got
+                    changed = True
+        return changed
+
+    def peer_players(self):
+        # players connected to the other workers, as they last published
+        total = 0
+        for j in range(self.workers):
+            if j == self.index:
+                continue
+            slot = self.slots[j]
+            for _ in range(100):
+                seq = SLOT_SEQ.unpack_from(slot, SLOT_HEADER.size)[0]
+                if seq & 1:
+                    time.sleep(0)
+                    continue
+                players = SLOT_PLAYERS.unpack_from(slot, SLOT_HEADER.size + SLOT_SEQ.size)[0]
+                if SLOT_SEQ.unpack_from(slot, SLOT_HEADER.size)[0] == seq:
+                    total += players
+                    break
+        return total
+
+    def peer_listings(self):
+        # [{"rows"}] of every other worker, as last published
+        return [listing for _, listing in list(self.peers.values())]
+
+    def _publisher(self):
+        server = self.server
+        cache = server.server_info
+        while server.running:
+            # local_changes only moves on touch(), so peers re-reading our slot never ping-pong
+            changes = cache.local_changes
+            if changes != self.published:
+                self.published = changes
+                self._publish(cache.local_rows())
+            players = len(server.clients)
+            if players != self.published_players:
+                self.published_players = players
+                self._publish_players(players)
+            if self._poll_peers():
+                cache.refresh()
+            time.sleep(PUBLISH_INTERVAL)
+
+
+class Supervisor:
+    def __init__(self, make_server, workers, host, port, max_lobbies):
+        self.make_server = make_server  # cluster -> GameServer, called in each worker after the fork
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.max_lobbies = max_lobbies
+        self.sock = None
+        self.inboxes = []
+        self.procs = []
+        self.next_worker = 0
+
+    def pick(self, frame):
+        # worker for a connection, from its hello frame
+        try:
+            codec = codec_for_frame(frame, CODECS)
+            hello = codec.decode(frame) if codec else None
+        except Exception:
+            hello = None
+        if isinstance(hello, dict):
+            owner = lobby_owner(hello.get("lobby_id"), self.workers)
+            if owner is not None:
+                return owner
+            name = hello.get("username")
+            if isinstance(name, str):
+                return zlib.crc32(name.encode("utf-8")) % self.workers
+        # no usable hello: the worker will reject it, any one will do
+        self.next_worker = (self.next_worker + 1) % self.workers
+        return self.next_worker
+
+    def route(self, sock, addr):
+        # read up to the end of the first frame, then pass the socket on
+        try:
+            sock.settimeout(HELLO_TIMEOUT)
+            decoder = FrameDecoder(MAX_HANDOFF)
+            data = b""
+            frames = []
+            while not frames:
+                chunk = sock.recv(RECV_SIZE)
+                if not chunk:
+                    return
+                if not data and unframed(chunk, MAX_HANDOFF):
+                    sock.sendall(PICKLE.encode({"error": UNFRAMED_ERROR}))  # a client from before framing
+                    return
+                data += chunk
+                frames = decoder.feed(chunk)
+            sock.settimeout(None)
+            if len(data) <= MAX_HANDOFF:
+                send_handoff(self.inboxes[self.pick(frames[0])], sock, {"addr": list(addr)}, data)
+        except (OSError, ValueError):
+            pass
+        finally:
+            sock.close()
+
+    def _worker(self, cluster, receivers):
+        # child process
+        self.sock.close()
+        for j, r in enumerate(receivers):
+            if j != cluster.index:
+                r.close()
+        cluster.inbox = receivers[cluster.index]
+        signal.signal(signal.SIGTERM, _interrupt)
+        server = self.make_server(cluster)
+        try:
+            cluster.serve(server)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+
+    def start(self):
+        print(f"Starting supervisor on {self.host}:{self.port} with {self.workers} worker processes")
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(1024)
+        slots = [mmap.mmap(-1, SLOT_SIZE) for _ in range(self.workers)]  # MAP_SHARED: survives the fork
+        pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET) for _ in range(self.workers)]
+        self.inboxes = [a for a, _ in pairs]
+        receivers = [b for _, b in pairs]
+        # fork before any thread exists in this process
+        ctx = multiprocessing.get_context("fork")
+        for k in range(self.workers):
+            cluster = Cluster(k, self.workers, self.max_lobbies, self.inboxes, slots)
+            proc = ctx.Process(target=self._worker, args=(cluster, receivers), name=f"worker-{k}")
+            proc.start()
+            self.procs.append(proc)
+        for r in receivers:
+            r.close()
+        signal.signal(signal.SIGTERM, _interrupt)  # stop the workers too
+        try:
+            while True:
+                conn, addr = self.sock.accept()
+                threading.Thread(target=self.route, args=(conn, addr), daemon=True).start()
+        except KeyboardInterrupt:
+            print("Shutting down supervisor.")
+        finally:
+            self.sock.close()
+            for proc in self.procs:
+                if proc.is_alive():
+                    os.kill(proc.pid, signal.SIGTERM)
+            for proc in self.procs:
+                proc.join()
@@ -0,0 +1,91 @@
+"""
+Timer wheel: one thread runs every timer the server sets
+- a hashed wheel of SLOTS buckets, TICK seconds apart; schedule() and cancel() are O(1) and a
+  tick only looks at its own bucket, so timers that are not due cost nothing per tick however
+  many there are (an idle check per connection, grace windows, turn clocks)
+- a timer more than one turn of the wheel out (~100s with the defaults) sits in its bucket with
+  a count of turns to wait
+- callbacks run on the wheel's thread, outside the wheel's lock, and must not block: taking a
+  lobby lock is fine, socket I/O is not (queue frames instead)
+- cancel() only marks the timer; it is dropped when its bucket comes round
+"""
+
+import threading
+import time
+from math import ceil
+
+TICK = 0.1  # seconds
+SLOTS = 1024
+
+
+class Timer:
+    __slots__ = ("rounds", "fn", "args", "cancelled")
+
+    def __init__(self, rounds, fn, args):
+        self.rounds = rounds  # turns of the wheel to wait before firing
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    def __init__(self, tick=TICK, slots=SLOTS, on_error=None):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.ticks = 0  # ticks done; tick k fires at started + (k + 1) * tick
+        self.pending = 0  # timers in the wheel, cancelled ones included until dropped
+        self.fired = 0
+        self.on_error = on_error  # called with an exception a callback raised
+        self.lock = threading.Lock()
+        self.running = True
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def schedule(self, delay, fn, *args):
+        # fn(*args) on the wheel's thread after about delay seconds (rounded up to a tick)
+        with self.lock:
+            due = ceil((time.monotonic() + delay - self.started) / self.tick) - 1
+            ahead = max(due - self.ticks, 0)
+            timer = Timer(ahead // len(self.slots), fn, args)
+            self.slots[(self.ticks + ahead) % len(self.slots)].append(timer)
+            self.pending += 1
+        return timer
+
+    def _advance(self):
+        # one tick: fire this bucket's due timers, keep the rest for a later turn
+        with self.lock:
+            i = self.ticks % len(self.slots)
+            due, keep = [], []
+            for timer in self.slots[i]:
+                if timer.cancelled:
+                    continue
+                if timer.rounds:
+                    timer.rounds -= 1
+                    keep.append(timer)
+                else:
+                    due.append(timer)
+            self.pending -= len(self.slots[i]) - len(keep)
+            self.slots[i] = keep
+            self.ticks += 1
+        for timer in due:
+            try:
+                timer.fn(*timer.args)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+        self.fired += len(due)
+
+    def _run(self):
+        while self.running:
+            wait = self.started + (self.ticks + 1) * self.tick - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)  # behind schedule: catch up tick by tick without sleeping
+            self._advance()
+
+    def close(self):
+        self.running = False
+        self.thread.join()
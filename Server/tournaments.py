@@ -0,0 +1,207 @@
+"""
+Tournaments
+- a tournament is rounds of tables; each table is an ordinary lobby the server makes, seats and
+  starts (see GameServer.seat_table), tagged so its game_over reports back here
+- formats:
+  bracket     - single elimination: tables of `seats` players, the winner of each goes on. Round 1
+                deals the seeds (best level first) over the tables in snake order so the strongest
+                meet late; later rounds seat the winners of neighbouring tables together. A
+                table left with one player is a bye
+  round_robin - every entrant plays every other once, one head-to-head table each per round
+                (circle method; an odd entrant out sits the round out)
+- standings are kept incrementally: a finished game updates its players' rows and moves only
+  those rows in a ranking kept sorted with bisect, so nothing is recomputed from scratch
+- nothing heavy happens at game_over: report() queues the result, and the server drains the
+  results and seats queued tables a bounded batch at a time on its timer wheel, so a round of
+  hundreds of tables finishing together turns into a few short ticks
+- a round ends when all its tables have reported; with auto the next round is made and queued
+  for seating at once, otherwise an admin advances it
+- tournaments live in memory on the server (or worker) they were created on
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+
+FORMATS = ("bracket", "round_robin")
+MAX_ENTRANTS = 4096
+
+
+class Standings:
+    def __init__(self, players):
+        self.rows = {u: [0, 0, 0] for u in players}  # username -> [wins, games, pips left in hand]
+        self.order = sorted(self._key(u) for u in players)  # ranking, best first
+        self.version = 0  # bumped by every recorded game
+
+    def _key(self, u):
+        wins, games, pips = self.rows[u]
+        return (-wins, pips, games, u)  # most wins, then fewest pips left, then fewest games
+
+    def record(self, players, winner, pips):
+        # one finished game; pips: username -> pips left in their hand
+        for u in players:
+            row = self.rows.get(u)
+            if row is None:
+                continue
+            del self.order[bisect_left(self.order, self._key(u))]
+            row[0] += u == winner
+            row[1] += 1
+            row[2] += pips.get(u, 0)
+            insort(self.order, self._key(u))
+        self.version += 1
+
+    def rank(self, u):
+        return bisect_left(self.order, self._key(u)) + 1 if u in self.rows else None
+
+    def top(self, limit=None):
+        return [{"rank": i + 1, "player": k[3], "wins": -k[0], "games": k[2], "pips": k[1]}
+                for i, k in enumerate(self.order[:limit])]
+
+    def leader(self):
+        return self.order[0][3] if self.order else None
+
+
+class Tournament:
+    def __init__(self, tid, name, fmt, players, seats, settings, auto=True):
+        self.tid = tid
+        self.name = name
+        self.fmt = fmt
+        self.players = list(players)  # entrants, in seeding order
+        self.seats = seats  # players per table
+        self.settings = settings  # create_lobby arguments for every table (difficulty, max_pip, ...)
+        self.auto = auto  # start the next round as soon as one ends
+        self.standings = Standings(players)
+        self.state = "open"  # open -> playing <-> ready -> finished
+        self.round = 0
+        self.tables = []  # this round's lineups (lists of usernames)
+        self.winners = []  # per table of this round: winner, None if abandoned, False while playing
+        self.left = 0  # tables of this round still to report
+        self.lobbies = {}  # table index -> lobby id, while its game runs
+        self.champion = None
+        self.created = time.time()
+        if fmt == "round_robin":
+            self.schedule = round_robin(self.players)
+
+    def next_round(self):
+        # make the next round's tables; False when the tournament is over instead
+        if self.fmt == "bracket":
+            entrants = self.players if self.round == 0 else [w for w in self.winners if w]
+            if len(entrants) < 2:
+                self.finish(entrants[0] if entrants else None)
+                return False
+            count = -(-len(entrants) // self.seats)
+            tables = snake(entrants, count) if self.round == 0 else chunks(entrants, count)
+        else:
+            if self.round == len(self.schedule):
+                self.finish(self.standings.leader())
+                return False
+            tables = self.schedule[self.round]
+        self.round += 1
+        self.tables = tables
+        self.winners = [t[0] if len(t) == 1 else False for t in tables]  # a lone player gets a bye
+        self.left = sum(w is False for w in self.winners)
+        self.lobbies = {}
+        self.state = "playing"
+        if not self.left:
+            self.state = "ready"  # all byes
+        return True
+
+    def finished_table(self, rnd, index, winner, pips):
+        # a table's result (winner None: abandoned); True if that ended the round
+        if self.state != "playing" or rnd != self.round or self.winners[index] is not False:
+            return False  # stale, or reported twice (a table's game_over, then its lobby closing)
+        self.winners[index] = winner
+        self.lobbies.pop(index, None)
+        if winner is not None:
+            self.standings.record(self.tables[index], winner, pips)
+        self.left -= 1
+        if self.left:
+            return False
+        self.state = "ready"
+        return True
+
+    def finish(self, champion):
+        self.state = "finished"
+        self.champion = champion
+        self.tables, self.winners, self.lobbies, self.left = [], [], {}, 0
+
+    def summary(self):
+        return {"id": self.tid, "name": self.name, "format": self.fmt, "players": len(self.players), "seats": self.seats,
+                "round": self.round, "rounds": len(self.schedule) if self.fmt == "round_robin" else None,
+                "state": self.state, "tables": len(self.tables), "playing": self.left, "auto": self.auto,
+                "champion": self.champion, "leader": self.standings.leader()}
+
+
+def snake(players, count):
+    # deal seeds over count tables 1..n, n..1, 1..n, ...
+    tables = [[] for _ in range(count)]
+    for i, u in enumerate(players):
+        lap, pos = divmod(i, count)
+        tables[pos if lap % 2 == 0 else count - 1 - pos].append(u)
+    return tables
+
+
+def chunks(players, count):
+    # count neighbouring groups of near-equal size
+    size, extra = divmod(len(players), count)
+    out, i = [], 0
+    for t in range(count):
+        n = size + (t < extra)
+        out.append(players[i:i + n])
+        i += n
+    return out
+
+
+def round_robin(players):
+    # circle method: rounds of head-to-head tables, everyone meets everyone once
+    ring = list(players) + ([None] if len(players) % 2 else [])
+    n = len(ring)
+    rounds = []
+    for _ in range(n - 1):
+        rounds.append([[ring[i], ring[n - 1 - i]] for i in range(n // 2) if ring[i] is not None and ring[n - 1 - i] is not None])
+        ring = [ring[0], ring[-1]] + ring[1:-1]
+    return rounds
+
+
+class Tournaments:
+    def __init__(self):
+        self.by_id = {}
+        self.next_id = 1
+        self.results = deque()  # (tournament, round, table, lobby id, winner, pips) reported at game_over
+        self.to_seat = deque()  # (tournament, round, table) waiting for a lobby
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, tid):
+        return self.by_id.get(tid)
+
+    def create(self, name, fmt, players, seats, settings, auto=True):
+        with self.lock:
+            t = Tournament(self.next_id, name, fmt, players, seats, settings, auto)
+            self.by_id[t.tid] = t
+            self.next_id += 1
+        return t
+
+    def report(self, tag, lobby_id, winner, pips):
+        # a table's game ended (tag is the lobby's (tournament, round, table)); cheap, runs under the lobby lock
+        self.results.append(tag + (lobby_id, winner, pips))
+
+    def start_round(self, t):
+        # make t's next round and queue its tables for seating (caller holds self.lock)
+        if not t.next_round():
+            return False
+        self.to_seat.extend((t, t.round, i) for i, w in enumerate(t.winners) if w is False)
+        return True
+
+    def take(self, limit):
+        # up to limit queued results, oldest first
+        out = []
+        while self.results and len(out) < limit:
+            out.append(self.results.popleft())
+        return out
+
+    def running(self):
+        return [t for t in list(self.by_id.values()) if t.state != "finished"]
@@ -0,0 +1,81 @@
+"""
+Bot strategy benchmark
+- easy, normal and hard bots play each other directly on bitmask state (no server, no sockets),
+  seats rotated so nobody keeps the first move
+- reports win rate per strategy and how long each takes per move; hard bots stop at the
+  per-move budget, so their think time should sit at or under it
+
+usage: python benchmarks/bench_bots.py [--games 60] [--budget 0.05] [--per-hand 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from bots import STRATEGIES, View, _bits, _pips, _place
+from dominoes import deal, tile_set
+
+
+def make_view(ts, seat, hands, left, right, played, passes):
+    view = View.__new__(View)
+    view.ts, view.seq, view.me, view.hand = ts, 0, seat, hands[seat]
+    view.left, view.right, view.played, view.passes = left, right, played, passes
+    view.sizes = [len(_bits(h)) for h in hands]
+    return view
+
+
+def play(strategies, budget, per_hand, rnd, think):
+    ts = tile_set(6)
+    n = len(strategies)
+    hands = [h.mask for h in deal(ts, n, per_hand, rnd.random)]
+    left = right = None
+    played = passes = turn = 0
+    while True:
+        name = strategies[turn]
+        t0 = time.perf_counter()
+        move = STRATEGIES[name](make_view(ts, turn, hands, left, right, played, passes), budget, rnd)
+        think[name].append(time.perf_counter() - t0)
+        if move is None:
+            passes += 1
+            if passes >= n:
+                pips = [_pips(ts, h) for h in hands]
+                return pips.index(min(pips))
+        else:
+            tid, side = move
+            left, right = _place(ts, tid, side, left, right)
+            hands[turn] &= ~(1 << tid)
+            played |= 1 << tid
+            passes = 0
+            for seat in range(n):
+                if not hands[seat]:
+                    return seat
+        turn = (turn + 1) % n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=60)
+    ap.add_argument("--budget", type=float, default=0.05)
+    ap.add_argument("--per-hand", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rnd = random.Random(args.seed)
+    lineup = ["easy", "normal", "hard"]
+    wins = dict.fromkeys(lineup, 0)
+    think = {name: [] for name in lineup}
+    for g in range(args.games):
+        seats = lineup[g % 3:] + lineup[:g % 3]
+        wins[seats[play(seats, args.budget, args.per_hand, rnd, think)]] += 1
+    print(f"{args.games} three-player games, {args.per_hand} tiles each, hard budget {args.budget * 1000:.0f} ms")
+    print(f"{'bot':<7} {'win rate':>9} {'avg ms/move':>12} {'max ms/move':>12}")
+    for name in lineup:
+        t = think[name]
+        print(f"{name:<7} {wins[name] / args.games:>9.2f} {sum(t) / len(t) * 1000:>12.2f} {max(t) * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Chat benchmark: does a burst of chat spam slow the moves down?
+- an in-process GameServer (no sockets; connections are sinks counting frames) runs one
+  4-player lobby; the main thread plays random legal games through the move action and times
+  each move, while --spammers threads chat in the same lobby as fast as they can
+- modes:
+  quiet     - no chat, the baseline
+  locked    - each message broadcast at once under the lobby lock, the way a move's chat
+              field used to go out
+  unlimited - the chat action with the rate limit lifted: posted off the game lock and batched,
+              but every message accepted, so each flush queues a huge frame under the lobby lock
+  chat      - the chat action as it ships (rate limited, batched)
+- reports the move latency (p50/p99), chat messages sent and accepted, and how many accepted
+  messages each chat frame to a player carried (the batching)
+- under the GIL every busy thread costs the movers some interpreter time whatever the locking,
+  so what tells is the gap between locked and the other two
+
+usage: python benchmarks/bench_chat.py [--spammers 4] [--seconds 3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+with contextlib.redirect_stdout(io.StringIO()):  # main.py prints its logo on import
+    import main as server_main
+from codec import CODECS
+
+MODES = ("quiet", "locked", "unlimited", "chat")
+
+
+class Sink:
+    # stands in for a Connection; chats: chat frames sent to it (counted at the lobby's broadcast)
+    bot = False
+    closed = False
+    deltas = True
+    chat_batches = True
+
+    def __init__(self, name):
+        self.codec = CODECS["dz1"]
+        self.session = f"s-{name}"
+        self.migrate_to = None
+        self.chats = 0
+
+    def sendall(self, frame, kind=None):
+        return True
+
+    def send_message(self, payload, kind=None):
+        return True
+
+
+def pct(xs, p):
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else 0.0
+
+
+def run(mode, spammers, seconds, seed):
+    server = server_main.GameServer("127.0.0.1", 0, "bench", 4, 10, "easy", idle_timeout=0)
+    if mode == "unlimited":
+        server.chat.rate = server.chat.burst = 1e9
+    names = [f"p{i}" for i in range(4)]
+    conns = {}
+    for u in names:
+        conns[u] = c = Sink(u)
+        server.clients[c] = (u, server.stats.ref(u))
+        server.sessions[u] = c.session
+        server.live[c.session] = c
+    lobby, _ = server.create_lobby(names[0])
+    for u in names:
+        server.handle_request(conns[u], u, {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    broadcast = lobby.broadcast
+
+    def counted(payload, legacy=None, wants="deltas"):
+        if "chat" in payload:
+            for c in conns.values():
+                c.chats += 1
+        broadcast(payload, legacy, wants)
+    lobby.broadcast = counted
+
+    stop = threading.Event()
+    sent = [0] * spammers
+
+    def spam(i):
+        u = names[i % len(names)]
+        while not stop.is_set():
+            text = f"spam {sent[i]} from {u}"
+            if mode == "locked":
+                with lobby.lock:
+                    lobby.broadcast({"chat": f"{u}: {text}"})
+            else:
+                server.handle_request(conns[u], u, {"action": "chat", "lobby_id": lobby.lobby_id, "text": text})
+            sent[i] += 1
+    threads = [threading.Thread(target=spam, args=(i,), daemon=True) for i in range(spammers if mode != "quiet" else 0)]
+    for t in threads:
+        t.start()
+
+    rnd = random.Random(seed)
+    took = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if not lobby.started:
+            server.handle_request(conns[names[0]], names[0], {"action": "start_lobby", "lobby_id": lobby.lobby_id})
+        u = lobby.current_turn_username()
+        opts = lobby.playable(lobby.hands[u])
+        sides = [s for s in ("left", "right") if opts[s]]
+        if sides:
+            side = rnd.choice(sides)
+            req = {"action": "move", "lobby_id": lobby.lobby_id, "move": rnd.choice(opts[side]), "side": side}
+        else:
+            req = {"action": "move", "lobby_id": lobby.lobby_id, "move": "pass"}
+        t0 = time.perf_counter()
+        server.handle_request(conns[u], u, req)
+        took.append(time.perf_counter() - t0)
+    stop.set()
+    for t in threads:
+        t.join()
+    time.sleep(server_main.CHAT_FLUSH * 2)  # let the last batch go out
+    accepted = sum(sent) if mode == "locked" else server.chat.posted
+    frames = conns[names[0]].chats
+    server.shutdown()
+    took.sort()
+    return took, sum(sent), accepted, frames
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--spammers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    print(f"4 players, {args.spammers} spamming threads, {args.seconds:.0f}s per mode")
+    print(f"{'mode':>10} {'moves':>7} {'p50 us':>8} {'p99 us':>9} {'chat sent':>10} {'accepted':>9} {'msgs/frame':>11}")
+    for mode in MODES:
+        took, sent, accepted, frames = run(mode, args.spammers, args.seconds, args.seed)
+        ratio = f"{accepted / frames:.1f}" if frames else "-"
+        print(f"{mode:>10} {len(took):7d} {pct(took, 0.5) * 1e6:8.1f} {pct(took, 0.99) * 1e6:9.1f} {sent:10d} {accepted:9d} {ratio:>11}")
+
+
+if __name__ == "__main__":
+    main()
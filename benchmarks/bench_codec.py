@@ -0,0 +1,56 @@
+"""
+Codec microbenchmark: dz2 / dz1 binary vs legacy pickle
+- encode/decode throughput and bytes per message for update (the pre-delta full form), delta
+  (what players get per move now), status and game_over
+- messages are shaped like a 6-player double-six game late in play
+
+usage: python benchmarks/bench_codec.py [--number 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from codec import CODECS
+
+
+def sample_messages(seed=7):
+    rnd = random.Random(seed)
+    tiles = [(i, j) for i in range(7) for j in range(i, 7)]
+    rnd.shuffle(tiles)
+    players = [f"player{i}" for i in range(6)]
+    chain, hands = tiles[:16], {p: tiles[16 + 2 * i:18 + 2 * i] for i, p in enumerate(players)}
+    sizes = {p: len(h) for p, h in hands.items()}
+    return {
+        "update": {"update": {"placed_by": players[2], "placed_tile": chain[-1], "chain": chain,
+                              "hands_sizes": sizes, "turn": players[3]}},
+        "delta": {"update": {"seq": 41, "placed_by": players[2], "placed_tile": chain[-1], "side": "left",
+                             "hand_size": 3, "turn": players[3], "deadline": 1792333731.5}},
+        "status": {"status": {"players": players, "chain": chain, "your_hand": hands[players[0]],
+                              "turn": players[3], "hands_sizes": sizes, "your_level": 4}},
+        "game_over": {"game_over": {"blocked": True, "winner": players[1],
+                                    "sums": {p: sum(a + b for a, b in h) for p, h in hands.items()},
+                                    "hands": hands}},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=20000)
+    args = ap.parse_args()
+    print(f"{'message':<10} {'codec':<7} {'bytes':>6} {'encode/s':>10} {'decode/s':>10}")
+    for kind, msg in sample_messages().items():
+        for codec in CODECS.values():
+            data = codec.encode(msg)
+            assert codec.decode(data) == msg
+            enc = timeit.timeit(lambda: codec.encode(msg), number=args.number)
+            dec = timeit.timeit(lambda: codec.decode(data), number=args.number)
+            print(f"{kind:<10} {codec.name:<7} {len(data):>6} {args.number / enc:>10.0f} {args.number / dec:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Game-start latency per domino set at 6 players
+- "list": the previous path (build the tile list, full random.shuffle, pop tuples into Hands)
+- "template": deal() -- partial Fisher-Yates over the precomputed id template, masks built from ids
+
+usage: python benchmarks/bench_deal.py [--number 20000] [--players 6]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from dominoes import SET_SIZES, Chain, Hand, TileSet, deal, tile_set
+
+PER_PLAYER = {"easy": 8, "normal": 12, "hard": 14}
+
+
+def start_list(max_pip, players, per_player):
+    ts = TileSet(max_pip)
+    deck = list(ts.tiles)
+    random.shuffle(deck)
+    hands = [Hand(ts, [deck.pop() for _ in range(min(per_player, len(deck)))]) for _ in range(players)]
+    return hands, Chain(max_pip)
+
+
+def start_template(max_pip, players, per_player):
+    return deal(tile_set(max_pip), players, per_player), Chain(max_pip)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=20000)
+    ap.add_argument("--players", type=int, default=6)
+    ap.add_argument("--difficulty", default="hard", choices=sorted(PER_PLAYER))
+    args = ap.parse_args()
+    per_player = PER_PLAYER[args.difficulty]
+    print(f"{args.players} players, {per_player} tiles each ({args.difficulty})")
+    print(f"{'set':<10} {'tiles':>6} {'list us':>9} {'template us':>12} {'speedup':>8}")
+    for max_pip in SET_SIZES:
+        old = timeit.timeit(lambda: start_list(max_pip, args.players, per_player), number=args.number)
+        new = timeit.timeit(lambda: start_template(max_pip, args.players, per_player), number=args.number)
+        n = len(tile_set(max_pip).tiles)
+        print(f"double-{max_pip:<3} {n:>6} {old / args.number * 1e6:>9.1f} {new / args.number * 1e6:>12.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
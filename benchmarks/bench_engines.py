@@ -0,0 +1,206 @@
+"""
+Load benchmark: threaded engine vs asyncio engine
+- starts each engine in a child process on a free local port
+- opens N idle connections (hello only) and reports connect rate, server threads and RSS
+- plays G concurrent 2-player games for a fixed time and reports moves/sec
+
+usage: python benchmarks/bench_engines.py [--connections 2000] [--games 50] [--seconds 10] [--engines threaded,asyncio]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server")
+sys.path.insert(0, SERVER_DIR)
+
+from codec import CODECS, codec_for_frame
+from protocol import FrameDecoder, RECV_SIZE, pack_message
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def serve(engine, port):
+    # child process: run one engine until killed
+    from main import GameServer
+    server = GameServer("127.0.0.1", port, "bench", 2, 1000000, "normal")
+    if engine == "asyncio":
+        from aio_server import AsyncEngine
+        AsyncEngine(server).start()
+    else:
+        server.start()
+
+
+def proc_status(pid):
+    # (threads, rss_kb) from /proc, or (None, None) where unavailable
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["Threads"]), int(fields["VmRSS"].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+class Peer:
+    # minimal protocol client over the framed wire format
+    def __init__(self, name, reader, writer, codec):
+        self.name = name
+        self.codec = codec
+        self.reader = reader
+        self.writer = writer
+        self.decoder = FrameDecoder(8 << 20)
+        self.inbox = []
+
+    @classmethod
+    async def connect(cls, port, name, codec="dz1"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        peer = cls(name, reader, writer, CODECS[codec])
+        peer.send({"action": "hello", "username": name, "codecs": [codec], "deltas": True, "chat_batches": True})
+        await peer.expect("ok")
+        return peer
+
+    def send(self, payload):
+        self.writer.write(pack_message(payload, self.codec))
+
+    async def recv(self):
+        while not self.inbox:
+            data = await self.reader.read(RECV_SIZE)
+            if not data:
+                raise ConnectionError("server closed connection")
+            self.inbox = [codec_for_frame(f).decode(f) for f in self.decoder.feed(data)][::-1]
+        return self.inbox.pop()
+
+    async def expect(self, *keys):
+        while True:
+            msg = await self.recv()
+            if any(k in msg for k in keys):
+                return msg
+
+    def close(self):
+        self.writer.close()
+
+
+def pick_move(hand, chain):
+    if not chain:
+        return hand[0], "right"
+    left, right = chain[0][0], chain[-1][1]
+    for a, b in hand:
+        if left in (a, b):
+            return (a, b), "left"
+        if right in (a, b):
+            return (a, b), "right"
+    return "pass", "right"
+
+
+async def play_games(port, gid, deadline, counter):
+    host = await Peer.connect(port, f"h{gid}")
+    guest = await Peer.connect(port, f"g{gid}")
+    players = {host.name: host, guest.name: guest}
+    host.send({"action": "create_lobby", "max_players": 2})
+    lid = (await host.expect("created", "error")).get("lobby_id")
+    for p in (host, guest):
+        p.send({"action": "join_lobby", "lobby_id": lid})
+        await p.expect("joined")
+    while time.perf_counter() < deadline:
+        host.send({"action": "start_lobby", "lobby_id": lid})
+        turn = (await host.expect("game_start"))["turn"]
+        await guest.expect("game_start")
+        while time.perf_counter() < deadline:
+            cur = players[turn]
+            cur.send({"action": "status", "lobby_id": lid})
+            # a game_over broadcast always precedes the reply to the next request
+            msg = await cur.expect("status", "game_over")
+            if "game_over" in msg:
+                await cur.expect("status")  # stale reply for the finished game
+                break
+            st = msg["status"]
+            move, side = pick_move(st["your_hand"], st["chain"])
+            cur.send({"action": "move", "lobby_id": lid, "move": move, "side": side})
+            msg = await cur.expect("update", "error")
+            if "error" in msg:
+                raise RuntimeError(msg["error"])
+            turn = msg["update"]["turn"]
+            counter[0] += 1
+    host.close()
+    guest.close()
+
+
+async def run_load(pid, port, connections, games, seconds):
+    # idle connections
+    t0 = time.perf_counter()
+    idle = []
+    batch = 200
+    for i in range(0, connections, batch):
+        idle += await asyncio.gather(*(Peer.connect(port, f"idle{j}") for j in range(i, min(i + batch, connections))))
+    connect_secs = time.perf_counter() - t0
+    # gameplay
+    counter = [0]
+    deadline = time.perf_counter() + seconds
+    t1 = time.perf_counter()
+    await asyncio.gather(*(play_games(port, g, deadline, counter) for g in range(games)))
+    play_secs = time.perf_counter() - t1
+    threads, rss = proc_status(pid)
+    for p in idle:
+        p.close()
+    return connect_secs, counter[0] / play_secs, threads, rss
+
+
+def bench_engine(engine, args):
+    port = free_port()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", engine,
+                              "--port", str(port)],
+                             stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        return asyncio.run(run_load(child.pid, port, args.connections, args.games, args.seconds))
+    finally:
+        child.kill()
+        child.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--connections", type=int, default=2000)
+    ap.add_argument("--games", type=int, default=50)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--engines", default="threaded,asyncio")
+    ap.add_argument("--serve")
+    ap.add_argument("--port", type=int)
+    args = ap.parse_args()
+    raise_fd_limit()
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    print(f"{args.connections} idle connections + {args.games} concurrent games for {args.seconds}s")
+    print(f"{'engine':<10} {'conn/s':>10} {'moves/s':>10} {'threads':>8} {'rss MB':>8}")
+    for engine in args.engines.split(","):
+        connect_secs, mps, threads, rss = bench_engine(engine, args)
+        total = args.connections + 2 * args.games
+        rss_mb = f"{rss / 1024:.1f}" if rss else "n/a"
+        print(f"{engine:<10} {args.connections / connect_secs:>10.0f} {mps:>10.0f} {threads or 'n/a':>8} {rss_mb:>8}   ({total} sockets)")
+
+
+if __name__ == "__main__":
+    main()
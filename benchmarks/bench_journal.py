@@ -0,0 +1,98 @@
+"""
+Game journal benchmark
+- per-move overhead: random legal games played straight on Lobby objects (no sockets), with and
+  without a journal attached; the difference is what journaling adds to the move handler
+  (queueing the record, plus a lobby snapshot every snapshot_every moves)
+- recovery: a journal holding N running games (each some moves in), then the time a new
+  GameServer takes to rebuild them all
+
+usage: python benchmarks/bench_journal.py [--lobbies 10000] [--moves 20]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+with redirect_stdout(io.StringIO()):
+    import main as server_main  # prints the logo on import
+from journal import GameJournal
+
+
+def start_game(lid, rnd, journal=None):
+    lobby = server_main.Lobby(lid, 4, "normal", "p0")
+    for i in range(4):
+        lobby.players.append((None, f"p{i}", None))
+        lobby.player_names.append(f"p{i}")
+        lobby.tokens[f"p{i}"] = f"token{lid}_{i}"
+    lobby.start(7, rnd.random)
+    lobby.started = True
+    if journal:
+        lobby.journal = journal
+        journal.started(lobby)
+    return lobby
+
+
+def play_move(lobby, rnd):
+    # what the move handler does for one legal move (or a pass), minus the socket side
+    u = lobby.current_turn_username()
+    opts = lobby.playable(lobby.hands[u])
+    sides = [s for s in ("left", "right") if opts[s]]
+    if not sides:
+        lobby.pass_turn()
+        lobby.broadcast_event({"passed_by": u})
+        return
+    side = rnd.choice(sides)
+    placed, side = lobby.play(u, rnd.choice(opts[side]), side)
+    lobby.broadcast_event({"placed_by": u, "placed_tile": placed, "side": side, "hand_size": len(lobby.hands[u])})
+
+
+def run_games(n, moves, journal=None, seed=5):
+    rnd = random.Random(seed)
+    lobbies = [start_game(i + 1, rnd, journal) for i in range(n)]
+    start = time.perf_counter()
+    for _ in range(moves):
+        for lobby in lobbies:
+            play_move(lobby, rnd)
+    return (time.perf_counter() - start) / (n * moves) * 1e6, lobbies
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lobbies", type=int, default=10000)
+    ap.add_argument("--moves", type=int, default=20, help="moves per game (7 tiles each, 4 players)")
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "journal")
+        bare, _ = run_games(args.lobbies, args.moves)
+        journal = GameJournal(path)
+        journal.recover()
+        journal.start()
+        journaled, lobbies = run_games(args.lobbies, args.moves, journal)
+        start = time.perf_counter()
+        journal.close()
+        drain = time.perf_counter() - start
+        size = os.path.getsize(path)
+        print(f"{args.lobbies} games x {args.moves} moves, snapshot every {journal.snapshot_every} moves")
+        print(f"move without journal  {bare:8.2f} us")
+        print(f"move with journal     {journaled:8.2f} us  (+{journaled - bare:.2f} us in the handler)")
+        print(f"writer drain at close {drain:8.2f} s, journal {size / 1e6:.1f} MB, {journal.records} records")
+
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            server = server_main.GameServer("127.0.0.1", 0, "bench", 4, args.lobbies, "normal",
+                                            journal=GameJournal(path))
+        took = time.perf_counter() - start
+        ok = all(server.lobbies.get(l.lobby_id).chain.to_list() == l.chain.to_list() for l in lobbies)
+        server.shutdown()
+        print(f"recovery of {len(server.lobbies)} games {took:8.2f} s  (state matches: {ok})")
+
+
+if __name__ == "__main__":
+    main()
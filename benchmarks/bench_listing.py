@@ -0,0 +1,101 @@
+"""
+Lobby listing benchmark: rebuilding server_info per request vs the versioned cache
+- a GameServer (no sockets) with a few thousand lobbies; requests are answered the way the
+  list action does it, ending in an encoded frame
+- "rebuild" re-creates the rows and encodes every time (the old behaviour), "cached" serves
+  the pre-encoded frame, "unchanged" answers an if_version poll, "page"/"filtered" are cached
+  paged and filtered listings
+- "churn" touches the version every N requests, so the cache is rebuilt at that rate
+- "logins" has a player connect or leave before every request: the rows and the version stay,
+  and the listed count is re-encoded at most once per PLAYERS_REFRESH
+
+usage: python benchmarks/bench_listing.py [--lobbies 2000] [--number 2000]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+with redirect_stdout(io.StringIO()):
+    import main as server_main  # prints the logo on import
+from codec import BINARY
+from listing import list_params
+from protocol import pack_message
+
+
+def make_server(n_lobbies):
+    server = server_main.GameServer("127.0.0.1", 0, "bench", 4, n_lobbies, "normal")
+    for i in range(n_lobbies):
+        lobby, _ = server.create_lobby(f"host{i}", 2 + i % 3, ("easy", "normal", "hard")[i % 3])
+        lobby.players = [None] * (i % (lobby.max_players + 1))
+        lobby.started = i % 5 == 0
+    return server
+
+
+def rate(fn, number):
+    fn()  # warm: the first call after a change pays for the rebuild
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return number / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lobbies", type=int, default=2000)
+    ap.add_argument("--number", type=int, default=2000)
+    args = ap.parse_args()
+    server = make_server(args.lobbies)
+    cache = server.server_info
+
+    def rebuild():
+        cache.touch()
+        return pack_message({"server_info": server.list_servers_info()}, BINARY)
+
+    full = list_params({})
+    paged = list_params({"page": 3, "page_size": 50})
+    filtered = list_params({"difficulty": "hard", "open": True, "waiting": True, "page": 0})
+    churn_count = [0]
+
+    def churn(every):
+        def run():
+            churn_count[0] += 1
+            if churn_count[0] % every == 0:
+                cache.touch()
+            return cache.frame(BINARY, full)
+        return run
+
+    logins = [0]
+
+    def login_churn():
+        logins[0] += 1
+        if logins[0] % 2:
+            server.clients[logins[0]] = ("guest", None)
+        else:
+            server.clients.pop(logins[0] - 1, None)
+        return cache.frame(BINARY, full)
+
+    cases = [
+        ("rebuild", rebuild),
+        ("cached", lambda: cache.frame(BINARY, full)),
+        ("unchanged", lambda: cache.unchanged(BINARY, cache.version)),
+        ("page", lambda: cache.frame(BINARY, paged)),
+        ("filtered", lambda: cache.frame(BINARY, filtered)),
+        ("churn/10", churn(10)),
+        ("churn/100", churn(100)),
+        ("logins", login_churn),
+    ]
+    print(f"{args.lobbies} lobbies, full listing {len(cache.frame(BINARY, full))} bytes, "
+          f"page {len(cache.frame(BINARY, paged))} bytes, unchanged {len(cache.unchanged(BINARY, cache.version))} bytes")
+    print(f"{'case':<10} {'lists/s':>10}")
+    for name, fn in cases:
+        print(f"{name:<10} {rate(fn, args.number):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Matchmaking benchmark
+- steady state: players arrive at a fixed rate (Poisson) on a simulated clock, with levels skewed
+  towards beginners and a mix of difficulties and lobby sizes; the queue is swept once per
+  simulated second, as the server's timer does. Reports queue-time percentiles, how far from
+  the anchor's level groups reached, and the real time spent per add and per sweep
+- backlog: a large number of players queued at once without matching, then one sweep; reports
+  how long the sweep took and how many players it placed per second
+
+usage: python benchmarks/bench_matchmaking.py [--rate 200] [--seconds 600] [--backlog 50000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from matchmaking import MAX_LEVEL, Matchmaker
+
+DIFFICULTIES = (("easy", 5), ("normal", 3), ("hard", 2))  # (difficulty, weight)
+SIZES = ((2, 5), (3, 2), (4, 3))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def pick(rnd, choices):
+    return rnd.choices([c for c, _ in choices], [w for _, w in choices])[0]
+
+
+def level(rnd):
+    # most players are new, few are at the top
+    return min(int(rnd.expovariate(0.35)), MAX_LEVEL)
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def steady(rate, seconds, seed):
+    rnd = random.Random(seed)
+    clock = Clock()
+    mm = Matchmaker(clock=clock)
+    waits, spreads = [], []
+    adding = sweeping = 0.0
+    added = 0
+
+    def done(groups):
+        for group in groups:
+            waits.extend(clock.now - t.since for t in group)
+            spreads.append(max(t.level for t in group) - min(t.level for t in group))
+
+    t = 0.0
+    for second in range(seconds):
+        while True:
+            t += rnd.expovariate(rate)
+            if t >= second + 1:
+                break
+            clock.now = t
+            t0 = time.perf_counter()
+            _, groups = mm.add(f"p{added}", None, level(rnd), pick(rnd, DIFFICULTIES), pick(rnd, SIZES))
+            adding += time.perf_counter() - t0
+            added += 1
+            done(groups)
+        clock.now = second + 1
+        t0 = time.perf_counter()
+        groups = mm.sweep()
+        sweeping += time.perf_counter() - t0
+        done(groups)
+    waits.sort()
+    print(f"steady state: {rate}/s for {seconds}s simulated, {added} players, {mm.matches} lobbies, {len(mm)} still waiting")
+    print(f"  queue time   p50 {pct(waits, 50):6.1f}s  p90 {pct(waits, 90):6.1f}s  p99 {pct(waits, 99):6.1f}s  max {waits[-1] if waits else 0:6.1f}s")
+    print(f"  level spread mean {sum(spreads) / max(len(spreads), 1):.2f}  max {max(spreads, default=0)}")
+    print(f"  add          {adding / max(added, 1) * 1e6:6.2f} us per player (matching included)")
+    print(f"  sweep        {sweeping / seconds * 1e6:6.1f} us per sweep")
+    print(f"  throughput   {mm.matched / (adding + sweeping):,.0f} players matched per second of matchmaker time")
+
+
+def backlog(count, wait, seed):
+    rnd = random.Random(seed)
+    clock = Clock()
+    mm = Matchmaker(clock=clock)
+    t0 = time.perf_counter()
+    for i in range(count):
+        clock.now = rnd.uniform(0, wait)
+        mm.add(f"p{i}", None, level(rnd), pick(rnd, DIFFICULTIES), pick(rnd, SIZES), match=False)
+    took = time.perf_counter() - t0
+    clock.now = wait
+    t0 = time.perf_counter()
+    groups = mm.sweep()
+    swept = time.perf_counter() - t0
+    placed = sum(len(g) for g in groups)
+    print(f"backlog: {count} queued over {wait:.0f}s without matching")
+    print(f"  queueing     {took / count * 1e6:6.2f} us per player")
+    print(f"  one sweep    {swept * 1e3:6.1f} ms: {len(groups)} lobbies, {placed} players ({placed / swept:,.0f} players/s), "
+          f"{len(mm)} left")
+    t0 = time.perf_counter()
+    mm.sweep()
+    print(f"  idle sweep   {(time.perf_counter() - t0) * 1e6:6.1f} us with {len(mm)} waiting")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rate", type=float, default=200, help="arrivals per simulated second")
+    ap.add_argument("--seconds", type=int, default=600, help="simulated seconds")
+    ap.add_argument("--backlog", type=int, default=50000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    steady(args.rate, args.seconds, args.seed)
+    for rate in (2, 20):
+        steady(rate, args.seconds, args.seed)
+    backlog(args.backlog, 60.0, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Metrics overhead benchmark
+- plays 2-player games straight through GameServer.handle_request (status + move per turn, no
+  sockets; replies are encoded and dropped) with metrics on and off, best of a few rounds each
+- the difference per request is what the instrumentation costs: a request timing, lobby and
+  server locks that are TimedLocks, and the broadcast timing
+- also times bare uncontended acquire/release of a Lock and a TimedLock
+
+usage: python benchmarks/bench_metrics.py [--games 2000] [--rounds 5]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+with redirect_stdout(io.StringIO()):
+    import main as server_main  # prints the logo on import
+from codec import BINARY
+from connection import Connection
+from metrics import Histogram, TimedLock
+
+
+class NullConn(Connection):
+    # replies are encoded like a real connection's, then dropped
+    def __init__(self):
+        super().__init__(None)
+        self.codec = BINARY
+        self.deltas = True
+        self.chat_batches = True
+
+    def sendall(self, frame, kind=None):
+        return True
+
+
+def run(games, metrics, seed=3):
+    # (microseconds per request, requests)
+    server = server_main.GameServer("127.0.0.1", 0, "bench", 2, 10, "easy", metrics=metrics)
+    rnd = random.Random(seed)
+    conns = {"a": NullConn(), "b": NullConn()}
+    lobby, _ = server.create_lobby("a", 2, "easy")
+    lid = lobby.lobby_id
+    for u, c in conns.items():
+        server.handle_request(c, u, {"action": "join_lobby", "lobby_id": lid})
+    requests = 0
+    t0 = time.perf_counter()
+    for _ in range(games):
+        server.handle_request(conns["a"], "a", {"action": "start_lobby", "lobby_id": lid})
+        requests += 1
+        while lobby.started:
+            u = lobby.current_turn_username()
+            server.handle_request(conns[u], u, {"action": "status", "lobby_id": lid})
+            opts = lobby.playable(lobby.hands[u])
+            sides = [s for s in ("left", "right") if opts[s]]
+            if sides:
+                side = rnd.choice(sides)
+                req = {"action": "move", "lobby_id": lid, "move": rnd.choice(opts[side]), "side": side}
+            else:
+                req = {"action": "move", "lobby_id": lid, "move": "pass"}
+            server.handle_request(conns[u], u, req)
+            requests += 2
+    took = time.perf_counter() - t0
+    server.shutdown()
+    return took / requests * 1e6, requests
+
+
+def lock_cost(lock, n=1000000):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with lock:
+            pass
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=2000)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+    best = {False: None, True: None}
+    for _ in range(args.rounds):
+        for enabled in (False, True):  # alternate so drift hits both alike
+            us, requests = run(args.games, enabled)
+            best[enabled] = us if best[enabled] is None else min(best[enabled], us)
+    off, on = best[False], best[True]
+    print(f"{args.games} games ({requests} requests) per round, best of {args.rounds}")
+    print(f"metrics off  {off:8.2f} us/request")
+    print(f"metrics on   {on:8.2f} us/request   ({on - off:+.2f} us, {(on - off) / off:+.1%})")
+    print(f"uncontended lock: Lock {lock_cost(threading.Lock()):.0f} ns, TimedLock {lock_cost(TimedLock(Histogram())):.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
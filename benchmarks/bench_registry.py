@@ -0,0 +1,127 @@
+"""
+Lobby registry contention benchmark: one global lock vs the sharded registry
+- N worker threads hammer a registry holding a few hundred lobbies with the server's mix of
+  lookups, seat/unseat, finished-game stat updates and the occasional full listing
+- GlobalRegistry below reproduces the old layout (plain dicts behind one server lock)
+- under the GIL the win is mostly less lock convoying, not parallel speedup; expect the gap to
+  grow with thread count rather than a large single-thread difference
+
+usage: python benchmarks/bench_registry.py [--lobbies 400] [--ops 200000] [--threads 1,2,4,8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from registry import LobbyRegistry, StatsTable
+
+
+class FakeLobby:
+    def __init__(self, lobby_id):
+        self.lobby_id = lobby_id
+        self.players = [object()]
+
+    def empty(self):
+        return not self.players
+
+
+class GlobalRegistry:
+    # the pre-sharding layout: everything behind one lock
+    def __init__(self, max_lobbies):
+        self.max_lobbies = max_lobbies
+        self.lobbies = {}
+        self.stats = {}
+        self.seats = {}
+        self.lock = threading.Lock()
+
+    def add(self, lobby):
+        with self.lock:
+            self.lobbies[lobby.lobby_id] = lobby
+
+    def get(self, lid):
+        with self.lock:
+            return self.lobbies.get(lid)
+
+    def seat(self, conn, lid):
+        with self.lock:
+            self.seats.setdefault(conn, set()).add(lid)
+
+    def unseat(self, conn, lid):
+        with self.lock:
+            self.seats.get(conn, set()).discard(lid)
+
+    def values(self):
+        with self.lock:
+            return list(self.lobbies.values())
+
+    def record_game(self, winner, players):
+        with self.lock:
+            for u in players:
+                s = self.stats.setdefault(u, {"wins":0,"games":0})
+                s["games"] += 1
+                if u == winner:
+                    s["wins"] += 1
+
+
+class Sharded:
+    def __init__(self, max_lobbies):
+        self.reg = LobbyRegistry(max_lobbies)
+        self.stats = StatsTable()
+        self.add, self.get, self.values = self.reg.add, self.reg.get, self.reg.values
+        self.seat, self.unseat = self.reg.seat, self.reg.unseat
+        self.record_game = self.stats.record_game
+
+
+def worker(reg, n_lobbies, ops, seed):
+    rnd = random.Random(seed)
+    conn = object()
+    names = [f"p{seed}_{i}" for i in range(4)]
+    for i in range(ops):
+        r = rnd.random()
+        lid = rnd.randint(1, n_lobbies)
+        if r < 0.70:
+            reg.get(lid)
+        elif r < 0.90:
+            reg.seat(conn, lid)
+            reg.unseat(conn, lid)
+        elif r < 0.999:
+            reg.record_game(names[i & 3], names)
+        else:
+            reg.values()
+
+
+def run(make, n_lobbies, ops, threads):
+    reg = make(n_lobbies)
+    for lid in range(1, n_lobbies + 1):
+        reg.add(FakeLobby(lid))
+    per = ops // threads
+    ts = [threading.Thread(target=worker, args=(reg, n_lobbies, per, s)) for s in range(threads)]
+    start = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return per * threads / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lobbies", type=int, default=400)
+    ap.add_argument("--ops", type=int, default=200000)
+    ap.add_argument("--threads", default="1,2,4,8")
+    args = ap.parse_args()
+    sys.setswitchinterval(0.0005)  # switch often, like a busy server with many client threads
+    print(f"{'threads':>7} {'global ops/s':>13} {'sharded ops/s':>14}")
+    for n in (int(x) for x in args.threads.split(",")):
+        g = run(GlobalRegistry, args.lobbies, args.ops, n)
+        s = run(Sharded, args.lobbies, args.ops, n)
+        print(f"{n:>7} {g:>13.0f} {s:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
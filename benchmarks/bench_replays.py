@@ -0,0 +1,112 @@
+"""
+Replay archive benchmark
+- archiving: random legal games (any legal tile, else a pass) played on engine.GameState, each
+  recorded move by move and appended to a fresh archive; reports what recording adds per move,
+  the append per game and the bytes per game
+- reopening: the time to map the archive and rebuild its lobby/player/time index
+- checking: verify() over the whole archive with one worker and with the pool, with and without
+  re-dealing from the seeds, in games per minute; plus rerun() on GameState for comparison
+
+usage: python benchmarks/bench_replays.py [--games 200000] [--players 4] [--max-pip 6] [--workers N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from engine import DEAL_SIZES, GameState
+from replays import GameRecord, ReplayArchive, check, rerun, verify
+
+
+def play(i, players, max_pip, per_hand, record=True):
+    # one random legal game; (GameRecord or None, winner, blocked, moves)
+    rnd = random.Random(i)
+    names = [f"p{n}" for n in range(players)]
+    seed = rnd.getrandbits(64)
+    game = GameState(max_pip, names)
+    game.start(per_hand, random.Random(seed).random)
+    rec = GameRecord(i % 1000 + 1, seed, max_pip, per_hand, names, [game.hands[u].mask for u in names]) if record else None
+    moves = 0
+    while True:
+        u = game.current_turn_username()
+        opts = game.playable(game.hands[u])
+        sides = [s for s in ("left", "right") if opts[s]]
+        if sides:
+            side = rnd.choice(sides)
+            placed, side = game.play(u, rnd.choice(opts[side]), side)
+            if rec:
+                rec.play(placed, side)
+        else:
+            game.pass_turn()
+            if rec:
+                rec.pass_turn()
+        moves += 1
+        outcome = game.result()
+        if outcome:
+            return rec, outcome["winner"], bool(outcome.get("blocked")), moves
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=200000)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--max-pip", type=int, default=6)
+    ap.add_argument("--difficulty", default="easy", help="deal size, by lobby difficulty")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+    per_hand = DEAL_SIZES[args.difficulty]
+    sample = min(args.games, 20000)
+
+    t0 = time.perf_counter()
+    moves = sum(play(i, args.players, args.max_pip, per_hand, False)[3] for i in range(sample))
+    bare = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(sample):
+        play(i, args.players, args.max_pip, per_hand)
+    recorded = time.perf_counter() - t0
+    print(f"{args.players} players, double-{args.max_pip}, {per_hand} tiles per hand, {moves / sample:.1f} moves per game")
+    print(f"recording             {(recorded - bare) / moves * 1e6:8.2f} us per move")
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "games.dzr")
+        archive = ReplayArchive(path)
+        adding = 0.0
+        for i in range(args.games):
+            rec, winner, blocked, _ = play(i, args.players, args.max_pip, per_hand)
+            t0 = time.perf_counter()
+            archive.add(rec, winner, blocked)
+            adding += time.perf_counter() - t0
+        size = archive.size()
+        archive.close()
+        print(f"archive add           {adding / args.games * 1e6:8.2f} us per game, {size / args.games:.0f} bytes per game "
+              f"({size / 1e6:.1f} MB for {args.games} games)")
+
+        archive = ReplayArchive(path)
+        print(f"reopen + index        {archive.load_time:8.2f} s, {len(archive.by_player)} players")
+        t0 = time.perf_counter()
+        recs = [archive.get(g) for g in range(1, sample + 1)]
+        took = time.perf_counter() - t0
+        print(f"get + parse           {took / sample * 1e6:8.2f} us per game")
+        t0 = time.perf_counter()
+        for rec in recs:
+            rerun(rec)
+        print(f"rerun on GameState    {sample / (time.perf_counter() - t0) * 60 / 1e6:8.2f} M games/min (1 process)")
+        t0 = time.perf_counter()
+        bad = sum(check(rec) is not None for rec in recs)
+        print(f"check                 {sample / (time.perf_counter() - t0) * 60 / 1e6:8.2f} M games/min (1 process){', %d bad' % bad if bad else ''}")
+        archive.close()
+
+        for workers in sorted({1, args.workers}):
+            for seed in (True, False):
+                games, bad, took = verify(path, workers, seed)
+                print(f"verify {workers:>2} worker(s){'' if seed else ', no re-deal':14} {games / took * 60 / 1e6:8.2f} M games/min "
+                      f"({games} games in {took:.1f}s, {len(bad)} bad)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Spectator fan-out benchmark
+- one 4-player lobby plays random legal games; every move goes out through
+  Lobby.broadcast_event, with a growing number of spectators watching
+- "feed": spectators in the lobby's Feed (the server's way). Reports what each update costs
+  the seated path (the time under the lobby lock) and how fast the fan-out thread then queues
+  the frames on the spectators' connections
+- "seated": the same spectators put in Lobby.players, i.e. fanned out under the lobby lock like
+  players, for comparison
+- connections are sinks that count frames: the socket writes happen on each connection's own
+  writer either way, so what is timed is the fan-out itself
+- the fan-out thread runs alongside the publishing thread, so under the GIL the feed's
+  per-update figure includes some waiting for the interpreter; it stays flat as spectators grow
+
+usage: python benchmarks/bench_spectators.py [--spectators 0,10,100,1000] [--moves 5000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from codec import CODECS
+from engine import DEAL_SIZES
+from spectators import Feed, Hub
+
+with contextlib.redirect_stdout(io.StringIO()):  # main.py prints its logo on import
+    from main import Lobby
+
+
+class Sink:
+    # stands in for a Connection: counts the frames queued on it
+    bot = False
+    closed = False
+
+    def __init__(self, codec="dz1", deltas=True):
+        self.codec = CODECS[codec]
+        self.deltas = deltas
+        self.chat_batches = True
+        self.frames = 0
+        self.last = 0.0
+
+    def sendall(self, frame, kind=None):
+        self.frames += 1
+        self.last = time.perf_counter()
+        return True
+
+
+def run(spectators, moves, seated, hub, seed):
+    rnd = random.Random(seed)
+    names = [f"p{i}" for i in range(4)]
+    lobby = Lobby(1, 4, "easy", names[0])
+    lobby.players = [(Sink(), u, None) for u in names]
+    lobby.player_names = list(names)
+    watchers = [Sink() for _ in range(spectators)]
+    if seated:
+        lobby.players += [(w, f"s{i}", None) for i, w in enumerate(watchers)]
+    else:
+        lobby.feed = Feed(hub, lobby.lobby_id)
+        for w in watchers:
+            lobby.feed.add(w, b"", spectators)
+    done = 0
+    under_lock = 0.0
+    t_start = time.perf_counter()
+    while done < moves:
+        lobby.reset()
+        lobby.start(DEAL_SIZES["easy"], rnd.random)
+        while not lobby.result() and done < moves:
+            u = lobby.current_turn_username()
+            opts = lobby.playable(lobby.hands[u])
+            sides = [s for s in ("left", "right") if opts[s]]
+            if sides:
+                side = rnd.choice(sides)
+                placed, side = lobby.play(u, rnd.choice(opts[side]), side)
+                event = {"placed_by": u, "placed_tile": placed, "side": side, "hand_size": len(lobby.hands[u])}
+            else:
+                lobby.pass_turn()
+                event = {"passed_by": u}
+            t0 = time.perf_counter()
+            lobby.broadcast_event(event)
+            under_lock += time.perf_counter() - t0
+            done += 1
+    t_published = time.perf_counter()
+    want = moves + (0 if seated else 1)  # plus the (empty) snapshot frame
+    while watchers and any(w.frames < want for w in watchers):
+        time.sleep(0.001)
+    t_end = max([w.last for w in watchers], default=t_published)
+    return under_lock / moves, max(t_end, t_published) - t_start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--spectators", default="0,10,100,1000")
+    ap.add_argument("--moves", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    hub = Hub()
+    print(f"{args.moves} updates per run, 4 seated players")
+    print(f"{'spectators':>10} {'mode':>7} {'lock us/update':>15} {'fan-out done in':>16} {'spectator frames/s':>19}")
+    for n in map(int, args.spectators.split(",")):
+        for seated in (False, True):
+            per_update, took = run(n, args.moves, seated, hub, args.seed)
+            rate = n * args.moves / took if n else 0
+            print(f"{n:>10} {'seated' if seated else 'feed':>7} {per_update * 1e6:15.1f} {took:15.2f}s {rate:19,.0f}")
+    hub.close()
+
+
+if __name__ == "__main__":
+    main()
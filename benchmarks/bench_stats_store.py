@@ -0,0 +1,102 @@
+"""
+Stats store benchmark
+- hot path: cost of recording one finished game with the write-behind queue vs writing (and
+  fsyncing) it synchronously, for both backends
+- recovery: time to load N players back at startup (LogStore: snapshot + a log tail; SQLite: one
+  table scan) and to fill the server's StatsTable from it
+
+usage: python benchmarks/bench_stats_store.py [--players 1000000] [--games 2000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+from registry import StatsTable
+from stats_store import LogStore, SqliteStore, StatsWriter
+
+
+def games(n, players, seed=3):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        names = [f"player{rnd.randrange(players)}" for _ in range(4)]
+        out.append((names[0], names))
+    return out
+
+
+def hot_path(make, results):
+    # synchronous: one apply + fsync per game, what writing in the move handler would cost
+    store = make()
+    store.load()
+    start = time.perf_counter()
+    for winner, names in results:
+        store.apply({u: (int(u == winner), 1) for u in names}, sync=True)
+    sync_us = (time.perf_counter() - start) / len(results) * 1e6
+    store.close()
+    store = make()
+    store.load()
+    writer = StatsWriter(store)
+    start = time.perf_counter()
+    for winner, names in results:
+        writer.record(winner, names)
+    queued_us = (time.perf_counter() - start) / len(results) * 1e6
+    start = time.perf_counter()
+    writer.close()
+    drain = time.perf_counter() - start
+    return sync_us, queued_us, drain
+
+
+def recovery(make, players, tail):
+    store = make()
+    store.load()
+    store.apply({f"player{i}": (i % 7, i % 13 + 1) for i in range(players)})
+    store.compact()
+    store.apply({f"player{i}": (1, 1) for i in range(tail)})
+    store.close()
+    gc.disable()  # as GameServer does while loading
+    start = time.perf_counter()
+    store = make()
+    totals = store.load()
+    loaded = time.perf_counter() - start
+    table = StatsTable()
+    start = time.perf_counter()
+    table.load(totals)
+    filled = time.perf_counter() - start
+    gc.enable()
+    assert len(table) == players and table.get("player0")["games"] == 2
+    store.close()
+    return loaded, filled
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=1000000)
+    ap.add_argument("--tail", type=int, default=100000, help="log records after the last snapshot")
+    ap.add_argument("--games", type=int, default=2000)
+    args = ap.parse_args()
+    results = games(args.games, args.players)
+    with tempfile.TemporaryDirectory() as d:
+        backends = [("log", lambda: LogStore(os.path.join(d, "stats"))),
+                    ("sqlite", lambda: SqliteStore(os.path.join(d, "stats.db")))]
+        print(f"{'backend':<8} {'sync us/game':>13} {'queued us/game':>15} {'drain s':>8}")
+        for name, make in backends:
+            sync_us, queued_us, drain = hot_path(make, results)
+            print(f"{name:<8} {sync_us:>13.1f} {queued_us:>15.2f} {drain:>8.3f}")
+        for f in os.listdir(d):
+            os.remove(os.path.join(d, f))
+        print(f"\nrecovery of {args.players} players ({args.tail} log records after the snapshot)")
+        print(f"{'backend':<8} {'load s':>8} {'fill s':>8}")
+        for name, make in backends:
+            loaded, filled = recovery(make, args.players, args.tail)
+            print(f"{name:<8} {loaded:>8.2f} {filled:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Scaling benchmark: supervisor mode with 1..N worker processes
+- starts the supervisor (supervisor.py) with W workers in a child process on a free local port
+- plays G concurrent 2-player games for a fixed time from one or more load processes and reports
+  moves/sec per worker count; host and guest of a game usually hash to different workers, so
+  most guests are moved to the lobby's worker when they join
+- the load generator shares the machine: on a small box it competes with the workers for the
+  same cores, use --clients to spread it over more processes on a bigger one
+
+usage: python benchmarks/bench_supervisor.py [--workers 1,2,4] [--games 50] [--seconds 10] [--clients 1]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_engines import free_port, play_games, raise_fd_limit
+
+
+def serve(workers, port):
+    # child process: run the supervisor until killed
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as server_main  # prints the logo on import
+    from supervisor import Supervisor
+
+    def make_server(cluster):
+        return server_main.GameServer("127.0.0.1", port, "bench", 2, cluster.worker_lobbies, "normal", cluster=cluster)
+
+    Supervisor(make_server, workers, "127.0.0.1", port, 1000000).start()
+
+
+def load(task):
+    # one load process: its share of the games until the deadline; returns moves made
+    port, first, games, seconds = task
+    counter = [0]
+
+    async def run():
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(play_games(port, g, deadline, counter) for g in range(first, first + games)))
+
+    asyncio.run(run())
+    return counter[0]
+
+
+def bench_workers(workers, args):
+    port = free_port()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(workers), "--port", str(port)],
+                             stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        share = -(-args.games // args.clients)
+        tasks = [(port, i, min(share, args.games - i), args.seconds) for i in range(0, args.games, share)]
+        t0 = time.perf_counter()
+        with Pool(len(tasks)) as pool:
+            moves = sum(pool.map(load, tasks))
+        return moves / (time.perf_counter() - t0)
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default=",".join(str(w) for w in sorted({1, 2, os.cpu_count() or 1})))
+    ap.add_argument("--games", type=int, default=50)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--clients", type=int, default=1, help="load generator processes")
+    ap.add_argument("--serve", type=int)
+    ap.add_argument("--port", type=int)
+    args = ap.parse_args()
+    raise_fd_limit()
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    print(f"{args.games} concurrent games for {args.seconds}s, {args.clients} load process(es), {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'moves/s':>10} {'speedup':>8}")
+    base = None
+    for workers in map(int, args.workers.split(",")):
+        mps = bench_workers(workers, args)
+        base = base or mps
+        print(f"{workers:>8} {mps:>10.0f} {mps / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Tournament benchmark: a round of hundreds of tables finishing at once
+- an in-process GameServer (no sockets; players are connections that swallow frames) runs a
+  bracket of --players entrants at 2 seats per table, so round 1 is players/2 tables
+- the server's timer wheel is stopped and tournament_tick driven by hand, so every pass is timed
+- seating: passes and the longest pass to make, seat and start round 1
+- finishing: every table's game is played out through the move action; reports the cost of
+  the game_over hook, then the passes that take in the results and seat round 2
+- the same with an unbounded batch (one pass does everything), i.e. the stall batching avoids
+- standings: the incremental update per game against re-sorting every row after each game
+
+usage: python benchmarks/bench_tournaments.py [--players 1000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+
+with contextlib.redirect_stdout(io.StringIO()):  # main.py prints its logo on import
+    import main as server_main
+from codec import CODECS
+from tournaments import Standings
+
+
+class Sink:
+    # stands in for a Connection
+    bot = False
+    closed = False
+    deltas = True
+    chat_batches = True
+
+    def __init__(self, name):
+        self.codec = CODECS["dz1"]
+        self.session = f"s-{name}"
+        self.migrate_to = None
+
+    def sendall(self, frame, kind=None):
+        return True
+
+    def send_message(self, payload, kind=None):
+        return True
+
+
+def drive(server, until):
+    # run tournament passes until until() holds; (passes, longest pass, total)
+    passes, longest, total = 0, 0.0, 0.0
+    while not until():
+        t0 = time.perf_counter()
+        server.tournament_tick()
+        took = time.perf_counter() - t0
+        passes += 1
+        longest = max(longest, took)
+        total += took
+    return passes, longest, total
+
+
+def play_out(server, t, conns, rnd):
+    # play every table of t's current round to its end with random legal moves
+    moves = 0
+    for lid in list(t.lobbies.values()):
+        lobby = server.lobbies.get(lid)
+        while lobby.started:
+            u = lobby.current_turn_username()
+            opts = lobby.playable(lobby.hands[u])
+            sides = [s for s in ("left", "right") if opts[s]]
+            if sides:
+                side = rnd.choice(sides)
+                req = {"action": "move", "lobby_id": lid, "move": rnd.choice(opts[side]), "side": side}
+            else:
+                req = {"action": "move", "lobby_id": lid, "move": "pass"}
+            server.handle_request(conns[u], u, req)
+            moves += 1
+    return moves
+
+
+def run(players, batch, seed):
+    server_main.TABLE_BATCH = batch
+    server = server_main.GameServer("127.0.0.1", 0, "bench", 2, players, "easy", idle_timeout=0)
+    server.timers.close()  # passes are driven below
+    names = [f"p{i}" for i in range(players)]
+    conns = {}
+    for u in names:
+        conns[u] = c = Sink(u)
+        server.clients[c] = (u, server.stats.ref(u))
+        server.sessions[u] = c.session
+        server.live[c.session] = c
+    t = server.tournaments.create("bench", "bracket", names, 2, {"difficulty": "easy", "turn_seconds": 0})
+    with server.tournaments.lock:
+        server.tournaments.start_round(t)
+    tables = len(t.tables)
+    seat = drive(server, lambda: not server.tournaments.to_seat)
+
+    rnd = random.Random(seed)
+    hook = server.end_game_if_over
+    hooked = [0.0, 0]
+
+    def timed(lobby):
+        t0 = time.perf_counter()
+        over = hook(lobby)
+        if over:
+            hooked[0] += time.perf_counter() - t0
+            hooked[1] += 1
+        return over
+    server.end_game_if_over = timed
+    moves = play_out(server, t, conns, rnd)
+    finish = drive(server, lambda: t.round == 2 and not server.tournaments.to_seat and not server.tournaments.results)
+    server.shutdown()
+    return tables, seat, moves, hooked, finish
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--players", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    for batch in (server_main.TABLE_BATCH, 1 << 30):
+        tables, seat, moves, hooked, finish = run(args.players, batch, args.seed)
+        label = f"batch {batch}" if batch < 1 << 30 else "unbatched"
+        print(f"{label}: {args.players} players, {tables} tables in round 1")
+        print(f"  seat round 1        {seat[0]:3d} passes, longest {seat[1] * 1e3:7.1f} ms, total {seat[2] * 1e3:7.1f} ms")
+        print(f"  game_over           {hooked[0] / max(hooked[1], 1) * 1e6:7.1f} us per table ({hooked[1]} games, {moves} moves)")
+        print(f"  results + round 2   {finish[0]:3d} passes, longest {finish[1] * 1e3:7.1f} ms, total {finish[2] * 1e3:7.1f} ms")
+
+    rnd = random.Random(args.seed)
+    names = [f"p{i}" for i in range(args.players)]
+    games = [(rnd.sample(names, 2), rnd.random()) for _ in range(args.players // 2)]
+    st = Standings(names)
+    t0 = time.perf_counter()
+    for pair, r in games:
+        st.record(pair, pair[r < 0.5], {pair[0]: 10, pair[1]: 20})
+    incremental = time.perf_counter() - t0
+    rows = {u: [0, 0, 0] for u in names}
+    t0 = time.perf_counter()
+    for pair, r in games:
+        winner = pair[r < 0.5]
+        for u, p in zip(pair, (10, 20)):
+            rows[u][0] += u == winner
+            rows[u][1] += 1
+            rows[u][2] += p
+        sorted(rows, key=lambda u: (-rows[u][0], rows[u][2], rows[u][1], u))
+    full = time.perf_counter() - t0
+    print(f"standings ({args.players} players): incremental {incremental / len(games) * 1e6:.1f} us per game, "
+          f"full re-sort {full / len(games) * 1e6:.1f} us per game")
+
+
+if __name__ == "__main__":
+    main()
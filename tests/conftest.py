@@ -0,0 +1,63 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+
+with contextlib.redirect_stdout(io.StringIO()):  # main.py prints its logo on import
+    import main as server_main
+from codec import CODECS
+
+
+class Sink:
+    # stands in for a Connection: keeps every message sent to it, decoded
+    bot = False
+    closed = False
+    bytes_in = bytes_out = 0
+
+    def __init__(self, name, deltas=True, chat_batches=True):
+        self.codec = CODECS["dz1"]
+        self.session = f"s-{name}"
+        self.migrate_to = None
+        self.deltas = deltas
+        self.chat_batches = chat_batches
+        self.sent = []
+
+    def sendall(self, frame, kind=None):
+        self.sent.append(self.codec.decode(frame[4:]))
+        return True
+
+    def send_message(self, payload, kind=None):
+        self.sent.append(payload)
+        return True
+
+    def depth(self):
+        return 0
+
+    def got(self, key):
+        # the values under key of every message sent so far, oldest first
+        return [m[key] for m in list(self.sent) if isinstance(m, dict) and key in m]
+
+
+@pytest.fixture
+def server(request):
+    # an in-process server without sockets; parametrize indirectly with GameServer keyword arguments
+    server = server_main.GameServer("127.0.0.1", 0, "test", 4, 10, "easy", idle_timeout=0, **getattr(request, "param", {}))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def login(server):
+    # login(name, **Sink flags): a connection registered as a hello would
+    def login(name, **flags):
+        conn = Sink(name, **flags)
+        server.clients[conn] = (name, server.stats.ref(name))
+        server.sessions[name] = conn.session
+        server.live[conn.session] = conn
+        return conn
+    return login
@@ -0,0 +1,44 @@
+import pytest
+
+# every test runs on a server without an admin token and on one with
+pytestmark = pytest.mark.parametrize("server", [{"admin_token": None}, {"admin_token": "s3cret"}], indirect=True, ids=["no-token", "token"])
+
+
+@pytest.fixture
+def ask(server, login):
+    # ask(req): the reply a logged-in player gets to req
+    conn = login("ana")
+
+    def ask(req):
+        server.handle_request(conn, "ana", req)
+        return conn.sent[-1]
+    return ask
+
+
+def test_stats_is_open_only_without_a_token(server, ask):
+    reply = ask({"action": "stats"})
+    assert ("stats" in reply) == (server.admin_token is None)
+    assert "stats" in ask({"action": "stats", "token": server.admin_token})
+
+
+def test_profile_needs_a_configured_token(server, ask):
+    assert ask({"action": "profile", "enabled": True}) == {"error": "Not allowed"}
+    assert ask({"action": "profile", "enabled": True, "token": None}) == {"error": "Not allowed"}
+    reply = ask({"action": "profile", "enabled": True, "token": server.admin_token})
+    if server.admin_token is None:
+        assert reply == {"error": "Not allowed"}
+        assert not server.profiler.enabled
+    else:
+        assert reply["profile"]["enabled"]
+
+
+@pytest.mark.parametrize("op", ["create", "seat", "advance"])
+def test_tournament_admin_ops_need_a_configured_token(server, ask, op):
+    req = {"action": "tournament", "op": op, "id": 1, "name": "cup", "players": ["ana", "bo"], "seats": 2}
+    assert ask(req) == {"error": "Not allowed"}
+    reply = ask(dict(req, token=server.admin_token))
+    assert (reply == {"error": "Not allowed"}) == (server.admin_token is None)
+
+
+def test_anyone_may_list_tournaments(server, ask):
+    assert ask({"action": "tournament", "op": "list"}) == {"tournaments": []}
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+import bots
+
+
+def broken(view, budget, rnd):
+    raise RuntimeError("search blew up")
+
+
+def table(server, login, difficulty):
+    host = login("ana")
+    lobby, _ = server.create_lobby("ana", difficulty=difficulty, turn_seconds=0)
+    server.handle_request(host, "ana", {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    server.handle_request(host, "ana", {"action": "add_bot", "lobby_id": lobby.lobby_id})
+    return host, lobby
+
+
+def finishes(server, host, lobby, timeout=5):
+    # the host passes whenever it is their turn; does the game get to its end?
+    server.handle_request(host, "ana", {"action": "start_lobby", "lobby_id": lobby.lobby_id})
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        with lobby.lock:
+            if not lobby.started:
+                return True
+            turn = lobby.current_turn_username()
+        if turn == "ana":
+            server.handle_request(host, "ana", {"action": "move", "lobby_id": lobby.lobby_id, "move": "pass"})
+        else:
+            time.sleep(0.005)
+    return False
+
+
+@pytest.mark.parametrize("difficulty", ["easy", "hard"])
+def test_failing_strategy_passes_instead_of_hanging(server, login, monkeypatch, difficulty):
+    monkeypatch.setitem(bots.STRATEGIES, difficulty, broken)
+    host, lobby = table(server, login, difficulty)
+    assert finishes(server, host, lobby)
+    assert any(where == "bot" for _, where, _ in server.metrics.recent_errors)
+
+
+def not_held(view, budget, rnd):
+    # a tile the bot does not have, which the move handler refuses
+    tid = bots._bits(((1 << len(view.ts.tiles)) - 1) & ~view.hand)[0]
+    return tid, "left"
+
+
+def test_refused_move_falls_back_to_a_pass(server, login, monkeypatch):
+    monkeypatch.setitem(bots.STRATEGIES, "easy", not_held)
+    host, lobby = table(server, login, "easy")
+    assert finishes(server, host, lobby)
+    assert lobby.players[1][0].last_error
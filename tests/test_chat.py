@@ -0,0 +1,38 @@
+import time
+
+
+def wait_for_chat(*conns):
+    end = time.monotonic() + 2
+    while not all(c.got("chat") for c in conns) and time.monotonic() < end:
+        time.sleep(0.01)
+
+
+def test_chat_format_follows_chat_batches_not_deltas(server, login):
+    # deltas and chat_batches are separate promises: each client gets the chat it said it reads
+    conns = {
+        "new": login("new"),
+        "deltas_only": login("deltas_only", chat_batches=False),
+        "batches_only": login("batches_only", deltas=False),
+    }
+    lobby, _ = server.create_lobby("new")
+    for name, conn in conns.items():
+        server.handle_request(conn, name, {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    watcher = login("watcher", chat_batches=False)
+    server.handle_request(watcher, "watcher", {"action": "spectate", "lobby_id": lobby.lobby_id})
+    server.handle_request(conns["new"], "new", {"action": "chat", "lobby_id": lobby.lobby_id, "text": "hi"})
+    wait_for_chat(watcher, *conns.values())
+    assert conns["new"].got("chat")[-1]["messages"][0][1:3] == ["new", "hi"]
+    assert conns["batches_only"].got("chat")[-1]["messages"][0][1:3] == ["new", "hi"]
+    assert conns["deltas_only"].got("chat")[-1] == "new: hi"
+    assert watcher.got("chat")[-1] == "new: hi"
+
+
+def test_history_on_join_follows_chat_batches(server, login):
+    host = login("host")
+    lobby, _ = server.create_lobby("host")
+    server.handle_request(host, "host", {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    server.handle_request(host, "host", {"action": "chat", "lobby_id": lobby.lobby_id, "text": "earlier"})
+    wait_for_chat(host)
+    late = login("late", chat_batches=False)
+    server.handle_request(late, "late", {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    assert late.got("chat") == ["host: earlier"]
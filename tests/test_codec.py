@@ -0,0 +1,150 @@
+import os
+import pickle
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+
+from codec import BINARY, BINARY_2, CODECS, PICKLE, STRINGS, STRINGS_2, CodecError, codec_for_frame, negotiate
+
+MESSAGES = [
+    {"action": "hello", "username": "ana", "codecs": ["dz1", "pickle"]},
+    {"action": "move", "lobby_id": 3, "move": (6, 4), "side": "left", "chat": "gg"},
+    {"action": "move", "lobby_id": 3, "move": "pass"},
+    {"update": {"seq": 41, "placed_by": "bo", "placed_tile": (12, 15), "side": "right", "hand_size": 0, "turn": None}},
+    {"game_start": {"your_hand": [(0, 0), (3, 5), (15, 15)], "chain": [], "hands_sizes": {"ana": 7, "bo": 7}}},
+    {"game_over": {"winner": "ana", "sums": {"ana": 0, "bo": 23}, "blocked": False, "game": 2 ** 64 - 1}},
+    {"status": {"turn": "bo", "deadline": 1792333731.5, "playable": {"left": [], "right": [(1, 2)]}}},
+    {"error": "Lobby not found", "codes": [-1, -128, 128, -2 ** 63, 2 ** 63], "nested": [[[(), ()]]]},
+    {"chat": {"lobby_id": 1, "messages": [[1, "zoë", "héllo ✓", 1792333731.88]]}},
+    {"intmap": {"a": 0, "b": 127, "c": 128, "d": 2 ** 40}, "mixed": {"a": -1, 2: "x"}},
+    [], (), {}, "", None, True, False, 0, -1, 0.0, [(16, 0)], (1, 2, 3),
+]
+
+
+@pytest.mark.parametrize("codec", [BINARY_2, BINARY, PICKLE], ids=lambda c: c.name)
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_round_trip(codec, msg):
+    frame = codec.encode(msg)
+    assert codec_for_frame(frame) is codec
+    assert codec.decode(frame) == msg
+
+
+def test_tables_only_grow():
+    assert STRINGS_2[:len(STRINGS)] == STRINGS
+    assert len(STRINGS_2) <= 256
+
+
+def test_dz2_sends_later_keys_as_references():
+    msg = {"update": {"seq": 41, "passed_by": "bo", "turn": "ana", "deadline": 1.5}}
+    assert len(BINARY_2.encode(msg)) <= len(BINARY.encode(msg)) - len("seqpassed_bydeadline")
+    assert BINARY_2.decode(BINARY_2.encode(msg)) == BINARY.decode(BINARY.encode(msg)) == msg
+
+
+def test_versions_do_not_read_each_other():
+    with pytest.raises(CodecError):
+        BINARY.decode(BINARY_2.encode({"seq": 1}))
+    with pytest.raises(CodecError):
+        BINARY_2.decode(BINARY.encode({"seq": 1}))
+
+
+def test_dz1_keeps_tiles_and_lists_apart():
+    assert BINARY.decode(BINARY.encode([(1, 2), (3, 4)])) == [(1, 2), (3, 4)]
+    assert type(BINARY.decode(BINARY.encode((1, 2)))) is tuple
+    assert type(BINARY.decode(BINARY.encode([1, 2]))) is list
+
+
+def test_dz1_refuses_what_it_cannot_encode():
+    for value in ({1, 2}, b"raw", object(), 1 << 70, {"k": 1 << 70}):
+        with pytest.raises(CodecError):
+            BINARY.encode(value)
+
+
+def test_client_copy_is_identical():
+    with open(os.path.join(ROOT, "Server", "codec.py"), "rb") as a, open(os.path.join(ROOT, "Client", "codec.py"), "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_negotiate():
+    assert negotiate(["pickle", "dz1", "dz2"]) is BINARY_2
+    assert negotiate(["pickle", "dz1"]) is BINARY
+    assert negotiate(["pickle"]) is PICKLE
+    assert negotiate(["pickle"], {"dz1": BINARY}) is None
+    assert negotiate([]) is None
+
+
+def test_codec_for_frame_respects_enabled():
+    assert codec_for_frame(PICKLE.encode({}), {"dz1": BINARY}) is None
+    assert codec_for_frame(b"") is None
+    assert codec_for_frame(b"{}") is None
+
+
+# --- malformed and hostile input: always CodecError, and fast ---
+
+def test_every_truncation_is_rejected():
+    frame = BINARY.encode(MESSAGES[4])
+    for end in range(1, len(frame)):
+        with pytest.raises(CodecError):
+            BINARY.decode(frame[:end])
+
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    b"\x00",  # not dz1
+    b"\xd7",  # no value
+    b"\xd7\x80\x80",  # trailing bytes
+    b"\xd7\x7f",  # unknown tag
+    b"\xd7\x06\xff",  # string ref past the table
+    b"\xd7\x05\x02\xff\xfe",  # bad utf-8
+    b"\xd7\x09\x01\x07\x00\x80",  # unhashable dict key
+    b"\xd7\x04\x00\x00",  # truncated float
+    b"\xd7\x0b\x05\x12",  # tile array shorter than announced
+    b"\xd7\x07\xff\xff\xff\xff\x0f",  # a list of 4 billion items, none there
+])
+def test_malformed_dz1(frame):
+    with pytest.raises(CodecError):
+        BINARY.decode(frame)
+
+
+def test_deep_nesting_is_rejected():
+    with pytest.raises(CodecError):
+        BINARY.decode(b"\xd7" + b"\x07\x01" * 100000 + b"\x00")
+
+
+@pytest.mark.parametrize("codec", [BINARY_2, BINARY], ids=lambda c: c.name)
+@pytest.mark.parametrize("tag", [b"\x03", b"\x05", b"\x07", b"\x0b"])  # int, string, list, tile array
+def test_oversized_varint_is_rejected_quickly(codec, tag):
+    # 1 MiB of continuation bytes used to take minutes of quadratic big-int work under the GIL
+    t0 = time.perf_counter()
+    with pytest.raises(CodecError, match="varint"):
+        codec.decode(codec.magic + tag + b"\xff" * (1 << 20) + b"\x01")
+    assert time.perf_counter() - t0 < 0.5
+
+
+def test_ten_byte_varint_is_the_limit():
+    assert BINARY.decode(b"\xd7\x03" + b"\xff" * 9 + b"\x01") == -(1 << 63)
+    with pytest.raises(CodecError):
+        BINARY.decode(b"\xd7\x03" + b"\xff" * 10 + b"\x01")
+
+
+class Evil:
+    def __reduce__(self):
+        return (os.system, ("true",))
+
+
+@pytest.mark.parametrize("frame", [
+    pickle.dumps(Evil()),
+    pickle.dumps({"ok": time.time, "x": 1}),
+    b"\x80\x05\x95",  # truncated
+    b"\x80\x05garbage",
+])
+def test_pickle_refuses_globals_and_garbage(frame):
+    with pytest.raises(CodecError):
+        PICKLE.decode(frame)
+
+
+def test_every_codec_is_registered_by_name():
+    assert list(CODECS) == [BINARY_2.name, BINARY.name, PICKLE.name]
@@ -0,0 +1,68 @@
+import pytest
+
+from dominoes import Chain, Hand, tile_set
+from engine import GameState, IllegalMove
+
+
+def game(chain=()):
+    # ana to move holding (0,0) and (1,2); bo holds (2,2) and (5,6)
+    g = GameState(6, ["ana", "bo"])
+    ts = tile_set(6)
+    g.hands = {"ana": Hand(ts, [(0, 0), (1, 2)]), "bo": Hand(ts, [(2, 2), (5, 6)])}
+    for tile in chain:
+        g.chain.append(tile)
+    return g
+
+
+def unchanged(g, chain):
+    assert g.chain.to_list() == chain
+    assert sorted(g.hands["ana"].tiles()) == [(0, 0), (1, 2)]
+    assert g.current_turn_username() == "ana"
+
+
+@pytest.mark.parametrize("move", [
+    [0, 0, 2],  # used to lay (0,2) and take (0,0) out of the hand
+    [0.0, 0.0],  # equal-hashing floats
+    [1.0, 2.0],
+    [True, False],
+    [0, 7],  # past double-six
+    [-1, 0],
+    [0],
+    "00",
+    None,
+    5,
+])
+@pytest.mark.parametrize("chain", [[], [(2, 0)]], ids=["empty", "laid"])
+def test_only_two_int_pips_of_the_set_are_a_tile(move, chain):
+    g = game(chain)
+    with pytest.raises(IllegalMove):
+        g.play("ana", move, "left")
+    unchanged(g, chain)
+    # and the game goes on
+    assert g.play("ana", [0, 0], "right")[0] == (0, 0)
+
+
+def test_chain_refuses_a_bad_tile_before_changing():
+    chain = Chain(6)
+    chain.append((1, 2))
+    for bad in ((1.0, 2.0), (2, 9), (2, 3, 4)):
+        with pytest.raises(ValueError):
+            chain.append(bad)
+        with pytest.raises(ValueError):
+            chain.appendleft(bad)
+    assert chain.to_list() == [(1, 2)]
+    assert (chain.left, chain.right, chain.first) == (1, 2, 0)
+
+
+def test_bad_move_gets_an_error_not_a_disconnect(server, login):
+    conns = {u: login(u) for u in ("ana", "bo")}
+    lobby, _ = server.create_lobby("ana", turn_seconds=0)
+    for u, conn in conns.items():
+        server.handle_request(conn, u, {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    server.handle_request(conns["ana"], "ana", {"action": "start_lobby", "lobby_id": lobby.lobby_id})
+    u = lobby.current_turn_username()
+    hand = lobby.hands[u].tiles()
+    a, b = hand[0]
+    server.handle_request(conns[u], u, {"action": "move", "lobby_id": lobby.lobby_id, "move": [a, b, 6 - a]})
+    assert conns[u].got("error")[-1] == "Not a tile of this set"
+    assert lobby.hands[u].tiles() == hand and not lobby.chain
@@ -0,0 +1,34 @@
+import pytest
+
+import profiler
+from profiler import Profiler, current
+
+
+@pytest.fixture
+def profilers():
+    made = [Profiler(), Profiler()]
+    yield made
+    for p in made:
+        p.close()
+
+
+def test_stopping_one_profiler_leaves_another_sampling(profilers):
+    a, b = profilers
+    a.configure(enabled=True, sample_rate=1.0)
+    b.configure(enabled=True, sample_rate=1.0)
+    b.configure(enabled=False)
+    trace = a.sample()
+    assert trace is not None and current() is trace
+    a.finish("list", "ana", {}, 0.0, None)
+    a.configure(enabled=False)
+    profiler._local.trace = trace  # even a trace left behind is ignored once nobody samples
+    assert current() is None
+
+
+def test_bad_settings_change_nothing(profilers):
+    a, _ = profilers
+    a.configure(enabled=True, sample_rate=0.5, slow_ms=10)
+    with pytest.raises(ValueError):
+        a.configure(enabled=False, sample_rate=0.1, slow_ms="soon")
+    assert (a.enabled, a.sample_rate, a.slow_ms) == (True, 0.5, 10.0)
+    assert a in profiler._sampling
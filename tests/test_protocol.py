@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+
+from codec import BINARY, PICKLE
+from protocol import DEFAULT_MAX_FRAME, FrameDecoder, FrameTooLarge, encode_frame, pack_message, unframed
+
+
+def test_merged_split_and_pipelined_frames():
+    msgs = [{"action": "ping"}, {"action": "move", "lobby_id": 1, "move": (2, 3)}, {"chat": "x" * 5000}]
+    stream = b"".join(pack_message(m, BINARY) for m in msgs)
+    for step in (1, 3, 7, len(stream)):
+        dec = FrameDecoder()
+        got = []
+        for i in range(0, len(stream), step):
+            got += dec.feed(stream[i:i + step])
+        assert [BINARY.decode(f) for f in got] == msgs
+        assert dec.pending() == 0
+
+
+def test_empty_frame():
+    assert FrameDecoder().feed(encode_frame(b"")) == [b""]
+
+
+def test_partial_frame_is_buffered():
+    dec = FrameDecoder()
+    frame = pack_message({"action": "list"}, PICKLE)
+    assert dec.feed(frame[:-1]) == []
+    assert dec.pending() == len(frame) - 1
+    assert dec.feed(frame[-1:]) == [frame[4:]]
+
+
+def test_announced_size_over_the_limit_is_refused_before_buffering():
+    dec = FrameDecoder(max_frame=100)
+    assert dec.feed(encode_frame(b"x" * 100)) == [b"x" * 100]
+    with pytest.raises(FrameTooLarge):
+        dec.feed(b"\x00\x00\x00\x65")
+
+
+def test_raw_pickle_reads_as_an_oversized_frame():
+    # what a pre-framing client sends: its first byte, 0x80, announces ~2 GB
+    with pytest.raises(FrameTooLarge):
+        FrameDecoder().feed(PICKLE.encode({"action": "hello", "username": "old"}))
+
+
+def test_unframed_spots_bare_pickle_only():
+    assert unframed(PICKLE.encode({"action": "hello", "username": "old"}))
+    for size in (0, 1, 0x80, DEFAULT_MAX_FRAME):
+        assert not unframed(encode_frame(b"x" * size))
+    assert not unframed(b"")
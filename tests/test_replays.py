@@ -0,0 +1,37 @@
+import random
+
+from replays import ReplayArchive
+
+
+def play_out(server, conns, lobby, rnd):
+    # random legal moves until the game ends
+    while lobby.started:
+        u = lobby.current_turn_username()
+        opts = lobby.playable(lobby.hands[u])
+        sides = [s for s in ("left", "right") if opts[s]]
+        if sides:
+            side = rnd.choice(sides)
+            req = {"action": "move", "lobby_id": lobby.lobby_id, "move": rnd.choice(opts[side]), "side": side}
+        else:
+            req = {"action": "move", "lobby_id": lobby.lobby_id, "move": "pass"}
+        server.handle_request(conns[u], u, req)
+
+
+def test_mid_game_join_is_refused_and_the_game_replays(server, login, tmp_path):
+    server.archive = ReplayArchive(str(tmp_path / "replays"))
+    conns = {u: login(u) for u in ("ana", "bo", "cy")}
+    lobby, _ = server.create_lobby("ana", requested_max=3, turn_seconds=0)
+    for u in ("ana", "bo"):
+        server.handle_request(conns[u], u, {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    server.handle_request(conns["ana"], "ana", {"action": "start_lobby", "lobby_id": lobby.lobby_id})
+    server.handle_request(conns["cy"], "cy", {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    assert conns["cy"].got("error") == ["Game already started; spectate it or join when it ends"]
+    assert lobby.player_names == ["ana", "bo"]
+    play_out(server, conns, lobby, random.Random(7))
+    game = conns["ana"].got("game_over")[-1]["game"]
+    server.handle_request(conns["cy"], "cy", {"action": "replay", "game": game})
+    assert conns["cy"].got("replay_end")[-1]["winner"] == conns["ana"].got("game_over")[-1]["winner"]
+    assert conns["cy"].got("error") == ["Game already started; spectate it or join when it ends"]
+    # once the game is over the lobby takes players again
+    server.handle_request(conns["cy"], "cy", {"action": "join_lobby", "lobby_id": lobby.lobby_id})
+    assert lobby.player_names == ["ana", "bo", "cy"]
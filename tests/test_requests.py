@@ -0,0 +1,21 @@
+import pytest
+
+from codec import BINARY, BINARY_2, PICKLE, CodecError
+
+pytestmark = pytest.mark.parametrize("server", [{"codecs": ("dz2", "dz1")}], indirect=True)
+
+
+class Conn:
+    codec = BINARY_2  # negotiated in hello
+
+
+def test_requests_sent_before_the_hello_reply_still_decode(server):
+    # the client said hello in dz1 and was given dz2; what it sent meanwhile is dz1
+    req = {"action": "list", "page": 2}
+    assert server.decode_request(Conn(), BINARY.encode(req)) == req
+    assert server.decode_request(Conn(), BINARY_2.encode(req)) == req
+
+
+def test_codecs_the_server_turned_off_are_refused(server):
+    with pytest.raises(CodecError):
+        server.decode_request(Conn(), PICKLE.encode({"action": "list"}))
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import stats_store
+from stats_store import LogStore, StatsWriter
+
+
+def reload(path):
+    store = LogStore(path)
+    totals = dict(store.load())
+    store.close()
+    return totals
+
+
+def test_a_batch_cut_short_is_not_counted_twice(tmp_path, monkeypatch):
+    path = str(tmp_path / "stats.json")
+    store = LogStore(path)
+    store.load()
+    writer = StatsWriter(store, flush_interval=3600)
+    writer.record("ana", ["ana", "bo"])
+    writer.record("cy", ["cy", "dee"])
+    real_write = os.write
+
+    def half_then_full(fd, data):
+        # the first row goes out, then the disk fills up
+        monkeypatch.setattr(stats_store.os, "write", real_write)
+        real_write(fd, data[:data.index(b"\n") + 1])
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(stats_store.os, "write", half_then_full)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert reload(path) == {}
+    writer.flush()  # the retry, with the disk back
+    writer.close()
+    assert reload(path) == {"ana": [1, 1], "bo": [0, 1], "cy": [1, 1], "dee": [0, 1]}
+
+
+def test_a_failed_sync_does_not_send_the_batch_back(tmp_path, monkeypatch):
+    path = str(tmp_path / "stats.json")
+    store = LogStore(path)
+    store.load()
+    writer = StatsWriter(store, flush_interval=3600)
+    writer.record("ana", ["ana", "bo"])
+
+    def no_sync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(stats_store.os, "fsync", no_sync)
+    writer.flush(sync=True)
+    monkeypatch.undo()
+    writer.close()
+    assert reload(path) == {"ana": [1, 1], "bo": [0, 1]}
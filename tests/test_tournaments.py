@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+pytestmark = pytest.mark.parametrize("server", [{"admin_token": "s3cret"}], indirect=True)
+
+
+def seated(server, login):
+    # one table of three: ana connected, bo known but gone, cy never seen before
+    admin = login("ana")
+    server.sessions["bo"] = "bo-token"
+    req = {"action": "tournament", "op": "create", "token": "s3cret", "players": ["ana", "bo", "cy"], "seats": 3, "turn_seconds": 0}
+    server.handle_request(admin, "ana", req)
+    tid = admin.got("tournament")[-1]["id"]
+    server.handle_request(admin, "ana", {"action": "tournament", "op": "seat", "token": "s3cret", "id": tid})
+    t = server.tournaments.get(tid)
+    end = time.monotonic() + 2
+    while 0 not in t.lobbies and time.monotonic() < end:
+        server.tournament_tick()
+    return server.lobbies.get(t.lobbies[0])
+
+
+def test_seat_of_an_entrant_without_a_session_cannot_be_claimed(server, login):
+    lobby = seated(server, login)
+    assert lobby.tokens["cy"] is None
+    assert server.resume(login("cy"), "cy", "s-cy") == []
+    assert [c for c, u, _ in lobby.players if u == "cy"] == [None]
+
+
+def test_seat_goes_back_to_the_entrant_holding_its_session(server, login):
+    lobby = seated(server, login)
+    assert server.resume(login("bo"), "bo", "not-bo") == []
+    bo = login("bo")
+    assert server.resume(bo, "bo", "bo-token") == [lobby.lobby_id]
+    assert [c for c, u, _ in lobby.players if u == "bo"] == [bo]